@@ -0,0 +1,146 @@
+"""Almacén persistente de cotizaciones en SQLite.
+
+Cada cotización generada se guarda con un id; el PDF se puede pedir después con ese id
+sin volver a enviar la cotización completa, y el historial se consulta por páginas.
+La base usa WAL: las búsquedas no bloquean las escrituras ni al revés. Hay una conexión
+por hilo, porque el servidor atiende cada petición en su propio hilo.
+
+Los campos por los que se busca (fecha del evento, tipo, nombre del cliente y total)
+se guardan en columnas con índice; la cotización completa va en JSON.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# Cotizaciones por página: por omisión y máximo
+POR_PAGINA = 20
+POR_PAGINA_MAX = 100
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS cotizaciones (
+    id TEXT PRIMARY KEY,
+    creada REAL NOT NULL,
+    actualizada REAL NOT NULL,
+    fecha_evento TEXT,
+    tipo_evento TEXT,
+    nombre TEXT COLLATE NOCASE,
+    lugar TEXT,
+    num_invitados INTEGER,
+    duracion INTEGER,
+    total REAL,
+    datos TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cotizaciones_creada ON cotizaciones (creada);
+CREATE INDEX IF NOT EXISTS cotizaciones_fecha_evento ON cotizaciones (fecha_evento);
+CREATE INDEX IF NOT EXISTS cotizaciones_tipo_evento ON cotizaciones (tipo_evento, creada);
+CREATE INDEX IF NOT EXISTS cotizaciones_nombre ON cotizaciones (nombre);
+CREATE INDEX IF NOT EXISTS cotizaciones_total ON cotizaciones (total);
+"""
+
+# Columnas del resumen que devuelve la búsqueda (sin la cotización completa)
+COLUMNAS_RESUMEN = ('id', 'creada', 'fecha_evento', 'tipo_evento', 'nombre', 'lugar',
+                    'num_invitados', 'duracion', 'total')
+
+def fecha_iso(fecha):
+    """Fecha 'dd/mm/aaaa' (la del formulario) o 'aaaa-mm-dd' como 'aaaa-mm-dd'; None si no es válida."""
+    for formato in ('%d/%m/%Y', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(str(fecha), formato).date().isoformat()
+        except ValueError:
+            pass
+    return None
+
+def _entero(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+def _numero(valor):
+    return valor if isinstance(valor, (int, float)) and not isinstance(valor, bool) else None
+
+def _columnas(datos):
+    return (fecha_iso(datos.get('fecha')), datos.get('tipo_evento'), datos.get('nombre'), datos.get('lugar'),
+            _entero(datos.get('num_invitados')), _entero(datos.get('duracion')), _numero(datos.get('total')))
+
+class AlmacenCotizaciones:
+    """Cotizaciones guardadas en el archivo SQLite `ruta`."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        conexion = self._conexion()
+        # WAL queda guardado en el archivo; basta con activarlo una vez
+        conexion.execute('PRAGMA journal_mode=WAL')
+        conexion.executescript(ESQUEMA)
+
+    def _conexion(self):
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+            conexion.row_factory = sqlite3.Row
+            # Con WAL, NORMAL no pierde consistencia y evita un fsync por cotización
+            conexion.execute('PRAGMA synchronous=NORMAL')
+            self._local.conexion = conexion
+        return conexion
+
+    def guardar(self, datos):
+        """Guarda la cotización y devuelve su id."""
+        id_cotizacion = uuid.uuid4().hex
+        ahora = time.time()
+        self._conexion().execute(
+            'INSERT INTO cotizaciones (id, creada, actualizada, fecha_evento, tipo_evento, nombre, lugar, '
+            'num_invitados, duracion, total, datos) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (id_cotizacion, ahora, ahora, *_columnas(datos), json.dumps(datos, ensure_ascii=False)))
+        return id_cotizacion
+
+    def obtener(self, id_cotizacion):
+        """Cotización completa guardada con ese id, o None si no existe."""
+        fila = self._conexion().execute('SELECT datos FROM cotizaciones WHERE id = ?', (id_cotizacion,)).fetchone()
+        return json.loads(fila['datos']) if fila else None
+
+    def buscar(self, texto=None, tipo_evento=None, desde=None, hasta=None, total_min=None, total_max=None,
+               pagina=1, por_pagina=POR_PAGINA):
+        """Una página de cotizaciones, de la más reciente a la más antigua.
+
+        `texto` busca por el inicio del nombre del cliente sin distinguir mayúsculas;
+        `desde` y `hasta` limitan la fecha del evento. Devuelve el resumen de cada una
+        y el total de coincidencias.
+        """
+        condiciones, parametros = [], []
+        if texto:
+            # Prefijo: así la búsqueda usa el índice del nombre
+            escapado = texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            condiciones.append("nombre LIKE ? ESCAPE '\\'")
+            parametros.append(escapado + '%')
+        if tipo_evento:
+            condiciones.append('tipo_evento = ?')
+            parametros.append(tipo_evento)
+        for campo, operador, valor in (('fecha_evento', '>=', desde), ('fecha_evento', '<=', hasta),
+                                       ('total', '>=', total_min), ('total', '<=', total_max)):
+            if valor is not None:
+                condiciones.append(f'{campo} {operador} ?')
+                parametros.append(valor)
+        donde = f" WHERE {' AND '.join(condiciones)}" if condiciones else ''
+
+        pagina = max(int(pagina), 1)
+        por_pagina = min(max(int(por_pagina), 1), POR_PAGINA_MAX)
+        conexion = self._conexion()
+        total = conexion.execute(f'SELECT COUNT(*) FROM cotizaciones{donde}', parametros).fetchone()[0]
+        filas = conexion.execute(
+            f"SELECT {', '.join(COLUMNAS_RESUMEN)} FROM cotizaciones{donde} "
+            'ORDER BY creada DESC, id LIMIT ? OFFSET ?',
+            (*parametros, por_pagina, (pagina - 1) * por_pagina)).fetchall()
+        return {
+            'cotizaciones': [dict(fila) for fila in filas],
+            'pagina': pagina,
+            'por_pagina': por_pagina,
+            'total': total,
+        }
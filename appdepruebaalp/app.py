@@ -1,956 +1,1122 @@
-from flask import Flask, render_template, request, jsonify, send_file
+import time
+# Inicio de la importación de la app, para medir el arranque
+_inicio_arranque = time.perf_counter()
+
+from flask import Flask, render_template, request, jsonify, send_file, url_for, g, make_response
+import click
+import functools
+import hashlib
+import hmac
+import importlib
 import json
+import logging
 import os
-from datetime import datetime
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
+import math
+import mimetypes
+import shutil
+import threading
+import uuid
+import zipfile
+from collections import OrderedDict, deque
 from io import BytesIO
-import base64
-# Imports para fuentes personalizadas
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from almacen_cotizaciones import AlmacenCotizaciones, fecha_iso
+from archivos import BASE_DIR, escritura_atomica
+from cotizaciones import EntradaInvalida, aplicar_ajustes, leer_entradas, nombre_archivo_pdf, total_enviado
+from precios import PRECIOS, HORAS_BASE, MATRIZ_PRECIOS, calcular_cotizacion, calcular_cotizaciones, expandir_grid
+from fondos_pdf import PERFILES_FONDOS, preparar_fondos
+from metricas import (METRICAS_ACTIVAS, exponer_metricas, nuevas_etapas, registrar_etapas, registrar_peticion,
+                      server_timing)
+from recursos_estaticos import Recursos, construir
+from registro import configurar_registro, registrar_cotizacion
+
+configurar_registro()
+logger = logging.getLogger(__name__)
+
+# Etapas del arranque del proceso (importaciones, precarga del PDF, procesos de trabajo)
+arranque = nuevas_etapas(_inicio_arranque)
+arranque.marcar('importaciones')
+
+class ModuloDiferido:
+    """Importa un módulo pesado la primera vez que se usa uno de sus atributos."""
+
+    def __init__(self, nombre):
+        self._nombre = nombre
+        self._modulo = None
+        self._lock = threading.Lock()
+
+    def cargar(self):
+        if self._modulo is None:
+            with self._lock:
+                if self._modulo is None:
+                    inicio = time.perf_counter()
+                    modulo = importlib.import_module(self._nombre)
+                    duracion = time.perf_counter() - inicio
+                    registrar_etapas('arranque', {f"importar_{self._nombre}": duracion})
+                    logger.info("Módulo %s importado en %.1f ms", self._nombre, duracion * 1000)
+                    self._modulo = modulo
+        return self._modulo
+
+    def __getattr__(self, atributo):
+        return getattr(self.cargar(), atributo)
+
+# ReportLab, las fuentes y los estilos se cargan con el primer PDF (o al calentar)
+pdf_cotizacion = ModuloDiferido('pdf_cotizacion')
 
 app = Flask(__name__)
 
-# Registrar fuentes Montserrat (asumiendo que los archivos .ttf están en la carpeta 'fonts')
-try:
-    montserrat_regular_path = os.path.join('fonts', 'Montserrat-Regular.ttf')
-    montserrat_bold_path = os.path.join('fonts', 'Montserrat-Bold.ttf')
-    pdfmetrics.registerFont(TTFont('Montserrat', montserrat_regular_path))
-    pdfmetrics.registerFont(TTFont('Montserrat-Bold', montserrat_bold_path))
-except Exception as e:
-    print(f"Error al registrar fuentes Montserrat: {e}")
-    print("Asegúrate de que los archivos Montserrat-Regular.ttf y Montserrat-Bold.ttf estén en la carpeta 'fonts'.")
-    # Usar fuentes predeterminadas como fallback
-    FONT_REGULAR = 'Helvetica'
-    FONT_BOLD = 'Helvetica-Bold'
-else:
-    FONT_REGULAR = 'Montserrat'
-    FONT_BOLD = 'Montserrat-Bold'
-
-# Configuración de precios y reglas
-PRECIOS = {
-    'DJ': {
-        'Boda': 12000,
-        'Bautizo': 12000,
-        'Quince años': 12000,
-        'Cumpleaños': 1000  # por hora
-    },
-    'Sonido': {
-        'Boda': {
-            '150': 8000,
-            '151+': 16000
-        },
-        'Otros': {
-            '70': 4000,
-            '150': 8000,
-            '250': 12000,
-            '350': 16000
-        }
-    },
-    'Iluminación': {
-        'Boda': {
-           # '150': 4500,
-            #'151+': 18000,
-            '70': 4500, #6 par + 2 cabezas
-            '150': 6500, #6 par + 4 cabezas
-            '250': 12500, #12 par + 6 cabezas, si se pueden colgar se cuelgan
-            '350': 19500 #22 par + 10 cabezas, si se pueden colgar se cuelgan
-        },
-        'Otros': {
-            '70': 2500, #6 par o 2 cabezas
-            '150': 4500, #6 par + 2 cabezas
-            '250': 12500, #12 par + 6 cabezas, si se pueden colgar se cuelgan
-            '350': 19500  #22 par + 10 cabezas, si se pueden colgar se cuelgan
-        }
-    },
-    'Pista de baile': {
-        '70': 6600,
-        '150': 8800,
-        '250': 11000,
-        '350': 13200
-    },
-    'Planta de luz': 9000,
-    'Chisperos': 350,  # precio por unidad
-    'Lluvia de papeles': 3000,
-    'Barra de bebidas': 8000,
-    'Back pintado a mano': 4500
-}
-
-# Horas base por tipo de evento
-HORAS_BASE = {
-    'Cumpleaños': {
-        '70': 6,
-        '71+': 7
-    },
-    'Bautizo': {
-        '70': 7,
-        '71+': 8
-    },
-    'Quince años': {
-        '70': 7,
-        '71+': 8
-    },
-    'Boda': {
-        '150': 8,
-        '151+': 'ilimitado'
-    }
-}
+# Arranque: 'rapido' deja la generación de PDF para la primera vez que se usa; 'calentar'
+# carga fuentes, estilos y fondos y arranca los procesos de trabajo antes de atender.
+# Sin valor, el servidor de desarrollo calienta y las demás importaciones arrancan rápido
+app.config['ARRANQUE'] = os.environ.get('ARRANQUE')
+
+# Caché de PDFs generados: número máximo de documentos, vigencia en segundos y directorio
+# donde se guardan. Con directorio, los procesos de trabajo escriben ahí el PDF y se envía
+# por partes desde el archivo; PDF_CACHE_DIR vacío los guarda en memoria. El directorio es
+# solo de la caché: al arrancar se borra lo que no entra en sus límites
+app.config['PDF_CACHE_MAX'] = int(os.environ.get('PDF_CACHE_MAX', 64))
+app.config['PDF_CACHE_TTL'] = int(os.environ.get('PDF_CACHE_TTL', 3600))
+app.config['PDF_CACHE_DIR'] = os.environ.get(
+    'PDF_CACHE_DIR', os.path.join(BASE_DIR, 'cache_pdf'))
+
+# Máximo de escenarios por petición a /generar_cotizaciones
+app.config['MAX_COTIZACIONES_LOTE'] = int(os.environ.get('MAX_COTIZACIONES_LOTE', 5000))
+# Máximo de cotizaciones por petición a /exportar_pdfs
+app.config['MAX_PDFS_LOTE'] = int(os.environ.get('MAX_PDFS_LOTE', 200))
+
+# Generación de PDFs en segundo plano: procesos de trabajo (None = uno por núcleo), máximo
+# de trabajos pendientes antes de responder 503 y segundos que se conserva un PDF terminado
+app.config['PDF_TRABAJADORES'] = int(os.environ['PDF_TRABAJADORES']) if os.environ.get('PDF_TRABAJADORES') else None
+app.config['PDF_COLA_MAX'] = int(os.environ.get('PDF_COLA_MAX', 20))
+app.config['PDF_TRABAJOS_TTL'] = int(os.environ.get('PDF_TRABAJOS_TTL', 600))
+# Máximo de segundos que GET /trabajos_pdf/<id>?espera=N mantiene abierta la petición
+app.config['PDF_ESPERA_MAX'] = 30
+# Máximo de segundos que una descarga espera a que se genere su PDF; después responde 503
+# con Retry-After y el PDF se sigue generando para el reintento
+app.config['PDF_ESPERA_RESPUESTA'] = int(os.environ.get('PDF_ESPERA_RESPUESTA', 120))
+
+# Base SQLite donde se guarda cada cotización generada
+app.config['COTIZACIONES_DB'] = os.environ.get(
+    'COTIZACIONES_DB', os.path.join(BASE_DIR, 'cotizaciones.db'))
+# Token para consultar el historial (/cotizaciones), que tiene los datos de los clientes.
+# Sin token el historial está desactivado
+app.config['HISTORIAL_TOKEN'] = os.environ.get('HISTORIAL_TOKEN') or None
+
+# Recursos estáticos con huella y precomprimidos (flask construir-recursos). Sin construir,
+# la página usa /static como siempre
+app.config['STATIC_CONSTRUIDO'] = os.environ.get(
+    'STATIC_CONSTRUIDO', os.path.join(BASE_DIR, 'static_construido'))
+
+# Agregar a las respuestas instrumentadas la cabecera Server-Timing con la duración de cada etapa
+app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING', '0') == '1'
+
+def abrir_pdf(pdf):
+    """Bytes del PDF tal cual, o el archivo abierto si `pdf` es una ruta; None si ya no existe."""
+    if not isinstance(pdf, str):
+        return pdf
+    try:
+        return open(pdf, 'rb')
+    except FileNotFoundError:
+        return None
+
+class CachePDF:
+    """Caché LRU de PDFs terminados con tamaño máximo y vigencia.
+
+    Sin directorio guarda los bytes en memoria. Con directorio los PDFs solo están en
+    disco: obtener() devuelve la ruta del archivo, para enviarlo por partes sin cargarlo
+    completo, y los procesos de trabajo escriben directamente en destino(clave). Los
+    PDFs que dejaron ejecuciones anteriores entran en la caché al crearla, con los
+    mismos límites de cantidad y vigencia.
+    """
+
+    def __init__(self, max_entradas, ttl, directorio=None):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.directorio = directorio
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+            self._barrer()
+
+    def _barrer(self):
+        """Registra los PDFs vigentes del directorio, del más viejo al más nuevo, y borra
+        los vencidos, los que exceden el máximo y los temporales abandonados."""
+        ahora = time.time()
+        vigentes = []
+        for nombre in os.listdir(self.directorio):
+            ruta = os.path.join(self.directorio, nombre)
+            clave, extension = os.path.splitext(nombre)
+            if extension not in ('.pdf', '.tmp'):
+                continue
+            try:
+                creado = os.path.getmtime(ruta)
+            except OSError:
+                continue
+            # Un temporal reciente puede ser de otro proceso que todavía lo está escribiendo
+            if ahora - creado >= self.ttl:
+                self._eliminar_archivo(ruta)
+            elif extension == '.pdf':
+                vigentes.append((creado, clave, ruta))
+        for creado, clave, ruta in sorted(vigentes):
+            self._registrar(clave, ruta, creado)
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, f"{clave}.pdf")
+
+    def destino(self, clave):
+        """Ruta donde debe escribirse el PDF de `clave`, o None si la caché es en memoria."""
+        return self._ruta(clave) if self.directorio else None
+
+    def obtener(self, clave):
+        """Bytes del PDF (caché en memoria) o ruta de su archivo (caché en disco); None si no está."""
+        ahora = time.time()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                creado, pdf = entrada
+                if ahora - creado < self.ttl and (not self.directorio or os.path.exists(pdf)):
+                    self._entradas.move_to_end(clave)
+                    return pdf
+                del self._entradas[clave]
+        if not self.directorio:
+            return None
+        # Buscar en disco (p. ej. tras un reinicio) y, si sigue vigente, registrarlo
+        ruta = self._ruta(clave)
+        try:
+            creado = os.path.getmtime(ruta)
+        except OSError:
+            return None
+        if ahora - creado >= self.ttl:
+            self._eliminar_archivo(ruta)
+            return None
+        self._registrar(clave, ruta, creado)
+        return ruta
+
+    def abrir(self, clave):
+        """Como obtener(), pero con caché en disco devuelve el archivo ya abierto.
+
+        Así, si otra petición hace que se descarte antes de enviarlo, el envío no se corta.
+        Si el archivo ya se eliminó, quita la entrada y devuelve None.
+        """
+        pdf = self.obtener(clave)
+        if pdf is None or not self.directorio:
+            return pdf
+        archivo = abrir_pdf(pdf)
+        if archivo is None:
+            with self._lock:
+                if self._entradas.get(clave, (None, None))[1] == pdf:
+                    del self._entradas[clave]
+        return archivo
+
+    def guardar(self, clave, pdf):
+        """Guarda los bytes del PDF; con caché en disco también acepta la ruta ya escrita en destino(clave)."""
+        if self.directorio and isinstance(pdf, bytes):
+            ruta = self._ruta(clave)
+            try:
+                with escritura_atomica(ruta) as f:
+                    f.write(pdf)
+            except OSError as e:
+                logger.error("Error al guardar PDF en caché de disco: %s", e)
+                return
+            pdf = ruta
+        self._registrar(clave, pdf, time.time())
+
+    def _registrar(self, clave, pdf, creado):
+        descartados = []
+        with self._lock:
+            self._entradas[clave] = (creado, pdf)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                descartados.append(self._entradas.popitem(last=False)[1][1])
+        if self.directorio:
+            for ruta in descartados:
+                self._eliminar_archivo(ruta)
+
+    def _eliminar_archivo(self, ruta):
+        try:
+            os.remove(ruta)
+        except OSError:
+            # Puede estar enviándose todavía (en Windows no se puede borrar abierto)
+            pass
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+cache_pdf = CachePDF(app.config['PDF_CACHE_MAX'], app.config['PDF_CACHE_TTL'], app.config['PDF_CACHE_DIR'])
+almacen = AlmacenCotizaciones(app.config['COTIZACIONES_DB'])
+recursos = Recursos(app.config['STATIC_CONSTRUIDO'], app.static_folder)
+
+
+def instrumentar(ruta):
+    """Registra duración y errores de la ruta, y las etapas que la vista marque en `g.etapas`.
+
+    Con SERVER_TIMING las etapas (y las del proceso de trabajo, en `g.etapas_pdf`)
+    se devuelven también en la cabecera Server-Timing.
+    """
+    def decorador(vista):
+        @functools.wraps(vista)
+        def envoltura(*args, **kwargs):
+            g.etapas = etapas = nuevas_etapas()
+            if not METRICAS_ACTIVAS:
+                return vista(*args, **kwargs)
+            inicio = time.perf_counter()
+            try:
+                response = make_response(vista(*args, **kwargs))
+            except Exception:
+                registrar_peticion(ruta, time.perf_counter() - inicio, 500)
+                raise
+            registrar_peticion(ruta, time.perf_counter() - inicio, response.status_code)
+            registrar_etapas(ruta, etapas.duraciones)
+            if app.config['SERVER_TIMING']:
+                duraciones = dict(etapas.duraciones)
+                duraciones.update((f"pdf-{etapa}", segundos) for etapa, segundos in g.get('etapas_pdf', {}).items())
+                if duraciones:
+                    response.headers['Server-Timing'] = server_timing(duraciones)
+            return response
+        return envoltura
+    return decorador
+
+@app.template_global()
+def recurso(ruta):
+    """URL de un archivo de static/: la versión con huella si está construida y al día."""
+    construido = recursos.construido(ruta)
+    if construido is None:
+        return url_for('static', filename=ruta)
+    return url_for('recurso_construido', nombre=construido)
+
+@app.route('/recursos/<path:nombre>')
+def recurso_construido(nombre):
+    # El nombre lleva el hash del contenido: el navegador lo guarda sin revalidar
+    aceptadas = [codificacion for codificacion in ('br', 'gzip') if request.accept_encodings[codificacion]]
+    ruta, codificacion = recursos.archivo(nombre, aceptadas)
+    if ruta is None:
+        return jsonify({"error": "Recurso no encontrado"}), 404
+    response = send_file(ruta, mimetype=mimetypes.guess_type(nombre)[0] or 'application/octet-stream',
+                         max_age=31536000)
+    if codificacion:
+        response.headers['Content-Encoding'] = codificacion
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response.vary.add('Accept-Encoding')
+    return response
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    # La página cambia de URLs de recursos con cada construcción: siempre revalidar
+    response = make_response(render_template('index.html'))
+    response.add_etag()
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 @app.route('/generar_cotizacion', methods=['POST'])
+@instrumentar('generar_cotizacion')
 def generar_cotizacion():
     data = request.json
-    
-    tipo_evento = data['tipo_evento']
-    num_invitados = int(data['num_invitados'])
-    horas = int(data['duracion'])
-    servicios = data['servicios']
-    
-    # Calcular horas base según el tipo de evento y número de invitados
-    if tipo_evento == 'Cumpleaños':
-        horas_base = HORAS_BASE['Cumpleaños']['70'] if num_invitados <= 70 else HORAS_BASE['Cumpleaños']['71+']
-    elif tipo_evento == 'Bautizo' or tipo_evento == 'Quince años':
-        horas_base = HORAS_BASE[tipo_evento]['70'] if num_invitados <= 70 else HORAS_BASE[tipo_evento]['71+']
-    else:  # Boda
-        horas_base = HORAS_BASE['Boda']['150'] if num_invitados <= 150 else HORAS_BASE['Boda']['151+']
-    
-    # Inicializar cotización
-    cotizacion = []
-    total = 0
-    
-    # Calcular precios de servicios seleccionados
-    for servicio in servicios:
-        precio = 0
-        if servicio == 'DJ':
-            if tipo_evento in ['Boda', 'Bautizo', 'Quince años']:
-                precio = PRECIOS['DJ'][tipo_evento]
-            else:  # Cumpleaños
-                # Verificar el tipo de precio seleccionado por el usuario
-                tipo_precio_dj = data.get('tipo_precio_dj', 'por_hora')  # Por defecto, usar precio por hora
-                
-                if tipo_precio_dj == 'por_hora':
-                    # Si seleccionó precio por hora: $1000 por hora con mínimo 6 horas
-                    if horas < 6:
-                        precio = 6000  # Mínimo 6 horas (6 * 1000)
-                    else:
-                        precio = PRECIOS['DJ']['Cumpleaños'] * horas
-                else:  # precio fijo
-                    # Si seleccionó precio fijo: $12000
-                    precio = 12000
-                    
-                    # Establecer horas base según número de invitados
-                    dj_horas_base = 6 if num_invitados <= 70 else 7
-                    
-                    # Calcular horas extras si aplica
-                    if horas > dj_horas_base:
-                        horas_extras = horas - dj_horas_base
-                        # Usar la tarifa por hora de cumpleaños para las horas extras del DJ fijo
-                        precio_hora_extra_dj = PRECIOS['DJ']['Cumpleaños'] 
-                        precio += precio_hora_extra_dj * horas_extras
-        
-        elif servicio == 'Sonido':
-            if tipo_evento == 'Boda':
-                if num_invitados <= 150:
-                    precio = PRECIOS['Sonido']['Boda']['150']
-                else:
-                    precio = PRECIOS['Sonido']['Boda']['151+']
-            else:  # Otros eventos
-                if num_invitados <= 70:
-                    precio = PRECIOS['Sonido']['Otros']['70']
-                elif num_invitados <= 150:
-                    precio = PRECIOS['Sonido']['Otros']['150']
-                elif num_invitados <= 250:
-                    precio = PRECIOS['Sonido']['Otros']['250']
-                elif num_invitados <= 350:
-                    precio = PRECIOS['Sonido']['Otros']['350']
-                else:
-                    precio = "Contactar para calcular precio"
-                    continue  # Skip adding to total
-            
-            # Calcular horas extras si aplica
-            if horas_base != 'ilimitado' and horas > horas_base:
-                horas_extras = horas - horas_base
-                # El precio base del servicio ya está en 'precio'
-                # Calculamos el costo por hora extra basado en el precio base del servicio y las horas base
-                costo_por_hora_extra_servicio = precio / horas_base
-                adicional_por_horas_extras = costo_por_hora_extra_servicio * horas_extras
-                precio += round(adicional_por_horas_extras) # Redondear el costo adicional de las horas extras
-        
-        elif servicio == 'Iluminación':
-            if tipo_evento == 'Boda':
-                if num_invitados <= 70:
-                    precio = PRECIOS['Iluminación']['Boda']['70']
-                elif num_invitados <= 150:
-                    precio = PRECIOS['Iluminación']['Boda']['150']
-                elif num_invitados <= 250:
-                    precio = PRECIOS['Iluminación']['Boda']['250']
-                elif num_invitados <= 350:
-                    precio = PRECIOS['Iluminación']['Boda']['350']
-                else:
-                    precio = "Contactar para calcular precio"
-                    continue  # Skip adding to total
-            else:  # Otros eventos
-                if num_invitados <= 70:
-                    precio = PRECIOS['Iluminación']['Otros']['70']
-                elif num_invitados <= 150:
-                    precio = PRECIOS['Iluminación']['Otros']['150']
-                elif num_invitados <= 250:
-                    precio = PRECIOS['Iluminación']['Otros']['250']
-                elif num_invitados <= 350:
-                    precio = PRECIOS['Iluminación']['Otros']['350']
-                else:
-                    precio = "Contactar para calcular precio"
-                    continue  # Skip adding to total
-            
-            # Calcular horas extras si aplica
-            if horas_base != 'ilimitado' and horas > horas_base:
-                horas_extras = horas - horas_base
-                # El precio base del servicio ya está en 'precio'
-                # Calculamos el costo por hora extra basado en el precio base del servicio y las horas base
-                costo_por_hora_extra_servicio = precio / horas_base
-                adicional_por_horas_extras = costo_por_hora_extra_servicio * horas_extras
-                precio += round(adicional_por_horas_extras) # Redondear el costo adicional de las horas extras
-        
-        elif servicio == 'Pista de baile':
-            if num_invitados <= 70:
-                precio = PRECIOS['Pista de baile']['70']
-            elif num_invitados <= 150:
-                precio = PRECIOS['Pista de baile']['150']
-            elif num_invitados <= 250:
-                precio = PRECIOS['Pista de baile']['250']
-            elif num_invitados <= 350:
-                precio = PRECIOS['Pista de baile']['350']
-            else:
-                precio = "Contactar para calcular precio"
-                continue  # Skip adding to total
-            
-            # Calcular horas extras si aplica
-            if horas_base != 'ilimitado' and horas > horas_base:
-                horas_extras = horas - horas_base
-                # El precio base del servicio ya está en 'precio'
-                # Calculamos el costo por hora extra basado en el precio base del servicio y las horas base
-                costo_por_hora_extra_servicio = precio / horas_base
-                adicional_por_horas_extras = costo_por_hora_extra_servicio * horas_extras
-                precio += round(adicional_por_horas_extras) # Redondear el costo adicional de las horas extras
-        
-        # Calcular precio planta de luz
-        elif servicio == 'Planta de luz':
-            if horas_base != 'ilimitado' and (horas_base + 1) > 9:
-                precio = (horas_base + 1) * 1000
+    resultado = calcular_cotizacion(data)
+    g.etapas.marcar('calculo')
+    # ?guardar=0 solo cotiza (p. ej. mientras se llena el formulario); si no, la cotización
+    # se guarda y su id sirve para pedir el PDF y encontrarla en el historial
+    if request.args.get('guardar') != '0':
+        resultado['id'] = almacen.guardar({**data, **resultado})
+        g.etapas.marcar('guardar')
+    response = jsonify(resultado)
+    # Versión de las reglas de precios: el navegador recarga /matriz_precios si la suya es otra
+    response.headers['X-Version-Precios'] = MATRIZ_PRECIOS.version
+    g.etapas.marcar('respuesta')
+    return response
+
+@app.route('/generar_cotizaciones', methods=['POST'])
+def generar_cotizaciones():
+    """Cotiza muchos escenarios en una sola petición.
+
+    Acepta {'cotizaciones': [...]} con entradas como las de /generar_cotizacion, o
+    {'grid': {...}, 'base': {...}} para cotizar el producto cartesiano del grid, p. ej.
+    {'grid': {'num_invitados': [70, 150, 250], 'duracion': [6, 7, 8, 9, 10]},
+     'base': {'tipo_evento': 'Boda', 'servicios': ['DJ', 'Sonido']}}.
+    """
+    data = request.get_json(silent=True) or {}
+    maximo = app.config['MAX_COTIZACIONES_LOTE']
+    try:
+        if 'grid' in data:
+            entradas = expandir_grid(data['grid'], data.get('base'), maximo=maximo)
+        else:
+            entradas = data.get('cotizaciones')
+            if not isinstance(entradas, list):
+                raise ValueError("Se esperaba una lista 'cotizaciones' o un 'grid'")
+            if len(entradas) > maximo:
+                raise ValueError(f"Se recibieron {len(entradas)} cotizaciones; el máximo es {maximo}")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    resultados = calcular_cotizaciones(entradas)
+    if 'grid' in data:
+        # Indicar a qué combinación del grid corresponde cada resultado
+        campos = list(data['grid'])
+        for entrada, resultado in zip(entradas, resultados):
+            resultado['escenario'] = {campo: entrada[campo] for campo in campos}
+    return jsonify({'resultados': resultados})
+
+@app.route('/matriz_precios')
+def matriz_precios():
+    """Matriz de precios precalculada para que el navegador estime el total sin ir al servidor.
+
+    La versión cambia con las tablas de precios y sirve como ETag.
+    """
+    version = MATRIZ_PRECIOS.version
+    if version in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(MATRIZ_PRECIOS.como_dict())
+    response.set_etag(version)
+    response.headers['Cache-Control'] = 'public, no-cache'
+    return response
+
+
+def respuesta_pdf(pdf, clave, nombre_archivo):
+    """Respuesta de descarga del PDF con su ETag.
+
+    `pdf` son los bytes, la ruta del archivo o el archivo ya abierto (ver abrir_pdf);
+    el archivo se envía por partes sin cargarlo completo en memoria.
+    """
+    response = send_file(
+        BytesIO(pdf) if isinstance(pdf, bytes) else pdf,
+        as_attachment=True,
+        download_name=nombre_archivo,
+        mimetype='application/pdf',
+        conditional=False,
+        etag=False
+    )
+    if hasattr(pdf, 'fileno'):
+        response.content_length = os.fstat(pdf.fileno()).st_size
+    # El navegador puede guardar el PDF pero debe revalidarlo con If-None-Match
+    response.set_etag(clave)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+def respuesta_no_modificado(clave):
+    response = app.response_class(status=304)
+    response.set_etag(clave)
+    return response
+
+# --- Generación de PDFs en segundo plano ---
+class ColaLlena(Exception):
+    """No hay lugar en la cola de PDFs; se puede reintentar en `reintentar_en` segundos."""
+
+    def __init__(self, reintentar_en):
+        super().__init__(f"Hay demasiados PDFs en proceso; reintente en {reintentar_en} s")
+        self.reintentar_en = reintentar_en
+
+class PDFDemorado(Exception):
+    """El PDF no terminó dentro de la espera de la petición; sigue generándose y se puede
+    reintentar en `reintentar_en` segundos."""
+
+    def __init__(self, reintentar_en):
+        super().__init__(f"El PDF todavía se está generando; reintente en {reintentar_en} s")
+        self.reintentar_en = reintentar_en
+
+class TrabajoPDF:
+    """Un PDF que se genera en segundo plano."""
+
+    def __init__(self, clave, nombre_archivo):
+        self.id = uuid.uuid4().hex
+        self.clave = clave
+        self.nombre_archivo = nombre_archivo
+        self.estado = 'en_cola'
+        self.pdf = None  # Bytes del PDF o ruta de su archivo
+        self.error = None
+        self.creado = time.time()
+        self.terminado = None
+        self.etapas = {}  # Segundos de cada etapa de la generación, incluida la espera en cola
+        self.futuro = None
+        self.listo = threading.Event()
+
+    def disponible(self):
+        """False si terminó con error o su archivo ya se eliminó de la caché."""
+        if self.estado == 'error':
+            return False
+        return not (self.estado == 'listo' and isinstance(self.pdf, str) and not os.path.exists(self.pdf))
+
+    def como_dict(self):
+        estado = self.estado
+        if estado == 'en_cola' and self.futuro is not None and self.futuro.running():
+            estado = 'procesando'
+        datos = {'id': self.id, 'estado': estado}
+        if self.error:
+            datos['error'] = self.error
+        return datos
+
+class ColaPDF:
+    """Genera PDFs en un grupo de procesos con un máximo de trabajos pendientes.
+
+    ReportLab ocupa la CPU sin soltar el GIL, así que cada PDF se genera en un proceso
+    aparte y la petición solo encola el trabajo. `renderizar(data, destino)` se ejecuta
+    en el proceso de trabajo y devuelve (pdf, segundos, etapas): con una ruta de destino escribe
+    ahí el PDF y devuelve la ruta, así los bytes no pasan por este proceso. `inicializador`
+    prepara cada proceso al arrancar. Ambas pueden darse como 'modulo.funcion' para no importar
+    el módulo hasta crear los procesos. Las peticiones con el mismo contenido comparten trabajo,
+    y los trabajos terminados se conservan `ttl` segundos.
+    """
+
+    def __init__(self, renderizar, trabajadores=None, max_pendientes=20, ttl=600, al_terminar=None,
+                 inicializador=None):
+        self.renderizar = renderizar
+        self.inicializador = inicializador
+        self.trabajadores = trabajadores or os.cpu_count() or 1
+        self.max_pendientes = max_pendientes
+        self.ttl = ttl
+        self.al_terminar = al_terminar
+        self._trabajos = {}
+        self._por_clave = {}
+        self._pendientes = 0
+        self._duracion_media = 2.0  # Segundos por PDF, se ajusta con cada trabajo terminado
+        self._ejecutor = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _funcion(funcion):
+        if isinstance(funcion, str):
+            modulo, nombre = funcion.rsplit('.', 1)
+            return getattr(importlib.import_module(modulo), nombre)
+        return funcion
+
+    def _obtener_ejecutor(self):
+        if self._ejecutor is None:
+            self._ejecutor = ProcessPoolExecutor(max_workers=self.trabajadores,
+                                                 initializer=self._funcion(self.inicializador))
+        return self._ejecutor
+
+    def _enviar(self, data, destino, renderizar=None):
+        funcion = self._funcion(renderizar or self.renderizar)
+        try:
+            return self._obtener_ejecutor().submit(funcion, data, destino)
+        except BrokenProcessPool:
+            # Un proceso de trabajo murió: reemplazar el grupo completo
+            logger.warning("El grupo de procesos de PDF se interrumpió; creando uno nuevo")
+            self._ejecutor.shutdown(wait=False)
+            self._ejecutor = None
+            return self._obtener_ejecutor().submit(funcion, data, destino)
+
+    def calentar(self):
+        """Arranca todos los procesos de trabajo (y su inicializador) antes de la primera petición."""
+        with self._lock:
+            ejecutor = self._obtener_ejecutor()
+            # Sin procesos libres, cada envío arranca uno nuevo hasta llegar a `trabajadores`
+            futuros = [ejecutor.submit(os.getpid) for _ in range(self.trabajadores)]
+        wait(futuros)
+        return {futuro.result() for futuro in futuros}
+
+    def encolar(self, data, clave, nombre_archivo, pdf=None, destino=None, renderizar=None):
+        """Devuelve el trabajo que genera el PDF de `clave`; si ya se tiene el PDF, queda listo.
+
+        Con `destino` el proceso de trabajo escribe el PDF en esa ruta; `renderizar` reemplaza
+        la función de la cola para este trabajo. Lanza ColaLlena si hay demasiados trabajos pendientes.
+        """
+        with self._lock:
+            self._limpiar_vencidos()
+            trabajo = self._por_clave.get(clave)
+            if trabajo is not None and trabajo.disponible():
+                return trabajo
+            trabajo = TrabajoPDF(clave, nombre_archivo)
+            if pdf is not None:
+                self._completar(trabajo, pdf, None)
             else:
-                precio = PRECIOS['Planta de luz']
-        
-        elif servicio == 'Chisperos':
-            cantidad = int(data.get('cantidad_chisperos', 1))
-            precio = PRECIOS['Chisperos'] * cantidad
-        
-        elif servicio == 'Lluvia de papeles':
-            precio = PRECIOS['Lluvia de papeles']
-        
-        cotizacion.append({
-            'servicio': servicio,
-            'precio': precio
-        })
-        
-        if isinstance(precio, (int, float)):
-            total += precio
-    
-    # Servicios incluidos automáticamente
-    servicios_automaticos = []
-    
-    # Para Bodas, incluir Barra de bebidas
-    if tipo_evento == 'Boda':
-        servicios_automaticos.append({
-            'servicio': 'Barra de bebidas',
-            'precio': PRECIOS['Barra de bebidas'],
-            'incluido': True
-        })
-        total += PRECIOS['Barra de bebidas']
-        
-        # Si se seleccionó Sonido y DJ, incluir Cabina de DJ sin costo
-        if 'Sonido' in servicios and 'DJ' in servicios:
-            servicios_automaticos.append({
-                'servicio': 'Cabina de DJ',
-                'precio': 0,
-                'incluido': True
-            })
-    
-    # Para Bodas y Bautizos con más de 150 invitados, incluir Back pintado a mano
-    if (tipo_evento == 'Boda'):
-        servicios_automaticos.append({
-            'servicio': 'Back pintado a mano',
-            'precio': PRECIOS['Back pintado a mano'],
-            'incluido': True
-        })
-        total += PRECIOS['Back pintado a mano']
-        
-    if (tipo_evento == 'Bautizo') and num_invitados >= 100:
-        servicios_automaticos.append({
-            'servicio': 'Back pintado a mano',
-            'precio': PRECIOS['Back pintado a mano'],
-            'incluido': True
-        })
-        total += PRECIOS['Back pintado a mano']
-    
-    # Agregar descuentos y viáticos si se proporcionaron
-    descuentos = data.get('descuentos', [])
-    viaticos = data.get('viaticos', [])
-    extras = data.get('extras', [])
-    
-    for descuento in descuentos:
-        total -= descuento['monto']
-    
-    for viatico in viaticos:
-        total += viatico['monto']
-    
-    for extra in extras:
-        total += extra['monto']
-    
-    resultado = {
-        'cotizacion': cotizacion,
-        'servicios_automaticos': servicios_automaticos,
-        'descuentos': descuentos,
-        'viaticos': viaticos,
-        'extras': extras,
-        'total': total
-    }
-    
-    return jsonify(resultado)
+                if self._pendientes >= self.max_pendientes:
+                    raise ColaLlena(max(1, math.ceil(self._duracion_media)))
+                trabajo.futuro = self._enviar(data, destino, renderizar)
+                self._pendientes += 1
+            self._trabajos[trabajo.id] = trabajo
+            self._por_clave[clave] = trabajo
+        # Fuera del lock: si el futuro ya terminó, el callback se ejecuta aquí mismo
+        if trabajo.futuro is not None:
+            trabajo.futuro.add_done_callback(lambda futuro: self._terminar(trabajo, futuro))
+        return trabajo
+
+    def _terminar(self, trabajo, futuro):
+        duracion = None
+        try:
+            pdf, duracion, etapas = futuro.result()
+            # Lo que no pasó generando el PDF lo pasó esperando un proceso libre
+            trabajo.etapas = {'cola': max(time.time() - trabajo.creado - duracion, 0.0), **etapas}
+            registrar_etapas('pdf', trabajo.etapas)
+            error = None if pdf else "No se pudo generar el PDF"
+        except Exception as e:
+            logger.exception("Error al generar el PDF del trabajo %s", trabajo.id)
+            pdf, error = None, f"Error al generar el PDF: {e}"
+        if pdf and self.al_terminar:
+            self.al_terminar(trabajo.clave, pdf)
+        with self._lock:
+            self._pendientes -= 1
+            if duracion is not None:
+                self._duracion_media = 0.8 * self._duracion_media + 0.2 * duracion
+            self._completar(trabajo, pdf, error)
+
+    def _completar(self, trabajo, pdf, error):
+        trabajo.pdf = pdf or None
+        trabajo.error = error
+        trabajo.estado = 'error' if error else 'listo'
+        trabajo.terminado = time.time()
+        trabajo.futuro = None
+        trabajo.listo.set()
+
+    def obtener(self, id_trabajo, espera=0):
+        """Trabajo con ese id, o None si no existe o ya venció.
+
+        Con `espera` aguarda hasta ese número de segundos a que el trabajo termine.
+        """
+        with self._lock:
+            self._limpiar_vencidos()
+            trabajo = self._trabajos.get(id_trabajo)
+        if trabajo is not None and espera > 0:
+            trabajo.listo.wait(espera)
+        return trabajo
+
+    def esperar(self, trabajo, espera=None):
+        """Aguarda a que el trabajo termine, hasta `espera` segundos (None: sin límite).
+
+        Si no termina a tiempo lanza PDFDemorado; el trabajo sigue en la cola y una petición
+        con el mismo contenido lo reutiliza.
+        """
+        if not trabajo.listo.wait(espera):
+            raise PDFDemorado(max(1, math.ceil(self._duracion_media)))
+
+    def _limpiar_vencidos(self):
+        limite = time.time() - self.ttl
+        for id_trabajo, trabajo in list(self._trabajos.items()):
+            if trabajo.terminado is not None and trabajo.terminado < limite:
+                del self._trabajos[id_trabajo]
+                if self._por_clave.get(trabajo.clave) is trabajo:
+                    del self._por_clave[trabajo.clave]
+
+    def cerrar(self):
+        if self._ejecutor is not None:
+            self._ejecutor.shutdown(wait=False, cancel_futures=True)
+            self._ejecutor = None
+
+cola_pdf = ColaPDF('pdf_cotizacion.renderizar_trabajo', app.config['PDF_TRABAJADORES'],
+                   app.config['PDF_COLA_MAX'], app.config['PDF_TRABAJOS_TTL'], al_terminar=cache_pdf.guardar,
+                   inicializador='pdf_cotizacion.inicializar_trabajador')
+
+# Veces que una descarga genera su PDF si la caché lo descarta antes de enviarlo
+INTENTOS_PDF = 2
+
+def respuesta_cola_llena(error):
+    response = jsonify({"error": str(error)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.reintentar_en)
+    return response
+
+def datos_trabajo(trabajo):
+    datos = trabajo.como_dict()
+    datos['estado_url'] = url_for('estado_trabajo_pdf', id_trabajo=trabajo.id)
+    datos['pdf_url'] = url_for('descargar_trabajo_pdf', id_trabajo=trabajo.id)
+    return datos
+
+@app.route('/trabajos_pdf', methods=['POST'])
+@instrumentar('trabajos_pdf')
+def crear_trabajo_pdf():
+    """Encola la generación del PDF y responde de inmediato con el id del trabajo.
+
+    Acepta el id de una cotización guardada ({'id': ..., 'personalizacion': {...}} y, si
+    los hay, descuentos, viáticos y extras) o la cotización completa.
+
+    El cliente consulta GET /trabajos_pdf/<id> (con ?espera=N espera hasta N segundos
+    a que termine) y descarga el PDF de GET /trabajos_pdf/<id>/pdf. Si la cola está
+    llena responde 503 con Retry-After.
+    """
+    data = request.get_json(silent=True)
+    if isinstance(data, dict) and 'id' in data:
+        data, error = cotizacion_guardada(data['id'], data)
+        if error is not None:
+            return error
+    elif not data or 'cotizacion' not in data:
+        return jsonify({"error": "Datos de cotización incompletos: falta la clave 'cotizacion'"}), 400
+    else:
+        data = dict(data, total=total_enviado(data))
+    try:
+        clave = pdf_cotizacion.clave_pdf(data)
+        if clave in request.if_none_match:
+            return respuesta_no_modificado(clave)
+        trabajo = cola_pdf.encolar(data, clave, nombre_archivo_pdf(data), pdf=cache_pdf.obtener(clave),
+                                   destino=cache_pdf.destino(clave))
+    except ColaLlena as e:
+        return respuesta_cola_llena(e)
+    except Exception as e:
+        logger.exception("Error al encolar el PDF")
+        return jsonify({"error": f"Error al generar el PDF: {str(e)}"}), 500
+
+    response = jsonify(datos_trabajo(trabajo))
+    response.status_code = 202
+    response.headers['Location'] = url_for('estado_trabajo_pdf', id_trabajo=trabajo.id)
+    return response
+
+@app.route('/trabajos_pdf/<id_trabajo>')
+def estado_trabajo_pdf(id_trabajo):
+    espera = min(max(request.args.get('espera', 0, type=float), 0), app.config['PDF_ESPERA_MAX'])
+    trabajo = cola_pdf.obtener(id_trabajo, espera)
+    if trabajo is None:
+        return jsonify({"error": "El trabajo no existe o ya venció"}), 404
+    return jsonify(datos_trabajo(trabajo))
+
+@app.route('/trabajos_pdf/<id_trabajo>/pdf')
+def descargar_trabajo_pdf(id_trabajo):
+    trabajo = cola_pdf.obtener(id_trabajo)
+    if trabajo is None:
+        return jsonify({"error": "El trabajo no existe o ya venció"}), 404
+    if trabajo.estado == 'error':
+        return jsonify({"error": trabajo.error}), 500
+    if trabajo.pdf is None:
+        return jsonify({"error": "El PDF todavía no está listo"}), 409
+    if not trabajo.disponible():
+        return jsonify({"error": "El PDF ya no está disponible; vuelva a generarlo"}), 404
+    if trabajo.clave in request.if_none_match:
+        return respuesta_no_modificado(trabajo.clave)
+    pdf = abrir_pdf(trabajo.pdf)
+    if pdf is None:
+        return jsonify({"error": "El PDF ya no está disponible; vuelva a generarlo"}), 404
+    return respuesta_pdf(pdf, trabajo.clave, trabajo.nombre_archivo)
 
 # --- Eliminar la ruta y función innecesaria de plantilla original ---
 @app.route('/descargar_plantilla', methods=['POST'])
+@instrumentar('descargar_plantilla')
 def descargar_plantilla():
     try:
         data = request.json
-        num_invitados = int(data.get('num_invitados', 0))  # Extraer num_invitados de los datos recibidos
-        # --- Inicio: Debugging --- 
-        print("----- Datos recibidos en /descargar_plantilla -----") 
-        import json 
-        print(json.dumps(data, indent=2))
-        print("--------------------------------------------------")
+        registrar_cotizacion(logger, 'descargar_plantilla', data)
         # Verificar si la clave 'cotizacion' existe
         if 'cotizacion' not in data:
-             print("ERROR: La clave 'cotizacion' no se encontró en los datos recibididos.")
-             # Devolver un error claro al frontend
-             return jsonify({"error": "Datos de cotización incompletos: falta la clave 'cotizacion'"}), 400
-        # --- Fin: Debugging ---
-        
-        personalizacion = data.get('personalizacion', {})
-        # Crear un buffer para el PDF
-        buffer = BytesIO()
-        
-        # Crear el documento PDF con la plantilla original
-        doc = SimpleDocTemplate(buffer, pagesize=letter, leftMargin=36, rightMargin=36, topMargin=36, bottomMargin=36)
-        styles = getSampleStyleSheet()
-        elements = []
-        
-        # Colores predeterminados
-        color_principal = colors.HexColor('#1a237e')  # Azul oscuro
-        color_secundario = colors.HexColor('#3949ab')  # Azul medio
-        color_acento = colors.HexColor('#ff9800')  # Naranja
-        color_fondo = colors.HexColor('#f5f5f5')  # Gris muy claro
-        color_texto = colors.HexColor('#212121')  # Casi negro
-        
-        # --- PORTADA DE INTRODUCCIÓN ---
-        portada_personalizacion = personalizacion.get('portada', {})
-        # Obtener datos de la cotización principal
-        portada_lugar = data.get('lugar', '')
-        portada_nombres = data.get('nombre', '') # Usar 'nombre' de cotizacionData
-        portada_fecha = data.get('fecha', '')
-        portada_num_personas = data.get('num_personas', '')
-        # Obtener datos de personalización de la portada
-        portada_tipo_evento = portada_personalizacion.get('tipo_evento', '')
-        portada_titulo_tipo_evento = portada_personalizacion.get('titulo_tipo_evento', '')
-        
-        # Página de portada: usaremos la imagen tono y carla.jpg como fondo
-        from reportlab.platypus import Frame
-        from reportlab.lib.utils import ImageReader
-        import os
-        def portada_canvas(canvas, doc):
-            # Imagen de fondo
-            img_path = os.path.join('static', 'img', 'tono y carla.jpg')
-            abs_img_path = os.path.abspath(img_path)
-            page_width, page_height = letter
+            logger.warning("Falta la clave 'cotizacion' en los datos recibidos",
+                           extra={'campos': {'ruta': 'descargar_plantilla', 'claves': sorted(data)}})
+            # Devolver un error claro al frontend
+            return jsonify({"error": "Datos de cotización incompletos: falta la clave 'cotizacion'"}), 400
+        data = dict(data, total=total_enviado(data))
+    except Exception as e:
+        logger.exception("Error al generar el PDF")
+        return jsonify({"error": f"Error al generar el PDF: {str(e)}"}), 500
+    return descargar_plantilla_de(data)
+
+def descargar_plantilla_de(data):
+    """Respuesta con el PDF de la cotización `data`, desde la caché o generado en un proceso de trabajo."""
+    try:
+        # Mismo contenido, mismo PDF: la clave sirve también como ETag
+        clave = pdf_cotizacion.clave_pdf(data)
+        g.etapas.marcar('clave')
+        if clave in request.if_none_match:
+            return respuesta_no_modificado(clave)
+
+        pdf = cache_pdf.abrir(clave)
+        g.etapas.marcar('cache')
+        # Generar en un proceso de trabajo; este hilo solo espera el resultado. Si la caché
+        # descarta el PDF recién generado antes de abrirlo, se genera una vez más
+        for _ in range(INTENTOS_PDF):
+            if pdf is not None:
+                break
             try:
-                img_reader = ImageReader(abs_img_path)
-                canvas.saveState()
-                # Dibujar imagen de fondo
-                canvas.drawImage(img_reader, 0, 0, width=page_width, height=page_height, mask='auto')
-                # Dibujar capa semitransparente negra encima
-                canvas.setFillColor(colors.Color(0, 0, 0, alpha=0.5))
-                canvas.rect(0, 0, page_width, page_height, fill=1, stroke=0)
-                canvas.restoreState()
-            except Exception as e:
-                print(f"Error al dibujar fondo de portada: {e}")
-        
-        portada_elements = []
-        # Espaciado superior
-        portada_elements.append(Spacer(1, 1.5*inch))
-        # Título principal (tipo de evento personalizado)
-        portada_titulo_style = ParagraphStyle(
-            'PortadaTituloStyle',
-            parent=styles['Heading1'],
-            alignment=1,
-            fontName=FONT_BOLD,
-            fontSize=32,
-            textColor=colors.white,
-            leading=36,
-            spaceAfter=20
-            # backColor=colors.Color(0, 0, 0, alpha=0.5) # Eliminado nuevamente
-        )
-        titulo_portada = portada_titulo_tipo_evento if portada_titulo_tipo_evento else (portada_tipo_evento or 'Evento')
-        portada_elements.append(Paragraph(titulo_portada, portada_titulo_style))
-        portada_elements.append(Spacer(1, 0.2*inch))
-        # Nombres de festejados
-        if portada_nombres:
-            portada_elements.append(Paragraph(f"<b>Festejado(s):</b> {portada_nombres}", ParagraphStyle('PortadaNombres', parent=styles['Normal'], alignment=1, fontSize=18, textColor=colors.white, leading=22))) # backColor eliminado
-            portada_elements.append(Spacer(1, 0.1*inch))
-        # Lugar
-        if portada_lugar:
-            portada_elements.append(Paragraph(f"<b>Lugar:</b> {portada_lugar}", ParagraphStyle('PortadaLugar', parent=styles['Normal'], alignment=1, fontSize=16, textColor=colors.white, leading=20))) # backColor eliminado
-            portada_elements.append(Spacer(1, 0.1*inch))
-        # Fecha
-        if portada_fecha:
-            portada_elements.append(Paragraph(f"<b>Fecha:</b> {portada_fecha}", ParagraphStyle('PortadaFecha', parent=styles['Normal'], alignment=1, fontSize=16, textColor=colors.white, leading=20))) # backColor eliminado
-            portada_elements.append(Spacer(1, 0.1*inch))
-        # Número de personas
-        if portada_num_personas:
-            # Asegurarse de que num_personas sea una cadena para la concatenación
-            num_personas_str = str(portada_num_personas) if portada_num_personas is not None else ''
-            portada_elements.append(Paragraph(f"<b>Número de personas:</b> {num_personas_str}", ParagraphStyle('PortadaNumPersonas', parent=styles['Normal'], alignment=1, fontSize=16, textColor=colors.white, leading=20))) # backColor eliminado
-            portada_elements.append(Spacer(1, 0.1*inch))
-        # Tipo de evento (de la personalización)
-        if portada_tipo_evento:
-            portada_elements.append(Paragraph(f"<b>Tipo de evento:</b> {portada_tipo_evento}", ParagraphStyle('PortadaTipoEvento', parent=styles['Normal'], alignment=1, fontSize=16, textColor=colors.white, leading=20))) # backColor eliminado
-            portada_elements.append(Spacer(1, 0.1*inch))
-        # Espaciado inferior
-        portada_elements.append(Spacer(1, 2*inch))
-        # Pie de página
-        portada_elements.append(Paragraph("Cotización personalizada", ParagraphStyle('PortadaPie', parent=styles['Normal'], alignment=1, fontSize=12, textColor=colors.white, leading=16))) # backColor eliminado
-        
-        # Crear un documento temporal solo para la portada
-        portada_buffer = BytesIO()
-        portada_doc = SimpleDocTemplate(portada_buffer, pagesize=letter, leftMargin=0, rightMargin=0, topMargin=0, bottomMargin=0)
-        portada_doc.build(portada_elements, onFirstPage=portada_canvas)
-        portada_buffer.seek(0)
-        # Leer la portada como PDF y agregarla como primera página
-        from PyPDF2 import PdfReader, PdfWriter
-        portada_pdf = PdfReader(portada_buffer)
-        # Ahora generamos el resto del PDF como antes
-        
-        # Título principal con estilo predeterminado
-        titulo_style = ParagraphStyle(
-            'TituloStyle',
-            parent=styles['Heading1'],
-            alignment=1,  # Centrado
-            spaceAfter=20,
-            fontName=FONT_BOLD,
-            fontSize=24,
-            textColor=colors.white, # Descripciones en blanco según solicitud
-            # backColor=colors.Color(0, 0, 0, alpha=0.5), # Eliminado nuevamente
-            leading=30
-        )
-        # Obtener título personalizado o usar el predeterminado
-        titulo_personalizado = personalizacion.get('titulo', 'COTIZACIÓN')
-        elements.append(Paragraph(titulo_personalizado, titulo_style))
-        elements.append(Spacer(1, 0.25*inch))
-        
-        # Agregar texto adicional si existe
-        texto_adicional = personalizacion.get('texto_adicional')
-        if texto_adicional:
-            texto_adicional_style = ParagraphStyle(
-                'TextoAdicionalStyle',
-                parent=styles['Normal'],
-                alignment=1,  # Centrado
-                fontName=FONT_REGULAR,
-                fontSize=12,
-                textColor=colors.white, # Mantenido blanco
-                # backColor=colors.Color(0, 0, 0, alpha=0.5), # Eliminado nuevamente
-                leading=14,
-                spaceBefore=5,
-                spaceAfter=15
-            )
-            elements.append(Paragraph(texto_adicional, texto_adicional_style))
-            elements.append(Spacer(1, 0.2*inch))
-        
-        # Estilos para los elementos del PDF
-        servicio_style = ParagraphStyle(
-            'ServicioStyle',
-            parent=styles['Normal'],
-            alignment=0,  # Izquierda
-            fontName=FONT_BOLD,
-            fontSize=14,
-            textColor=colors.HexColor('#FFD700'), # Color dorado para títulos de servicio
-            # backColor=colors.Color(0, 0, 0, alpha=0.5), # Eliminado nuevamente
-            leading=16,
-            spaceBefore=10,
-            spaceAfter=2
-        )
-        
-        descripcion_style = ParagraphStyle(
-            'DescripcionStyle',
-            parent=styles['Normal'],
-            alignment=0,  # Izquierda
-            fontName=FONT_REGULAR,
-            fontSize=10,
-            textColor=colors.white, # Color de descripción establecido a blanco según solicitud
-            # backColor=colors.Color(0, 0, 0, alpha=0.5), # Eliminado nuevamente
-            leading=12,
-            leftIndent=30  # Aumentar sangría para viñetas
-        )
-        
-        precio_style = ParagraphStyle(
-            'PrecioStyle',
-            parent=styles['Normal'],
-            alignment=2,  # Derecha
-            fontName=FONT_BOLD,
-            fontSize=14,
-            textColor=colors.white, # Descripciones en blanco según solicitud
-            # backColor=colors.Color(0, 0, 0, alpha=0.5), # Eliminado nuevamente
-            leading=16
-        )
-
-        item_precio_style_for_extras = ParagraphStyle(
-            'ItemPrecioStyleForExtras',
-            parent=styles['Normal'],
-            alignment=2,  # Derecha
-            fontName=FONT_REGULAR,
-            fontSize=10,
-            textColor=colors.white,
-            leading=12
-        )
-        
-        # Crear filas para cada servicio (sin iconos)
-        tabla_servicios = []
-        for servicio in data['cotizacion']:
-            nombre_servicio = servicio['servicio']
-            precio = servicio['precio']
-            descripcion = ""
-            if nombre_servicio == 'Sonido':
-                # num_invitados ya está definido y es un entero desde el inicio de la función generar_cotizacion
-                if num_invitados <= 70:
-                    descripcion = "2 bocinas HK 115 FA"
-                elif num_invitados <= 150: # Asumido 150 para la segunda condición del usuario
-                    descripcion = "• Bocinas HK 115 FA<br/>• 2 Bajos Audio Center 18"
-                elif num_invitados <= 250:
-                    descripcion = "• 2 Bocinas HK 115 FA<br/>• 2 Bajos dobles Warfade 218"
-                else:
-                    # Fallback para más de 250 personas
-                    descripcion = "AUDIO PROFESIONAL<br/>• TÉCNICO DE AUDIO" # Descripción original como fallback
-            elif nombre_servicio == 'DJ':
-                descripcion = f"DJ PROFESIONAL<br/>• REPERTORIO PERSONALIZADO<br/>• CITA DE LOGÍSTICA MUSICAL PREVIA AL EVENTO"
-            elif nombre_servicio == 'Iluminación':
-                # Obtener el número de invitados de la solicitud principal
-                num_invitados_val = 0
-                try:
-                    # 'data' es el JSON de nivel superior recibido por /descargar_plantilla
-                    # Asegurarse de que 'num_invitados' esté presente y no sea una cadena vacía antes de convertir
-                    num_invitados_str = str(data.get('num_invitados', '0')).strip() # Default to '0' string if not found
-                    if num_invitados_str: # Si no está vacío después de strip
-                        num_invitados_val = int(num_invitados_str)
-                except (ValueError, TypeError):
-                    # Si la conversión falla o el tipo es incorrecto, num_invitados_val permanece 0.
-                    pass # num_invitados_val sigue siendo 0
-
-                if num_invitados_val > 0 and num_invitados_val <= 70:
-                    descripcion = "A elegir:<br/>• 2 cabezas robóticas 7r o 6 ParLed"
-                elif num_invitados_val <= 150: # Implica > 70
-                    descripcion = "• 2 cabezas robóticas 7r<br/>• 6 ParLed"
-                elif num_invitados_val <= 250: # Implica > 150
-                    descripcion = "• 6 cabezas robóticas 7r<br/>• 12 ParLed"
-                elif num_invitados_val <= 350: # Implica > 250
-                    descripcion = "• 10 cabezas robóticas 7r<br/>• 20 ParLed"
-                elif num_invitados_val > 350:
-                    descripcion = "Equipamiento de iluminación para más de 350 personas (contactar para cotización)"
-                else: # num_invitados_val es 0 o negativo (inválido porque no entró en >0)
-                    descripcion = "ILUMINACIÓN PARA LA PISTA<br/>• ILUMINACIÓN ROBÓTICA BEAM/SPOT (Cantidad de invitados no especificada o inválida)"
-            elif nombre_servicio == 'Pista de baile':
-                # Determinar el tamaño de la pista según el número de invitados
-                num_invitados_val = int(data.get('num_invitados', 0))
-                descripcion_base = ""
-                if num_invitados_val <= 70:
-                    descripcion_base = "•Pista de baile proporcional a 70 personas"
-                elif num_invitados_val <= 150:
-                    descripcion_base = "•Pista de baile proporcional a 150 personas"
-                elif num_invitados_val <= 250:
-                    descripcion_base = "•Pista de baile proporcional a 250 personas"
-                elif num_invitados_val <= 350:
-                    descripcion_base = "•Pista de baile proporcional a 350 personas"
-                else:
-                    descripcion_base = "Pista de baile (tamaño a cotizar)"
-                descripcion = f"{descripcion_base}<br/>• Pintada a mano con diseño (dos colores)"
-            if isinstance(precio, (int, float)):
-                precio_str = f"$ {precio:,.2f}"
-            elif isinstance(precio, str):
-                precio_str = precio
+                trabajo = cola_pdf.encolar(data, clave, nombre_archivo_pdf(data), destino=cache_pdf.destino(clave))
+                cola_pdf.esperar(trabajo, app.config['PDF_ESPERA_RESPUESTA'])
+            except (ColaLlena, PDFDemorado) as e:
+                return respuesta_cola_llena(e)
+            g.etapas.marcar('espera')
+            g.etapas_pdf = trabajo.etapas
+            if trabajo.error:
+                return jsonify({"error": trabajo.error}), 500
+            pdf = abrir_pdf(trabajo.pdf)
+        if pdf is None:
+            return respuesta_cola_llena(ColaLlena(1))
+
+        response = respuesta_pdf(pdf, clave, nombre_archivo_pdf(data))
+        g.etapas.marcar('respuesta')
+        return response
+    except Exception as e:
+        logger.exception("Error al generar el PDF")
+        return jsonify({"error": f"Error al generar el PDF: {str(e)}"}), 500
+
+def cargar_guardada(id_cotizacion, cambios=None):
+    """Cotización guardada con los ajustes de `cambios` aplicados.
+
+    Los ajustes solo valen para el documento que se está generando: la cotización guardada
+    no cambia. Lanza LookupError si no existe y ValueError si los ajustes no son válidos.
+    Los precios y el total ya los calculó el servidor: no se vuelven a validar.
+    """
+    data = almacen.obtener(id_cotizacion) if isinstance(id_cotizacion, str) else None
+    if data is None:
+        raise LookupError("La cotización no existe")
+    cambios = {} if cambios is None else cambios
+    if not isinstance(cambios, dict):
+        raise ValueError("Se esperaba un objeto con los ajustes de la cotización")
+    return aplicar_ajustes(data, cambios)
+
+def cotizacion_guardada(id_cotizacion, cambios):
+    """(cotización, None) según cargar_guardada, o (None, respuesta de error) si falla."""
+    try:
+        data = cargar_guardada(id_cotizacion, cambios)
+    except LookupError as e:
+        return None, (jsonify({"error": str(e)}), 404)
+    except ValueError as e:
+        return None, (jsonify({"error": str(e)}), 400)
+    g.etapas.marcar('lectura')
+    return data, None
+
+@app.route('/descargar_plantilla/<id_cotizacion>', methods=['GET', 'POST'])
+@instrumentar('descargar_plantilla_id')
+def descargar_plantilla_guardada(id_cotizacion):
+    """PDF de una cotización guardada por /generar_cotizacion.
+
+    Con POST se pueden enviar `descuentos`, `viaticos`, `extras` y `personalizacion`
+    para este PDF; la cotización guardada no cambia.
+    """
+    cambios = (request.get_json(silent=True) or {}) if request.method == 'POST' else {}
+    data, error = cotizacion_guardada(id_cotizacion, cambios)
+    if error is not None:
+        return error
+    return descargar_plantilla_de(data)
+
+def requiere_historial(vista):
+    """Solo atiende con `Authorization: Bearer <HISTORIAL_TOKEN>`; sin token configurado, 404."""
+    @functools.wraps(vista)
+    def envoltura(*args, **kwargs):
+        token = app.config['HISTORIAL_TOKEN']
+        if not token:
+            return jsonify({"error": "El historial de cotizaciones no está habilitado"}), 404
+        esquema, _, enviado = request.headers.get('Authorization', '').partition(' ')
+        if esquema.lower() != 'bearer' or not hmac.compare_digest(enviado.encode(), token.encode()):
+            response = jsonify({"error": "Se requiere autorización para consultar el historial"})
+            response.status_code = 401
+            response.headers['WWW-Authenticate'] = 'Bearer'
+            return response
+        return vista(*args, **kwargs)
+    return envoltura
+
+@app.route('/cotizaciones')
+@instrumentar('cotizaciones')
+@requiere_historial
+def buscar_cotizaciones():
+    """Historial de cotizaciones guardadas, por páginas y de la más reciente a la más antigua.
+
+    Filtros opcionales: texto (inicio del nombre del cliente), tipo_evento, desde y hasta
+    (fecha del evento, dd/mm/aaaa o aaaa-mm-dd), total_min y total_max; además pagina y por_pagina.
+    """
+    args = request.args
+    filtros = {'texto': args.get('texto'), 'tipo_evento': args.get('tipo_evento'),
+               'total_min': args.get('total_min', type=float), 'total_max': args.get('total_max', type=float),
+               'pagina': args.get('pagina', 1, type=int), 'por_pagina': args.get('por_pagina', 20, type=int)}
+    for campo in ('desde', 'hasta'):
+        if args.get(campo):
+            filtros[campo] = fecha_iso(args[campo])
+            if filtros[campo] is None:
+                return jsonify({"error": f"Fecha '{campo}' inválida; use dd/mm/aaaa o aaaa-mm-dd"}), 400
+    resultado = almacen.buscar(**filtros)
+    g.etapas.marcar('busqueda')
+    return jsonify(resultado)
+
+@app.route('/cotizaciones/<id_cotizacion>')
+@requiere_historial
+def obtener_cotizacion(id_cotizacion):
+    data = almacen.obtener(id_cotizacion)
+    if data is None:
+        return jsonify({"error": "La cotización no existe"}), 404
+    return jsonify(dict(data, id=id_cotizacion))
+
+# --- Exportación de varias cotizaciones ---
+FORMATOS_LOTE = ('zip', 'pdf')
+
+# Bytes que se leen de cada PDF en disco por vez al armar el ZIP
+TAMANO_PARTE_ZIP = 256 * 1024
+
+def documentos_lote(entradas, maximo=None):
+    """[(cotización, clave del PDF)] de cada entrada del lote.
+
+    Cada entrada es el id de una cotización guardada, {'id': ..., ajustes} o la cotización
+    completa. Lanza ValueError, o LookupError si un id no existe, indicando qué entrada falla.
+    """
+    if not isinstance(entradas, list) or not entradas:
+        raise ValueError("Se esperaba una lista 'cotizaciones' no vacía")
+    if maximo is not None and len(entradas) > maximo:
+        raise ValueError(f"Se recibieron {len(entradas)} cotizaciones; el máximo es {maximo}")
+    documentos = []
+    for numero, entrada in enumerate(entradas, 1):
+        try:
+            if isinstance(entrada, str):
+                data = cargar_guardada(entrada)
+            elif isinstance(entrada, dict) and 'id' in entrada:
+                data = cargar_guardada(entrada['id'], entrada)
+            elif isinstance(entrada, dict) and 'cotizacion' in entrada:
+                data = dict(entrada, total=total_enviado(entrada))
             else:
-                precio_str = "Consultar"
-            # Fila: servicio (con descripción si existe) y precio
-            texto_servicio = nombre_servicio
-            if descripcion:
-                texto_servicio += f"<br/><span fontSize=10>{descripcion}</span>"
-            tabla_servicios.append([
-                Paragraph(texto_servicio, servicio_style),
-                Paragraph(precio_str, precio_style)
-            ])
-        # Agregar servicios automáticos si existen
-        if 'servicios_automaticos' in data and data['servicios_automaticos']:
-            for servicio in data['servicios_automaticos']:
-                nombre_servicio = servicio['servicio']
-                precio = servicio['precio']
-                incluido = servicio.get('incluido', False)
-                descripcion = ""
-                if nombre_servicio == 'Barra de bebidas':
-                    descripcion = "•Pintada a mano con diseño (dos colores)"
-                elif nombre_servicio == 'Cabina de DJ':
-                    descripcion = "•Pintada a mano con diseño (dos colores)"
-                elif nombre_servicio == 'Back pintado a mano':
-                    descripcion = "•Pintada a mano con diseño (dos colores)"
-                if isinstance(precio, (int, float)):
-                    precio_str = f"$ {precio:,.2f}"
-                elif isinstance(precio, str):
-                    precio_str = precio
-                else:
-                    precio_str = "Incluido"
-                nombre_con_etiqueta = f"{nombre_servicio} {'(Incluido)' if incluido else ''}"
-                texto_servicio = nombre_con_etiqueta
-                if descripcion:
-                    texto_servicio += f"<br/><span fontSize=10>{descripcion}</span>"
-                tabla_servicios.append([
-                    Paragraph(texto_servicio, servicio_style),
-                    Paragraph(precio_str, precio_style)
-                ])
-        # Agregar descuentos si existen
-        descuentos_data = data.get('descuentos', [])
-        if descuentos_data:
-            tabla_servicios.append([
-                Paragraph("Descuentos", servicio_style),
-                Paragraph("", servicio_style)  # Celda vacía para la segunda columna del título
-            ])
-            for descuento in descuentos_data:
-                desc = descuento.get('descripcion', '')
-                try:
-                    monto = float(descuento['monto'])
-                    precio_str = f"- $ {monto:,.2f}"
-                except (ValueError, TypeError):
-                    precio_str = f"- $ {descuento['monto']}"
-                tabla_servicios.append([
-                    Paragraph(desc, descripcion_style),  # Usar descripcion_style para el ítem
-                    Paragraph(precio_str, item_precio_style_for_extras) # Usar nuevo estilo para el precio del ítem
-                ])
-        # Agregar viáticos desglosados si existen
-        viaticos_data = data.get('viaticos', [])
-        if viaticos_data:
-            tabla_servicios.append([
-                Paragraph("Viáticos", servicio_style),
-                Paragraph("", servicio_style)
-            ])
-            for viatico in viaticos_data:
-                desc = viatico.get('descripcion', '')
-                try:
-                    monto = float(viatico['monto'])
-                    precio_str = f"$ {monto:,.2f}"
-                except (ValueError, TypeError):
-                    precio_str = f"$ {viatico['monto']}"
-                tabla_servicios.append([
-                    Paragraph(desc, descripcion_style),
-                    Paragraph(precio_str, item_precio_style_for_extras)
-                ])
-        # Agregar extras si existen
-        extras_data = data.get('extras', [])
-        if extras_data:
-            tabla_servicios.append([
-                Paragraph("Extras", servicio_style),
-                Paragraph("", servicio_style)
-            ])
-            for extra in extras_data:
-                desc = extra.get('descripcion', 'Adicional')
-                try:
-                    monto = float(extra['monto'])
-                    precio_str = f"$ {monto:,.2f}"
-                except (ValueError, TypeError):
-                    precio_str = f"$ {extra['monto']}"
-                tabla_servicios.append([
-                    Paragraph(desc, descripcion_style),
-                    Paragraph(precio_str, item_precio_style_for_extras)
-                ])
-        # Insertar tabla de servicios y precios
-        from reportlab.platypus import Table, TableStyle
-        tabla = Table(tabla_servicios, colWidths=[340, 100])
-        tabla.setStyle(TableStyle([
-            ('ALIGN', (0,0), (0,-1), 'LEFT'),
-            ('ALIGN', (1,0), (1,-1), 'RIGHT'),
-            ('VALIGN', (0,0), (-1,-1), 'TOP'),
-            ('TEXTCOLOR', (0,0), (-1,-1), colors.white),
-            ('FONTNAME', (0,0), (-1,-1), FONT_REGULAR),
-            ('FONTSIZE', (0,0), (-1,-1), 12),
-            ('BOTTOMPADDING', (0,0), (-1,-1), 8),
-            ('TOPPADDING', (0,0), (-1,-1), 8),
-            ('LEFTPADDING', (0,0), (-1,-1), 2),
-            ('RIGHTPADDING', (0,0), (-1,-1), 2),
-        ]))
-        elements.append(tabla)
-        elements.append(Spacer(1, 0.2*inch))
-
-        # Eliminar duplicación: NO volver a agregar servicios automáticos, descuentos, viáticos ni extras aquí
-        # Ya están incluidos en la tabla_servicios
-
-        # Calcular el total igual que en la previsualización
-        total = 0
-        # Sumar servicios
-        for servicio in data.get('cotizacion', []):
-            try:
-                total += float(servicio['precio'])
-            except (ValueError, TypeError, KeyError):
-                pass
-        # Sumar servicios automáticos
-        for servicio in data.get('servicios_automaticos', []):
-            try:
-                total += float(servicio['precio'])
-            except (ValueError, TypeError, KeyError):
-                pass
-        # Restar descuentos
-        for descuento in data.get('descuentos', []):
-            try:
-                total -= float(descuento['monto'])
-            except (ValueError, TypeError, KeyError):
-                pass
-        # Sumar viáticos
-        for viatico in data.get('viaticos', []):
-            try:
-                total += float(viatico['monto'])
-            except (ValueError, TypeError, KeyError):
-                pass
-        # Sumar extras
-        for extra in data.get('extras', []):
-            try:
-                total += float(extra['monto'])
-            except (ValueError, TypeError, KeyError):
-                pass
-
-        # Agregar línea separadora antes del total
-        elements.append(Spacer(1, 0.5*inch))
-
-        # Agregar el total con un estilo destacado
-        total_style = ParagraphStyle(
-            'TotalStyle',
-            parent=styles['Heading1'],
-            alignment=1,  # Centrado
-            fontName=FONT_BOLD,
-            fontSize=24,  # Aumentado de 20 a 24
-            textColor=colors.white, # Descripciones en blanco según solicitud
-            # backColor=colors.Color(0, 0, 0, alpha=0.5), # Eliminado nuevamente
-            leading=28, # Ajustado el leading
-            spaceBefore=10,
-            spaceAfter=10
-        )
-        total_formateado = f"<u>TOTAL:   $ {total:,.2f}</u>" # Añadido subrayado
-        elements.append(Paragraph(total_formateado, total_style))
-        
-        # Verificar si se deben incluir términos y condiciones
-        incluir_terminos = personalizacion.get('incluir_terminos', True)
-        
-        if incluir_terminos:
-            # Agregar página de términos y condiciones
-            elements.append(PageBreak())
-            
-            # Título de términos y condiciones
-            terminos_titulo_style = ParagraphStyle(
-                'TerminosTituloStyle',
-                parent=styles['Heading1'],
-                alignment=1,  # Centrado
-                spaceAfter=15,
-                fontName=FONT_BOLD,
-                fontSize=18,
-                textColor=colors.white, # Mantenido blanco
-                # backColor=colors.Color(0, 0, 0, alpha=0.5), # Eliminado nuevamente
-                leading=22
-            )
-            
-            # Título personalizado para términos y condiciones
-            terminos_titulo = personalizacion.get('terminos_titulo', "TÉRMINOS Y CONDICIONES")
-            elements.append(Paragraph(terminos_titulo, terminos_titulo_style))
-            
-            # Contenido de términos y condiciones
-            terminos_style = ParagraphStyle(
-                'TerminosStyle',
-                parent=styles['Normal'],
-                alignment=0,  # Izquierda
-                fontName=FONT_REGULAR,
-                fontSize=10,
-                textColor=colors.white, # Mantenido blanco
-                # backColor=colors.Color(0, 0, 0, alpha=0.5), # Eliminado nuevamente
-                leading=14,
-                spaceBefore=6,
-                spaceAfter=6
-            )
-            
-            # Texto de términos y condiciones
-            terminos_texto = [
-                "1. <b>Validez de la cotización:</b> Esta cotización tiene una validez de 15 días a partir de la fecha de emisión.",
-                "2. <b>Reserva del servicio:</b> Para confirmar la reserva del servicio se requiere un anticipo del 50% del valor total.",
-                "3. <b>Cancelaciones:</b> En caso de cancelación, el anticipo no será reembolsable si se realiza con menos de 30 días de anticipación al evento.",
-                "4. <b>Cambios de fecha:</b> Los cambios de fecha están sujetos a disponibilidad y deberán solicitarse con al menos 15 días de anticipación.",
-                "5. <b>Horas adicionales:</b> Las horas adicionales no contempladas en esta cotización tendrán un costo extra según las tarifas vigentes.",
-                "6. <b>Condiciones del lugar:</b> El cliente debe garantizar las condiciones adecuadas para la instalación y operación de los equipos (acceso, espacio, energía eléctrica, etc.).",
-                "7. <b>Daños al equipo:</b> Cualquier daño causado a los equipos por mal uso, negligencia o causas ajenas al proveedor será responsabilidad del cliente.",
-                "8. <b>Fuerza mayor:</b> En caso de situaciones de fuerza mayor que impidan la realización del servicio, se acordará una nueva fecha sin costo adicional.",
-                "9. <b>Pago final:</b> El pago del saldo restante deberá realizarse 7 días antes del evento.",
-                "10. <b>Servicios adicionales:</b> Cualquier servicio adicional no incluido en esta cotización deberá ser acordado previamente y tendrá un costo extra."
-            ]
-            
-            for parrafo in terminos_texto:
-                elements.append(Paragraph(parrafo, terminos_style))
-            
-            # Nota final personalizada o predeterminada
-            nota_final = personalizacion.get('nota_final', "Al aceptar esta cotización, el cliente acepta todos los términos y condiciones aquí establecidos.")
-            
-            nota_style = ParagraphStyle(
-                'NotaStyle',
-                parent=styles['Normal'],
-                alignment=1,  # Centrado
-                fontName=FONT_REGULAR,
-                fontSize=9,
-                textColor=colors.white, # Mantenido blanco
-                # backColor=colors.Color(0, 0, 0, alpha=0.5), # Eliminado nuevamente
-                leading=12,
-                spaceBefore=20
-            )
-            elements.append(Spacer(1, 0.3*inch))
-            elements.append(Paragraph(nota_final, nota_style))
-        
-        # Construir el PDF, aplicando la función de fondo/logo a cada página
-        # --- NUEVA LÓGICA DE FONDOS POR SECCIÓN ---
-        def cotizacion_canvas(canvas, doc):
-            img_path = os.path.join('static', 'img', 'fondo 2 cabina.jpg')
-            abs_img_path = os.path.abspath(img_path)
-            page_width, page_height = letter
-            try:
-                img_reader = ImageReader(abs_img_path)
-                canvas.saveState()
-                # Dibujar imagen de fondo
-                canvas.drawImage(img_reader, 0, 0, width=page_width, height=page_height, mask='auto')
-                # Dibujar capa semitransparente negra encima
-                canvas.setFillColor(colors.Color(0, 0, 0, alpha=0.5))
-                canvas.rect(0, 0, page_width, page_height, fill=1, stroke=0)
-                canvas.restoreState()
-            except Exception as e:
-                print(f"Error al dibujar fondo de cotización: {e}")
-        def terminos_canvas(canvas, doc):
-            img_path = os.path.join('static', 'img', 'terminod y condiciones fondo.png')
-            abs_img_path = os.path.abspath(img_path)
-            page_width, page_height = letter
+                raise ValueError("se esperaba un id o una cotización con la clave 'cotizacion'")
+        except (LookupError, ValueError) as e:
+            raise type(e)(f"Cotización {numero}: {e}") from e
+        documentos.append((data, pdf_cotizacion.clave_pdf(data)))
+    return documentos
+
+def _resultado_pdf(nombre, pdf, espera):
+    if isinstance(pdf, TrabajoPDF):
+        try:
+            cola_pdf.esperar(pdf, espera)
+        except PDFDemorado as e:
+            return nombre, None, str(e)
+        if pdf.error:
+            return nombre, None, pdf.error
+        pdf = pdf.pdf
+    return nombre, pdf, None
+
+def pdfs_lote(documentos, espera=None):
+    """Genera en paralelo los PDFs del lote y entrega (nombre, pdf, error) de cada uno, en orden.
+
+    Los PDFs que ya están en la caché no se vuelven a generar. Si la cola de PDFs está
+    llena, espera al más antiguo de los suyos antes de encolar el siguiente. Un PDF que
+    no termina en `espera` segundos (None: sin límite) se entrega con error.
+    """
+    pendientes = deque()
+    for numero, (data, clave) in enumerate(documentos, 1):
+        nombre = nombre_archivo_pdf(data)
+        pdf = cache_pdf.obtener(clave)
+        while pdf is None:
             try:
-                img_reader = ImageReader(abs_img_path)
-                canvas.saveState()
-                # Obtener tamaño real de la imagen
-                img_width, img_height = img_reader.getSize()
-                # Calcular escala para cubrir toda la página (cover)
-                scale = max(page_width / img_width, page_height / img_height)
-                draw_width = img_width * scale
-                draw_height = img_height * scale
-                # Centrar la imagen
-                x = (page_width - draw_width) / 2
-                y = (page_height - draw_height) / 2
-                canvas.drawImage(img_reader, x, y, width=draw_width, height=draw_height, mask='auto')
-                # Dibujar capa semitransparente negra encima
-                canvas.setFillColor(colors.Color(0, 0, 0, alpha=0.5))
-                canvas.rect(0, 0, page_width, page_height, fill=1, stroke=0)
-                canvas.restoreState()
-            except Exception as e:
-                print(f"Error al dibujar fondo de términos: {e}")
-        # --- FIN NUEVA LÓGICA ---
-        # Construcción de PDF por secciones
-        # 1. Portada
-        portada_buffer = BytesIO()
-        portada_doc = SimpleDocTemplate(portada_buffer, pagesize=letter, leftMargin=0, rightMargin=0, topMargin=0, bottomMargin=0)
-        portada_doc.build(portada_elements, onFirstPage=portada_canvas)
-        portada_buffer.seek(0)
-        from PyPDF2 import PdfReader, PdfWriter
-        portada_pdf = PdfReader(portada_buffer)
-        # 2. Cotización y total
-        cotizacion_buffer = BytesIO()
-        cotizacion_doc = SimpleDocTemplate(cotizacion_buffer, pagesize=letter, leftMargin=36, rightMargin=36, topMargin=36, bottomMargin=36)
-        # Extraer solo los elementos de cotización (sin portada ni términos)
-        cotizacion_elements = []
-        for el in elements:
-            if not (isinstance(el, Paragraph) and ("TÉRMINOS Y CONDICIONES" in el.getPlainText() or "TerminosTituloStyle" in str(el.style))):
-                cotizacion_elements.append(el)
+                pdf = cola_pdf.encolar(data, clave, nombre, destino=cache_pdf.destino(clave))
+            except ColaLlena as e:
+                if pendientes:
+                    yield _resultado_pdf(*pendientes.popleft(), espera)
+                else:
+                    # La cola está ocupada con PDFs de otras peticiones
+                    time.sleep(e.reintentar_en)
+        pendientes.append((f"{numero:03d}_{nombre}", pdf))
+    while pendientes:
+        yield _resultado_pdf(*pendientes.popleft(), espera)
+
+class SalidaZip:
+    """Archivo de solo escritura para zipfile: guarda lo escrito hasta que se entrega."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes.clear()
+        return datos
+
+def zip_pdfs(pdfs):
+    """Arma por partes el ZIP de los PDFs (nombre, pdf, error), sin tenerlo completo en memoria.
+
+    Los PDFs que fallaron se listan en errores.txt dentro del ZIP.
+    """
+    salida = SalidaZip()
+    errores = []
+    # Los PDFs ya van comprimidos por dentro: se guardan sin volver a comprimirlos
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_STORED) as archivo_zip:
+        for nombre, pdf, error in pdfs:
+            if error:
+                errores.append(f"{nombre}: {error}")
+                continue
+            if isinstance(pdf, bytes):
+                archivo_zip.writestr(nombre, pdf)
             else:
-                break
-        cotizacion_doc.build(cotizacion_elements, onFirstPage=cotizacion_canvas, onLaterPages=cotizacion_canvas)
-        cotizacion_buffer.seek(0)
-        cotizacion_pdf = PdfReader(cotizacion_buffer)
-        # 3. Términos y condiciones (si existen)
-        terminos_pdf = None
-        if incluir_terminos:
-            terminos_buffer = BytesIO()
-            terminos_doc = SimpleDocTemplate(terminos_buffer, pagesize=letter, leftMargin=36, rightMargin=36, topMargin=36, bottomMargin=36)
-            # Extraer solo los elementos de términos
-            terminos_start = False
-            terminos_elements = []
-            for el in elements:
-                if isinstance(el, Paragraph) and ("TÉRMINOS Y CONDICIONES" in el.getPlainText() or "TerminosTituloStyle" in str(el.style)):
-                    terminos_start = True
-                if terminos_start:
-                    terminos_elements.append(el)
-            if terminos_elements:
-                terminos_doc.build(terminos_elements, onFirstPage=terminos_canvas, onLaterPages=terminos_canvas)
-                terminos_buffer.seek(0)
-                terminos_pdf = PdfReader(terminos_buffer)
-        # Unir todas las secciones en un solo PDF
-        writer = PdfWriter()
-        # Portada
-        for page in portada_pdf.pages:
-            writer.add_page(page)
-        # Cotización
-        for page in cotizacion_pdf.pages:
-            writer.add_page(page)
-        # Términos
-        if terminos_pdf:
-            for page in terminos_pdf.pages:
-                writer.add_page(page)
-        # Guardar el PDF final en el buffer principal
-        buffer.seek(0)
-        buffer.truncate(0)
-        writer.write(buffer)
-        buffer.seek(0)
-
-        # Asegurar que el buffer tenga contenido antes de enviarlo
-        if buffer.getbuffer().nbytes > 0:
-            # Obtener nombre y tipo de evento con manejo de errores
-            # Usar datos de la cotización principal para el nombre del archivo
-            tipo_evento_archivo = data.get('tipo_evento', 'Evento') # Podría ser el personalizado o el original
-            nombre_archivo = data.get('nombre', 'Cliente')
-            fecha_archivo = data.get('fecha', 'SinFecha').replace('/', '-')
-            
-            response = send_file(
-                buffer,
-                as_attachment=True,
-                download_name=f"Cotizacion_{tipo_evento_archivo}_{nombre_archivo}_{fecha_archivo}.pdf",
-                mimetype='application/pdf'
-            )
-            
-            # Agregar encabezados para evitar problemas de caché
-            response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-            response.headers["Pragma"] = "no-cache"
-            response.headers["Expires"] = "0"
-            
-            return response
+                try:
+                    origen = open(pdf, 'rb')
+                except OSError as e:
+                    # La caché lo eliminó mientras tanto
+                    errores.append(f"{nombre}: {e}")
+                    continue
+                with origen, archivo_zip.open(nombre, 'w') as destino:
+                    while parte := origen.read(TAMANO_PARTE_ZIP):
+                        destino.write(parte)
+                        yield salida.vaciar()
+            yield salida.vaciar()
+        if errores:
+            archivo_zip.writestr('errores.txt', '\n'.join(errores) + '\n')
+    yield salida.vaciar()
+
+def clave_lote(claves):
+    """Clave del PDF que une los PDFs con esas claves, en ese orden."""
+    return hashlib.sha256(('lote:' + ','.join(claves)).encode('utf-8')).hexdigest()
+
+def pdf_lote(documentos, espera=None):
+    """(clave, pdf, error) del PDF único con todo el lote, desde la caché o generado en un proceso de trabajo.
+
+    Se maqueta como un solo documento: fondos, fuentes y términos se incrustan una vez.
+    Lanza ColaLlena si no hay lugar en la cola de PDFs y PDFDemorado si no termina en
+    `espera` segundos (None: sin límite).
+    """
+    clave = clave_lote([clave for _, clave in documentos])
+    pdf = cache_pdf.obtener(clave)
+    if pdf is None:
+        trabajo = cola_pdf.encolar([data for data, _ in documentos], clave, 'Cotizaciones.pdf',
+                                   destino=cache_pdf.destino(clave), renderizar='pdf_cotizacion.renderizar_lote')
+        cola_pdf.esperar(trabajo, espera)
+        if trabajo.error:
+            return clave, None, trabajo.error
+        pdf = trabajo.pdf
+    return clave, pdf, None
+
+@app.route('/exportar_pdfs', methods=['POST'])
+@instrumentar('exportar_pdfs')
+def exportar_pdfs():
+    """PDFs de varias cotizaciones en una sola petición.
+
+    Acepta {'cotizaciones': [...], 'formato': 'zip' | 'pdf'}; cada cotización es un id
+    guardado, {'id': ..., ajustes} o la cotización completa. Con 'zip' (por omisión) los
+    PDFs se generan en paralelo y el ZIP se envía a medida que terminan; con 'pdf' se
+    genera un solo documento con todas las cotizaciones.
+    """
+    data = request.get_json(silent=True)
+    data = data if isinstance(data, dict) else {}
+    formato = data.get('formato', 'zip')
+    if formato not in FORMATOS_LOTE:
+        return jsonify({"error": f"Formato '{formato}' no válido; use 'zip' o 'pdf'"}), 400
+    try:
+        documentos = documentos_lote(data.get('cotizaciones'), app.config['MAX_PDFS_LOTE'])
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    g.etapas.marcar('lectura')
+
+    if formato == 'zip':
+        pdfs = pdfs_lote(documentos, app.config['PDF_ESPERA_RESPUESTA'])
+        response = app.response_class(zip_pdfs(pdfs), mimetype='application/zip')
+        response.headers['Content-Disposition'] = 'attachment; filename=Cotizaciones.zip'
+        return response
+
+    # La clave sale de las claves de cada cotización: revalidar antes de generar nada
+    clave = clave_lote([clave for _, clave in documentos])
+    if clave in request.if_none_match:
+        return respuesta_no_modificado(clave)
+    # Si la caché descarta el PDF antes de abrirlo, se genera una vez más
+    pdf = None
+    for _ in range(INTENTOS_PDF):
+        try:
+            clave, pdf, error = pdf_lote(documentos, app.config['PDF_ESPERA_RESPUESTA'])
+        except (ColaLlena, PDFDemorado) as e:
+            return respuesta_cola_llena(e)
+        g.etapas.marcar('espera')
+        if error:
+            return jsonify({"error": error}), 500
+        pdf = abrir_pdf(pdf)
+        if pdf is not None:
+            break
+    if pdf is None:
+        return respuesta_cola_llena(ColaLlena(1))
+    return respuesta_pdf(pdf, clave, 'Cotizaciones.pdf')
+
+def leer_cotizaciones(archivo):
+    """Cotizaciones de un archivo JSON (una lista o {'cotizaciones': [...]}) o JSON Lines,
+    leídas de a poco. Lanza EntradaInvalida en la primera que no sea JSON válido."""
+    for valor in leer_entradas(archivo):
+        if isinstance(valor, EntradaInvalida):
+            raise valor
+        if isinstance(valor, dict) and isinstance(valor.get('cotizaciones'), list):
+            yield from valor['cotizaciones']
         else:
-            return jsonify({"error": "No se pudo generar el PDF"}), 500
-    except Exception as e:
-        print(f"Error al generar el PDF: {e}")
-        return jsonify({"error": f"Error al generar el PDF: {str(e)}"}), 500
+            yield valor
+
+@app.cli.command('exportar-pdfs')
+@click.argument('archivos', nargs=-1, required=True, type=click.File('r', encoding='utf-8'))
+@click.option('--formato', type=click.Choice(FORMATOS_LOTE), default='zip', show_default=True,
+              help='Un ZIP con un PDF por cotización o un solo PDF con todas.')
+@click.option('--salida', required=True, type=click.Path(dir_okay=False, writable=True),
+              help='Archivo donde guardar el ZIP o el PDF.')
+def exportar_pdfs_comando(archivos, formato, salida):
+    """Exporta los PDFs de las cotizaciones de ARCHIVOS ('-' para la entrada estándar).
+
+    Cada archivo tiene una lista JSON o una cotización por línea: un id guardado,
+    {"id": ..., ajustes} o la cotización completa.
+    """
+    entradas = []
+    for archivo in archivos:
+        try:
+            entradas += leer_cotizaciones(archivo)
+        except EntradaInvalida as e:
+            raise click.ClickException(f"{archivo.name}: {e}")
+    try:
+        documentos = documentos_lote(entradas)
+        with open(salida, 'wb') as destino:
+            if formato == 'zip':
+                for parte in zip_pdfs(pdfs_lote(documentos)):
+                    destino.write(parte)
+            else:
+                _, pdf, error = pdf_lote(documentos)
+                if error:
+                    raise click.ClickException(error)
+                if isinstance(pdf, bytes):
+                    destino.write(pdf)
+                else:
+                    with open(pdf, 'rb') as origen:
+                        shutil.copyfileobj(origen, destino)
+    except (LookupError, ValueError) as e:
+        raise click.ClickException(str(e))
+    finally:
+        cola_pdf.cerrar()
+    click.echo(f"{len(documentos)} cotizaciones: {salida} ({os.path.getsize(salida) // 1024} KB)")
+
+@app.route('/metrics')
+def metricas():
+    """Métricas en formato de texto de Prometheus; 404 si están desactivadas (METRICAS=0)."""
+    if not METRICAS_ACTIVAS:
+        return jsonify({"error": "Las métricas están desactivadas"}), 404
+    return app.response_class(exponer_metricas(), mimetype='text/plain; version=0.0.4')
+
+@app.cli.command('preparar-fondos')
+@click.option('--perfil', 'perfiles', multiple=True, type=click.Choice(sorted(PERFILES_FONDOS)),
+              help='Perfil a generar (se puede repetir). Por omisión, el de PDF_PERFIL_FONDOS.')
+@click.option('--forzar', is_flag=True, help='Regenerar aunque los fondos estén al día.')
+def preparar_fondos_comando(perfiles, forzar):
+    """Genera los fondos del PDF escalados a la hoja y con la capa oscura aplicada."""
+    for clave, perfil, ruta in preparar_fondos(list(perfiles) or None, forzar):
+        click.echo(f"{clave} ({perfil}): {ruta} ({os.path.getsize(ruta) // 1024} KB)")
+
+@app.cli.command('construir-recursos')
+def construir_recursos_comando():
+    """Copia static/ con el hash del contenido en cada nombre y precomprime CSS y JS.
+
+    El servidor lee el manifiesto al arrancar: reiniciarlo después de construir.
+    """
+    manifiesto = construir(app.static_folder, app.config['STATIC_CONSTRUIDO'])
+    recursos.cargar()
+    for ruta, entrada in sorted(manifiesto.items()):
+        tamanos = ', '.join(f"{codificacion} {bytes_}" for codificacion, bytes_ in entrada['bytes'].items())
+        click.echo(f"{ruta} -> {entrada['archivo']} ({tamanos})")
+
+def calentar():
+    """Deja todo listo para el primer PDF: módulo, fuentes, estilos, fondos, términos y procesos.
+
+    Devuelve los pid de los procesos de trabajo.
+    """
+    # La importación registra su propia duración
+    pdf_cotizacion.cargar()
+    etapas = nuevas_etapas()
+    # El proceso web también calcula claves y puede generar PDFs: preparar lo mismo que un trabajador
+    pdf_cotizacion.precargar_fondos()
+    etapas.marcar('fondos')
+    pdf_cotizacion.terminos_prerenderizados()
+    etapas.marcar('terminos')
+    pids = cola_pdf.calentar()
+    etapas.marcar('trabajadores')
+    registrar_etapas('arranque', etapas.duraciones)
+    logger.info("Aplicación caliente", extra={'campos': {
+        'etapas_ms': {etapa: round(segundos * 1000, 1) for etapa, segundos in etapas.duraciones.items()}}})
+    return pids
+
+arranque.marcar('modulo_app')
+registrar_etapas('arranque', arranque.duraciones)
+logger.info("Aplicación importada (arranque %s)", app.config['ARRANQUE'] or 'predeterminado', extra={'campos': {
+    'etapas_ms': {etapa: round(segundos * 1000, 1) for etapa, segundos in arranque.duraciones.items()}}})
+
+if app.config['ARRANQUE'] == 'calentar' and __name__ != '__main__':
+    # Servidores WSGI: calentar al importar, antes de aceptar peticiones
+    calentar()
 
 if __name__ == '__main__':
+    # Con el recargador de debug solo el proceso que atiende peticiones necesita calentarse
+    if app.config['ARRANQUE'] != 'rapido' and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        calentar()
     app.run(debug=True)
             
\ No newline at end of file
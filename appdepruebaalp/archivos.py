@@ -0,0 +1,29 @@
+"""Rutas de la aplicación y escritura de archivos.
+
+Los módulos resuelven sus archivos (static/, fonts/, cachés) desde aquí y no desde el
+directorio de trabajo, que depende de dónde se arranque el servidor o la línea de comandos.
+"""
+import contextlib
+import os
+import tempfile
+
+# Directorio de la aplicación
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+@contextlib.contextmanager
+def escritura_atomica(destino):
+    """Archivo binario donde escribir `destino`: se escribe en un temporal del mismo
+    directorio que se renombra al terminar, así nadie lee (ni sirve) un archivo a medias
+    aunque varios procesos lo escriban a la vez. Si algo falla se borra el temporal y
+    `destino` queda como estaba."""
+    fd, temporal = tempfile.mkstemp(dir=os.path.dirname(destino), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as archivo:
+            yield archivo
+        os.replace(temporal, destino)
+    except BaseException:
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+        raise
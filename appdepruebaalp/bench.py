@@ -0,0 +1,320 @@
+"""Benchmarks de las rutas críticas: cálculo de cotizaciones y exportación a PDF.
+
+Uso:
+    python bench.py                                  # todos los benchmarks
+    python bench.py --solo pdf --repeticiones 20
+    python bench.py --solo estilos                   # estilos del PDF: construidos vs registro
+    python bench.py --salida resultados.json --comparar anterior.json
+
+Las peticiones pasan por el cliente de pruebas de Flask, así se mide lo mismo que
+atiende el servidor (validación, caché y cola de PDFs) sin la red de por medio.
+Los resultados se escriben en JSON para comparar entre commits. El límite de fuentes
+incrustadas en el PDF típico lo comprueba tests/test_pdf_cotizacion.py.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Las cotizaciones y los PDFs del benchmark van a un directorio aparte: ni se mezclan con
+# el historial de la aplicación ni una ejecución anterior deja PDFs en la caché. Se borra al
+# terminar (y, si se importa bench.py como módulo, al salir del intérprete)
+_directorio_bench = tempfile.TemporaryDirectory(prefix='bench_cotizaciones_')
+os.environ.setdefault('COTIZACIONES_DB', os.path.join(_directorio_bench.name, 'cotizaciones.db'))
+os.environ.setdefault('PDF_CACHE_DIR', os.path.join(_directorio_bench.name, 'pdf'))
+
+from app import app, calentar, cola_pdf
+from archivos import BASE_DIR
+from fondos_pdf import PERFIL_FONDOS
+from fuentes_pdf import bytes_fuentes
+from precios import PRECIOS, expandir_grid
+
+# Escenarios de cotización: cada combinación del grid es una petición
+GRID_COTIZACION = {
+    'tipo_evento': ['Boda', 'Cumpleaños', 'Bautizo', 'Quince años'],
+    'num_invitados': [50, 70, 100, 150, 200, 250, 300, 350, 400],
+    'duracion': [4, 5, 6, 7, 8, 9, 10, 11, 12],
+}
+BASE_COTIZACION = {
+    'servicios': list(PRECIOS),
+    'cantidad_chisperos': 4,
+    'tipo_precio_dj': 'fijo',
+}
+
+TEXTO_LARGO = ("Gracias por considerarnos para su evento. Incluimos montaje, pruebas de sonido "
+               "y coordinación con el resto de proveedores durante toda la noche. ") * 30
+
+def _conceptos(prefijo, cantidad, monto):
+    return [{'descripcion': f"{prefijo} {i + 1}", 'monto': monto + i * 50} for i in range(cantidad)]
+
+# Cargas para el PDF: (entrada de /generar_cotizacion, campos extra del PDF)
+CARGAS_PDF = {
+    'minima': (
+        {'tipo_evento': 'Cumpleaños', 'num_invitados': 50, 'duracion': 4, 'servicios': ['DJ']},
+        {'personalizacion': {}},
+    ),
+    'tipica': (
+        {'tipo_evento': 'Boda', 'num_invitados': 200, 'duracion': 8,
+         'servicios': ['DJ', 'Sonido', 'Iluminación', 'Pista de baile', 'Planta de luz']},
+        {'descuentos': _conceptos('Descuento', 1, 1000),
+         'viaticos': _conceptos('Viáticos', 1, 800),
+         'extras': _conceptos('Extra', 2, 1500),
+         'personalizacion': {'titulo': 'COTIZACIÓN', 'texto_adicional': TEXTO_LARGO[:300],
+                             'portada': {'tipo_evento': 'Boda', 'titulo_tipo_evento': 'Nuestra boda'}}},
+    ),
+    'maxima': (
+        dict(BASE_COTIZACION, tipo_evento='Boda', num_invitados=400, duracion=12),
+        {'descuentos': _conceptos('Descuento', 25, 500),
+         'viaticos': _conceptos('Viáticos', 25, 400),
+         'extras': _conceptos('Extra', 25, 900),
+         'personalizacion': {'titulo': 'COTIZACIÓN', 'texto_adicional': TEXTO_LARGO,
+                             'portada': {'tipo_evento': 'Boda', 'titulo_tipo_evento': 'Nuestra boda'}}},
+    ),
+}
+
+def percentiles_ms(tiempos):
+    ms = sorted(t * 1000 for t in tiempos)
+    if len(ms) > 1:
+        cortes = statistics.quantiles(ms, n=100, method='inclusive')
+        p50, p90, p95, p99 = cortes[49], cortes[89], cortes[94], cortes[98]
+    else:
+        p50 = p90 = p95 = p99 = ms[0]
+    return {'min': ms[0], 'p50': p50, 'p90': p90, 'p95': p95, 'p99': p99, 'max': ms[-1],
+            'media': statistics.fmean(ms)}
+
+def rss_pico_kb(pid=None):
+    """Memoria residente máxima (KB) de este proceso o del proceso `pid`; None si no se puede leer."""
+    if pid is not None:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for linea in f:
+                    if linea.startswith('VmHWM:'):
+                        return int(linea.split()[1])
+        except OSError:
+            pass
+        return None
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS lo reporta en bytes, Linux en KB
+    return pico // 1024 if sys.platform == 'darwin' else pico
+
+def medir(funcion, repeticiones, calentamiento=1):
+    """Ejecuta `funcion(i)` y devuelve latencias, throughput y tamaños de salida."""
+    for i in range(calentamiento):
+        funcion(-1 - i)
+    tiempos = []
+    tamanos = []
+    inicio = time.perf_counter()
+    for i in range(repeticiones):
+        t = time.perf_counter()
+        tamano = funcion(i)
+        tiempos.append(time.perf_counter() - t)
+        if tamano is not None:
+            tamanos.append(tamano)
+    total = time.perf_counter() - inicio
+    resultado = {
+        'iteraciones': repeticiones,
+        'latencia_ms': percentiles_ms(tiempos),
+        'por_segundo': repeticiones / total if total else None,
+    }
+    if tamanos:
+        resultado['bytes'] = {'min': min(tamanos), 'max': max(tamanos)}
+    return resultado
+
+def asignaciones(funcion, repeticiones):
+    """Memoria que pide `funcion()` por llamada según tracemalloc: pico y lo que queda asignado."""
+    funcion()
+    picos = []
+    retenidos = []
+    tracemalloc.start()
+    try:
+        for _ in range(repeticiones):
+            tracemalloc.clear_traces()
+            tracemalloc.reset_peak()
+            resultado = funcion()
+            actual, pico = tracemalloc.get_traced_memory()
+            picos.append(pico)
+            retenidos.append(actual)
+            del resultado
+    finally:
+        tracemalloc.stop()
+    return {'pico_bytes': statistics.fmean(picos), 'retenido_bytes': statistics.fmean(retenidos)}
+
+def bench_estilos(repeticiones):
+    """Estilos del PDF por petición: construirlos cada vez (como antes del registro de temas)
+    contra tomarlos del registro, con y sin cambios de tema en la personalización."""
+    import pdf_cotizacion
+
+    variante = {'tema': {'texto': '#EEEEEE', 'servicio': '#C0C0C0'}}
+    casos = {
+        # Lo que hacía cada petición: getSampleStyleSheet, cada ParagraphStyle y el TableStyle
+        'estilos_construidos': lambda: pdf_cotizacion._crear_tema((), **pdf_cotizacion._VALORES_TEMA),
+        'estilos_registro': lambda: pdf_cotizacion.tema_para({}),
+        'estilos_registro_variante': lambda: pdf_cotizacion.tema_para(variante),
+    }
+    resultados = {}
+    for nombre, funcion in casos.items():
+        def llamar(i, funcion=funcion):
+            funcion()
+        # Llamadas muy cortas: muchas iteraciones
+        resultados[nombre] = medir(llamar, repeticiones * 100)
+        resultados[nombre]['memoria'] = asignaciones(funcion, repeticiones * 10)
+    return resultados
+
+def _peticion(cliente, ruta, datos):
+    respuesta = cliente.post(ruta, json=datos)
+    if respuesta.status_code != 200:
+        raise RuntimeError(f"{ruta} respondió {respuesta.status_code}: {respuesta.get_data(as_text=True)[:200]}")
+    return respuesta
+
+def bench_cotizacion(cliente, repeticiones):
+    escenarios = expandir_grid(GRID_COTIZACION, BASE_COTIZACION)
+
+    def cotizar(i):
+        _peticion(cliente, '/generar_cotizacion', escenarios[i % len(escenarios)])
+
+    resultado = medir(cotizar, repeticiones * len(escenarios), calentamiento=len(escenarios))
+    resultado['escenarios'] = len(escenarios)
+    resultado['rss_pico_kb'] = {'web': rss_pico_kb()}
+    return {'cotizacion': resultado}
+
+def datos_pdf(cliente, carga, incluir_terminos):
+    entrada, extras = CARGAS_PDF[carga]
+    datos = dict(entrada, lugar='Salón Jardín', nombre='Ana y Luis', fecha='12/12/2026')
+    datos.update(_peticion(cliente, '/generar_cotizacion', datos).get_json())
+    datos.update(json.loads(json.dumps(extras)))
+    datos['personalizacion']['incluir_terminos'] = incluir_terminos
+    return datos
+
+def bench_pdf(cliente, repeticiones, pids_trabajadores):
+    resultados = {}
+    for carga in CARGAS_PDF:
+        for incluir_terminos in (True, False):
+            datos = datos_pdf(cliente, carga, incluir_terminos)
+            fuentes = bytes_fuentes(_peticion(cliente, '/descargar_plantilla', datos).get_data())
+
+            def exportar(i, datos=datos):
+                # Un nombre distinto por iteración cambia la clave: siempre se genera el PDF
+                variante = dict(datos, nombre=f"{datos['nombre']} #{i}")
+                return len(_peticion(cliente, '/descargar_plantilla', variante).get_data())
+
+            nombre = f"pdf_{carga}_{'con' if incluir_terminos else 'sin'}_terminos"
+            resultados[nombre] = medir(exportar, repeticiones)
+            resultados[nombre]['fuentes_bytes'] = fuentes
+            resultados[nombre]['cuerpo_bytes'] = len(json.dumps(datos).encode())
+
+            # La cotización guardada, pedida por su id: solo se envían los ajustes y la personalización
+            ajustes = {campo: datos[campo] for campo in ('descuentos', 'viaticos', 'extras', 'personalizacion')}
+            ruta_id = f"/descargar_plantilla/{datos['id']}"
+
+            def exportar_por_id(i, ajustes=ajustes, ruta_id=ruta_id):
+                variante = dict(ajustes, personalizacion=dict(ajustes['personalizacion'], titulo=f"COTIZACIÓN #{i}"))
+                return len(_peticion(cliente, ruta_id, variante).get_data())
+            resultados[f"{nombre}_por_id"] = medir(exportar_por_id, repeticiones)
+            resultados[f"{nombre}_por_id"]['cuerpo_bytes'] = len(json.dumps(ajustes).encode())
+
+            # Mismo contenido repetido: lo sirve la caché de PDFs
+            def desde_cache(i, datos=datos):
+                return len(_peticion(cliente, '/descargar_plantilla', datos).get_data())
+            resultados[f"{nombre}_cache"] = medir(desde_cache, repeticiones)
+
+            # Picos acumulados hasta este escenario: los del proceso web y de los trabajadores
+            picos = [pico for pico in map(rss_pico_kb, pids_trabajadores) if pico is not None]
+            rss = {'web': rss_pico_kb(), 'trabajadores': max(picos) if picos else None}
+            for sufijo in ('', '_por_id', '_cache'):
+                resultados[f"{nombre}{sufijo}"]['rss_pico_kb'] = rss
+    return resultados
+
+def version_codigo():
+    try:
+        salida = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=BASE_DIR, timeout=5)
+        return salida.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def comparar(actual, anterior, umbral):
+    """Imprime la variación del p50 de cada benchmark; devuelve los que empeoraron más del umbral."""
+    regresiones = []
+    for nombre, resultado in actual['benchmarks'].items():
+        previo = anterior.get('benchmarks', {}).get(nombre)
+        if not previo:
+            continue
+        antes = previo['latencia_ms']['p50']
+        ahora = resultado['latencia_ms']['p50']
+        cambio = (ahora - antes) / antes if antes else 0
+        marca = ''
+        if cambio > umbral:
+            regresiones.append(nombre)
+            marca = '  <-- regresión'
+        print(f"{nombre:40} p50 {antes:9.2f} -> {ahora:9.2f} ms ({cambio:+.1%}){marca}", file=sys.stderr)
+    return regresiones
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description='Benchmarks de cotización y exportación a PDF.')
+    parser.add_argument('--solo', choices=['cotizacion', 'estilos', 'pdf'], help='Ejecutar solo un grupo de benchmarks.')
+    parser.add_argument('--repeticiones', type=int, default=10,
+                        help='Iteraciones por PDF y pasadas por el grid de cotización (10).')
+    parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados (por omisión, stdout).')
+    parser.add_argument('--comparar', help='JSON de una ejecución anterior contra el cual comparar.')
+    parser.add_argument('--umbral', type=float, default=0.10,
+                        help='Aumento relativo del p50 que se considera regresión (0.10).')
+    args = parser.parse_args(argumentos)
+
+    cliente = app.test_client()
+    benchmarks = {}
+    if args.solo in (None, 'cotizacion'):
+        benchmarks.update(bench_cotizacion(cliente, args.repeticiones))
+    if args.solo in (None, 'estilos'):
+        benchmarks.update(bench_estilos(args.repeticiones))
+    if args.solo in (None, 'pdf'):
+        # Misma preparación que el servidor antes de atender peticiones
+        pids = calentar()
+        try:
+            benchmarks.update(bench_pdf(cliente, args.repeticiones, pids))
+        finally:
+            cola_pdf.cerrar()
+
+    resultados = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'commit': version_codigo(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'config': {'perfil_fondos': PERFIL_FONDOS, 'trabajadores_pdf': cola_pdf.trabajadores,
+                   'cache_pdf_dir': app.config['PDF_CACHE_DIR'] or None},
+        'benchmarks': benchmarks,
+    }
+    texto = json.dumps(resultados, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+    else:
+        print(texto)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            anterior = json.load(f)
+        if comparar(resultados, anterior, args.umbral):
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    try:
+        codigo = main()
+    finally:
+        _directorio_bench.cleanup()
+    sys.exit(codigo)
@@ -0,0 +1,152 @@
+"""Cotizaciones y PDFs desde la línea de comandos, sin el servidor.
+
+Uso:
+    python cli.py cotizar entradas.jsonl > cotizaciones.jsonl
+    python cli.py cotizar --totales < entradas.json
+    python cli.py pdf cotizaciones.jsonl --directorio pdfs --trabajadores 4
+
+Las entradas son JSON (una lista u objetos seguidos) o JSON Lines, de archivos o de la
+entrada estándar ('-' o sin archivos). Se leen y procesan de a poco, así la memoria no
+crece con el tamaño de la entrada. Una entrada que no es JSON válido se informa con su
+número y su línea, y se sigue con la siguiente.
+
+`cotizar` escribe una línea JSON por entrada: la entrada con su cotización calculada, o
+solo el total con --totales. `pdf` acepta entradas del formulario (las cotiza) o
+cotizaciones ya calculadas, y escribe un PDF por entrada en el directorio; los PDFs se
+generan en un grupo de procesos. Termina con código 1 si alguna entrada no es válida.
+"""
+import argparse
+import itertools
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from cotizaciones import EntradaInvalida, datos_pdf, leer_entradas, nombre_archivo_pdf
+from precios import calcular_cotizaciones
+
+# Entradas que se cotizan juntas (comparten los precios ya resueltos)
+TAMANO_LOTE = 500
+def entradas_de(rutas):
+    """(número, entrada) de todos los archivos, en orden; '-' es la entrada estándar."""
+    numeros = itertools.count(1)
+    for ruta in rutas or ['-']:
+        if ruta == '-':
+            yield from zip(numeros, leer_entradas(sys.stdin))
+        else:
+            with open(ruta, encoding='utf-8') as archivo:
+                yield from zip(numeros, leer_entradas(archivo))
+
+def _error(numero, mensaje):
+    print(f"Entrada {numero}: {mensaje}", file=sys.stderr)
+
+def cotizar(rutas, salida, totales=False):
+    """Cotiza las entradas por lotes y escribe una línea JSON por entrada; devuelve cuántas fallaron."""
+    errores = 0
+    entradas = entradas_de(rutas)
+    while lote := list(itertools.islice(entradas, TAMANO_LOTE)):
+        resultados = iter(calcular_cotizaciones(
+            [entrada for _, entrada in lote if not isinstance(entrada, EntradaInvalida)]))
+        for numero, entrada in lote:
+            if isinstance(entrada, EntradaInvalida):
+                resultado = {'error': str(entrada)}
+            else:
+                resultado = next(resultados)
+            if 'error' in resultado:
+                errores += 1
+                _error(numero, resultado['error'])
+                linea = {'numero': numero, 'error': resultado['error']}
+            elif totales:
+                linea = {'numero': numero, 'total': resultado['total']}
+            else:
+                linea = {**entrada, **resultado}
+            salida.write(json.dumps(linea, ensure_ascii=False) + '\n')
+    return errores
+
+def nombre_seguro(nombre):
+    """Nombre de archivo sin separadores de ruta ni caracteres problemáticos."""
+    return re.sub(r'[^\w.\- ]', '_', nombre)
+
+def generar_pdfs(rutas, directorio, trabajadores=None):
+    """Genera un PDF por entrada en `directorio` con un grupo de procesos; devuelve (generados, errores).
+
+    Solo hay unos pocos PDFs en curso por proceso: las entradas se leen a medida que
+    se liberan lugares, así la memoria no depende del tamaño de la entrada.
+    """
+    # Importar aquí: ReportLab, las fuentes y los fondos solo hacen falta para los PDFs.
+    # Los procesos de trabajo los heredan ya cargados
+    import pdf_cotizacion
+
+    os.makedirs(directorio, exist_ok=True)
+    trabajadores = trabajadores or os.cpu_count() or 1
+    generados = errores = 0
+    en_curso = {}
+
+    def recoger(futuros):
+        nonlocal generados, errores
+        for futuro in futuros:
+            numero = en_curso.pop(futuro)
+            try:
+                futuro.result()
+                generados += 1
+            except Exception as e:
+                errores += 1
+                _error(numero, f"no se pudo generar el PDF: {e}")
+
+    with ProcessPoolExecutor(trabajadores, initializer=pdf_cotizacion.inicializar_trabajador) as ejecutor:
+        for numero, entrada in entradas_de(rutas):
+            if isinstance(entrada, EntradaInvalida):
+                errores += 1
+                _error(numero, entrada)
+                continue
+            try:
+                if not isinstance(entrada, dict):
+                    raise ValueError("se esperaba un objeto")
+                data = datos_pdf(entrada)
+                nombre = nombre_seguro(nombre_archivo_pdf(data))
+            except (KeyError, TypeError, ValueError) as e:
+                errores += 1
+                _error(numero, f"entrada inválida: {e!r}")
+                continue
+            destino = os.path.join(directorio, f"{numero:06d}_{nombre}")
+            en_curso[ejecutor.submit(pdf_cotizacion.renderizar_trabajo, data, destino)] = numero
+            if len(en_curso) >= 2 * trabajadores:
+                recoger(wait(en_curso, return_when=FIRST_COMPLETED).done)
+        recoger(list(en_curso))
+    return generados, errores
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description='Cotizaciones y PDFs sin el servidor.')
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+
+    p_cotizar = subcomandos.add_parser('cotizar', help='Calcula las cotizaciones y las escribe como JSON Lines.')
+    p_cotizar.add_argument('archivos', nargs='*', help="Archivos de entrada ('-' o ninguno: entrada estándar).")
+    p_cotizar.add_argument('--salida', help='Archivo JSON Lines de salida (por omisión, stdout).')
+    p_cotizar.add_argument('--totales', action='store_true', help='Escribir solo el número de entrada y el total.')
+
+    p_pdf = subcomandos.add_parser('pdf', help='Genera un PDF por entrada en un directorio.')
+    p_pdf.add_argument('archivos', nargs='*', help="Archivos de entrada ('-' o ninguno: entrada estándar).")
+    p_pdf.add_argument('--directorio', required=True, help='Directorio donde escribir los PDFs.')
+    p_pdf.add_argument('--trabajadores', type=int, help='Procesos que generan PDFs (por omisión, uno por núcleo).')
+    args = parser.parse_args(argumentos)
+
+    inicio = time.perf_counter()
+    try:
+        if args.comando == 'cotizar':
+            if args.salida:
+                with open(args.salida, 'w', encoding='utf-8') as salida:
+                    errores = cotizar(args.archivos, salida, args.totales)
+            else:
+                errores = cotizar(args.archivos, sys.stdout, args.totales)
+        else:
+            generados, errores = generar_pdfs(args.archivos, args.directorio, args.trabajadores)
+            print(f"{generados} PDFs en {args.directorio} ({time.perf_counter() - inicio:.1f} s)", file=sys.stderr)
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 1 if errores else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""Funciones de cotización que no dependen de Flask.
+
+Las usan las rutas de app.py y la línea de comandos (cli.py): leer entradas de archivos
+JSON, cotizar una entrada del formulario, completar el total de una cotización enviada
+por el cliente, aplicar descuentos, viáticos y extras a una cotización guardada y
+nombrar su PDF.
+"""
+import json
+
+from precios import calcular_cotizacion
+
+# Conceptos que se agregan a una cotización guardada antes de descargar su PDF
+CAMPOS_AJUSTES = ('descuentos', 'viaticos', 'extras')
+# Caracteres que se leen por vez de cada archivo de entrada
+TAMANO_LECTURA = 64 * 1024
+
+class EntradaInvalida(ValueError):
+    """Entrada de un archivo que no es JSON válido; `linea` es la línea donde empieza."""
+
+    def __init__(self, mensaje, linea):
+        super().__init__(f"línea {linea}: {mensaje}")
+        self.linea = linea
+
+def _fin_elemento(texto):
+    """Posición de la ',' o ']' que cierra el elemento de lista con que empieza `texto`, o
+    -1 si todavía no se leyó. Sigue la profundidad de {} y [] y los textos entre comillas,
+    que en un elemento inválido terminan a más tardar al final de la línea."""
+    profundidad = 0
+    en_texto = escape = False
+    for posicion, caracter in enumerate(texto):
+        if en_texto:
+            if escape:
+                escape = False
+            elif caracter == '\\':
+                escape = True
+            elif caracter in '"\n':
+                en_texto = False
+        elif caracter == '"':
+            en_texto = True
+        elif caracter in '{[':
+            profundidad += 1
+        elif caracter in '}]':
+            if profundidad:
+                profundidad -= 1
+            elif caracter == ']':
+                return posicion
+        elif caracter == ',' and not profundidad:
+            return posicion
+    return -1
+
+def leer_entradas(archivo, tamano=TAMANO_LECTURA):
+    """Valores JSON del archivo, de a uno: los elementos de una lista o los valores seguidos
+    (JSON Lines u objetos separados por espacios). Solo se guarda lo que falta decodificar.
+
+    Una entrada que no es JSON válido no corta la lectura: se devuelve como EntradaInvalida
+    en su lugar y se sigue con el elemento siguiente de la lista o, con valores seguidos,
+    desde la línea siguiente a donde empieza.
+    """
+    decodificador = json.JSONDecoder()
+    pendiente = ''
+    linea = 1  # Línea del archivo donde empieza `pendiente`
+    en_lista = None
+    terminado = False
+
+    def consumir(caracteres):
+        nonlocal pendiente, linea
+        linea += pendiente.count('\n', 0, caracteres)
+        pendiente = pendiente[caracteres:]
+
+    while True:
+        consumir(len(pendiente) - len(pendiente.lstrip()))
+        if en_lista is None and pendiente:
+            en_lista = pendiente.startswith('[')
+            if en_lista:
+                consumir(1)
+                continue
+        if en_lista and pendiente[:1] == ',':
+            consumir(1)
+            continue
+        if en_lista and pendiente[:1] == ']':
+            return
+        if pendiente:
+            try:
+                valor, fin = decodificador.raw_decode(pendiente)
+            except json.JSONDecodeError as e:
+                # Si solo falta leer más, el error cae en la última línea, todavía incompleta
+                # (los textos JSON no pueden tener saltos de línea)
+                if terminado or '\n' in pendiente[e.pos:]:
+                    if not en_lista:
+                        yield EntradaInvalida(f"JSON inválido ({e.msg})", linea)
+                        fin_linea = pendiente.find('\n')
+                        consumir(len(pendiente) if fin_linea < 0 else fin_linea + 1)
+                        continue
+                    # En una lista (quizás con un elemento en varias líneas) se salta el
+                    # elemento entero hasta su ',' o ']'
+                    fin = _fin_elemento(pendiente)
+                    if fin >= 0 or terminado:
+                        yield EntradaInvalida(f"JSON inválido ({e.msg})", linea)
+                        if fin < 0:
+                            return
+                        consumir(fin)
+                        continue
+            else:
+                # Un valor que llega justo al final del bloque (p. ej. un número) podría seguir
+                if fin < len(pendiente) or terminado:
+                    yield valor
+                    consumir(fin)
+                    continue
+        elif terminado:
+            if en_lista:
+                yield EntradaInvalida("falta el cierre de la lista", linea)
+            return
+        bloque = archivo.read(tamano)
+        terminado = not bloque
+        pendiente += bloque
+
+def cotizar(entrada):
+    """Entrada del formulario con su cotización calculada (servicios, conceptos y total)."""
+    return {**entrada, **calcular_cotizacion(entrada)}
+
+def datos_pdf(entrada):
+    """Datos listos para el PDF: cotiza las entradas del formulario y a las cotizaciones
+    ya calculadas (con la clave 'cotizacion') les calcula el total."""
+    if 'cotizacion' in entrada:
+        return dict(entrada, total=total_enviado(entrada))
+    return cotizar(entrada)
+
+def _precio(valor):
+    try:
+        return float(valor)
+    except (ValueError, TypeError):
+        return 0
+
+def total_enviado(data):
+    """Total de una cotización enviada completa por el cliente (sin id de cotización guardada).
+
+    Los precios que no son números (p. ej. 'Contactar para calcular precio') no suman.
+    """
+    total = sum(_precio(servicio.get('precio')) for campo in ('cotizacion', 'servicios_automaticos')
+                for servicio in data.get(campo) or () if isinstance(servicio, dict))
+    for campo, signo in (('descuentos', -1), ('viaticos', 1), ('extras', 1)):
+        total += signo * sum(_precio(concepto.get('monto')) for concepto in data.get(campo) or ()
+                             if isinstance(concepto, dict))
+    return total
+
+def _suma_montos(conceptos):
+    return sum(concepto['monto'] for concepto in conceptos or ())
+
+def aplicar_ajustes(datos, cambios):
+    """Cotización guardada con los descuentos, viáticos, extras y personalización de `cambios`.
+
+    El total se recalcula a partir del de los servicios. Lanza ValueError si algún
+    concepto no tiene un monto numérico.
+    """
+    datos = dict(datos)
+    if any(campo in cambios for campo in CAMPOS_AJUSTES):
+        servicios = (datos['total'] + _suma_montos(datos.get('descuentos'))
+                     - _suma_montos(datos.get('viaticos')) - _suma_montos(datos.get('extras')))
+        for campo in CAMPOS_AJUSTES:
+            if campo not in cambios:
+                continue
+            conceptos = cambios[campo]
+            if not isinstance(conceptos, list) or not all(
+                    isinstance(concepto, dict) and isinstance(concepto.get('monto'), (int, float))
+                    and not isinstance(concepto['monto'], bool) for concepto in conceptos):
+                raise ValueError(f"'{campo}' debe ser una lista de conceptos con 'descripcion' y 'monto' numérico")
+            datos[campo] = conceptos
+        datos['total'] = (servicios - _suma_montos(datos.get('descuentos'))
+                          + _suma_montos(datos.get('viaticos')) + _suma_montos(datos.get('extras')))
+    if 'personalizacion' in cambios:
+        datos['personalizacion'] = cambios['personalizacion']
+    return datos
+
+def nombre_archivo_pdf(data):
+    """Nombre de descarga del PDF a partir de los datos de la cotización."""
+    # Usar datos de la cotización principal para el nombre del archivo
+    # Campos vacíos o nulos (p. ej. "fecha": null) usan el valor por omisión
+    tipo_evento_archivo = data.get('tipo_evento') or 'Evento' # Podría ser el personalizado o el original
+    nombre_archivo = data.get('nombre') or 'Cliente'
+    fecha_archivo = str(data.get('fecha') or 'SinFecha').replace('/', '-')
+    return f"Cotizacion_{tipo_evento_archivo}_{nombre_archivo}_{fecha_archivo}.pdf"
@@ -0,0 +1,91 @@
+"""Fondos de página del PDF y sus versiones preparadas.
+
+Las imágenes de static/img están a resolución completa. Para el PDF se generan
+derivados del tamaño de una hoja carta, según un perfil de resolución y calidad,
+con la capa negra semitransparente ya aplicada: cada página solo dibuja una imagen
+pequeña y lista.
+"""
+import os
+
+from archivos import BASE_DIR, escritura_atomica
+
+# Fondos de página del PDF por sección.
+# 'estirar' ocupa toda la hoja; 'cubrir' escala manteniendo proporción y centra la imagen.
+FONDOS_PDF = {
+    'portada': {'archivo': 'tono y carla.jpg', 'ajuste': 'estirar'},
+    'cotizacion': {'archivo': 'fondo 2 cabina.jpg', 'ajuste': 'estirar'},
+    'terminos': {'archivo': 'terminod y condiciones fondo.png', 'ajuste': 'cubrir'},
+}
+
+# Perfiles de los fondos derivados: resolución en puntos por pulgada y calidad JPEG
+PERFILES_FONDOS = {
+    'email': {'dpi': 150, 'calidad': 75},
+    'print': {'dpi': 300, 'calidad': 90},
+}
+
+# Perfil que usa el PDF; 'original' usa las imágenes fuente y dibuja la capa en cada página
+PERFIL_FONDOS = os.environ.get('PDF_PERFIL_FONDOS', 'email')
+
+# Directorio donde se guardan los fondos derivados
+DIRECTORIO_DERIVADOS = os.environ.get('PDF_FONDOS_DIR', os.path.join(BASE_DIR, 'fondos_preparados'))
+
+# Opacidad de la capa negra que oscurece los fondos
+OPACIDAD_CAPA = 0.5
+
+def ruta_fondo(clave):
+    return os.path.join(BASE_DIR, 'static', 'img', FONDOS_PDF[clave]['archivo'])
+
+def ruta_derivado(clave, perfil=PERFIL_FONDOS):
+    config = PERFILES_FONDOS[perfil]
+    return os.path.join(DIRECTORIO_DERIVADOS, f"{clave}_{config['dpi']}dpi_q{config['calidad']}.jpg")
+
+def _generar_derivado(clave, perfil, destino):
+    # Importar aquí: Pillow y ReportLab solo hacen falta al generar, no al importar el módulo
+    from PIL import Image, ImageOps
+    from reportlab.lib.pagesizes import letter
+
+    config = PERFILES_FONDOS[perfil]
+    ancho = round(letter[0] / 72 * config['dpi'])
+    alto = round(letter[1] / 72 * config['dpi'])
+    with Image.open(ruta_fondo(clave)) as fuente:
+        if fuente.mode in ('RGBA', 'LA', 'PA') or 'transparency' in fuente.info:
+            # Las zonas transparentes se ven sobre la hoja blanca
+            fuente = fuente.convert('RGBA')
+            imagen = Image.new('RGB', fuente.size, (255, 255, 255))
+            imagen.paste(fuente, mask=fuente.getchannel('A'))
+        else:
+            imagen = fuente.convert('RGB')
+    if FONDOS_PDF[clave]['ajuste'] == 'cubrir':
+        # Cubrir la hoja manteniendo la proporción y recortar centrado
+        imagen = ImageOps.fit(imagen, (ancho, alto), Image.Resampling.LANCZOS)
+    else:
+        imagen = imagen.resize((ancho, alto), Image.Resampling.LANCZOS)
+    # Aplicar la capa negra semitransparente directamente a los pixeles
+    imagen = imagen.point(lambda valor: round(valor * (1 - OPACIDAD_CAPA)))
+
+    # Varios procesos pueden prepararlo a la vez
+    with escritura_atomica(destino) as archivo:
+        imagen.save(archivo, 'JPEG', quality=config['calidad'], optimize=True)
+
+def preparar_fondo(clave, perfil=PERFIL_FONDOS, forzar=False):
+    """Ruta del fondo derivado; lo genera si falta o si la imagen fuente es más nueva."""
+    destino = ruta_derivado(clave, perfil)
+    if not forzar:
+        try:
+            if os.stat(destino).st_mtime_ns >= os.stat(ruta_fondo(clave)).st_mtime_ns:
+                return destino
+        except FileNotFoundError:
+            pass
+    os.makedirs(DIRECTORIO_DERIVADOS, exist_ok=True)
+    _generar_derivado(clave, perfil, destino)
+    return destino
+
+def preparar_fondos(perfiles=None, forzar=False):
+    """Prepara los fondos de todas las secciones y devuelve [(clave, perfil, ruta)].
+
+    Sin perfiles indicados usa PERFIL_FONDOS (ninguno si es 'original').
+    """
+    if perfiles is None:
+        perfiles = [] if PERFIL_FONDOS == 'original' else [PERFIL_FONDOS]
+    return [(clave, perfil, preparar_fondo(clave, perfil, forzar))
+            for perfil in perfiles for clave in FONDOS_PDF]
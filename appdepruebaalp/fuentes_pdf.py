@@ -0,0 +1,110 @@
+"""Fuentes TrueType del PDF.
+
+Las fuentes se buscan en la carpeta fonts/ de la aplicación, sin depender del directorio
+de trabajo. Analizar un TTF con ReportLab lee el archivo completo y arma sus tablas; el
+resultado se guarda en un archivo de caché (sin los bytes de la fuente), así cada proceso
+lo carga ya analizado y lee la fuente con un mmap que comparten todos los procesos.
+
+ReportLab incrusta de cada fuente solo los glifos que usa el documento (subconjuntos de
+hasta 256 caracteres), no el archivo completo.
+"""
+import logging
+import mmap
+import os
+import pickle
+import re
+from weakref import WeakKeyDictionary
+
+from reportlab import Version as VERSION_REPORTLAB
+from reportlab import rl_config
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTEncoding, TTFont, TTFontFace
+
+from archivos import BASE_DIR, escritura_atomica
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO_FUENTES = os.path.join(BASE_DIR, 'fonts')
+
+# Nombre con el que se registra cada fuente -> archivo en fonts/
+FUENTES_PDF = {
+    'Montserrat': 'Montserrat-Regular.ttf',
+    'Montserrat-Bold': 'Montserrat-Bold.ttf',
+}
+
+# Directorio de las fuentes ya analizadas; vacío para analizarlas siempre.
+# Está dentro de la aplicación porque se carga con pickle: no debe poder escribirlo otro usuario
+DIRECTORIO_CACHE_FUENTES = os.environ.get('PDF_FUENTES_CACHE', os.path.join(BASE_DIR, 'fuentes_preparadas'))
+
+def ruta_fuente(nombre):
+    return os.path.join(DIRECTORIO_FUENTES, FUENTES_PDF[nombre])
+
+def _ruta_cache(ruta):
+    # El archivo de caché cambia si cambia la fuente o la versión de ReportLab que la analizó
+    info = os.stat(ruta)
+    base = os.path.splitext(os.path.basename(ruta))[0]
+    return os.path.join(DIRECTORIO_CACHE_FUENTES,
+                        f"{base}-{info.st_mtime_ns}-{info.st_size}-rl{VERSION_REPORTLAB}.pickle")
+
+def _fuente_desde_cara(nombre, cara):
+    # Lo mismo que TTFont.__init__ pero con la cara ya analizada
+    fuente = TTFont.__new__(TTFont)
+    fuente.fontName = nombre
+    fuente.face = cara
+    fuente.encoding = TTEncoding()
+    fuente.state = WeakKeyDictionary()
+    fuente._asciiReadable = rl_config.ttfAsciiReadable
+    return fuente
+
+def _leer_cache(ruta_cache, ruta):
+    with open(ruta_cache, 'rb') as f:
+        estado = pickle.load(f)
+    cara = TTFontFace.__new__(TTFontFace)
+    cara.__dict__.update(estado)
+    with open(ruta, 'rb') as f:
+        # Solo lectura y compartido: las páginas del archivo están una sola vez en memoria
+        cara._ttf_data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return cara
+
+def _escribir_cache(ruta_cache, cara):
+    estado = {campo: valor for campo, valor in cara.__dict__.items() if campo != '_ttf_data'}
+    os.makedirs(DIRECTORIO_CACHE_FUENTES, exist_ok=True)
+    with escritura_atomica(ruta_cache) as f:
+        pickle.dump(estado, f, pickle.HIGHEST_PROTOCOL)
+
+def cargar_fuente(nombre):
+    """TTFont de la fuente, desde la caché de fuentes analizadas si está disponible."""
+    ruta = ruta_fuente(nombre)
+    if not DIRECTORIO_CACHE_FUENTES:
+        return TTFont(nombre, ruta)
+    ruta_cache = _ruta_cache(ruta)
+    try:
+        return _fuente_desde_cara(nombre, _leer_cache(ruta_cache, ruta))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning("No se pudo leer la caché de la fuente %s: %s", nombre, e)
+    fuente = TTFont(nombre, ruta)
+    try:
+        _escribir_cache(ruta_cache, fuente.face)
+    except OSError as e:
+        logger.warning("No se pudo guardar la caché de la fuente %s: %s", nombre, e)
+    return fuente
+
+def registrar_fuentes():
+    """Registra las fuentes en ReportLab; devuelve True si se registraron todas."""
+    try:
+        for nombre in FUENTES_PDF:
+            pdfmetrics.registerFont(cargar_fuente(nombre))
+    except Exception as e:
+        logger.error("Error al registrar fuentes Montserrat: %s. Asegúrate de que los archivos %s "
+                     "estén en %s.", e, ' y '.join(FUENTES_PDF.values()), DIRECTORIO_FUENTES)
+        return False
+    return True
+
+def bytes_fuentes(pdf):
+    """Bytes de los archivos de fuente TrueType incrustados (FontFile2) en el PDF.
+
+    Lo usan bench.py y las pruebas para medir cuánto ocupan los subconjuntos de glifos.
+    """
+    return sum(int(largo) for largo in re.findall(rb'/Length (\d+) /Length1 \d+', pdf))
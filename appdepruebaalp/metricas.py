@@ -0,0 +1,164 @@
+"""Métricas de las rutas críticas en formato de texto de Prometheus.
+
+Histogramas de duración por etapa y por petición, y contadores de errores. No depende
+de Flask: los procesos de trabajo del PDF miden sus etapas con `Etapas` y el servidor
+las registra al recibir el resultado.
+
+Con METRICAS=0 no se mide nada: `nuevas_etapas()` devuelve un objeto que ignora las
+marcas y los registros no guardan observaciones.
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+METRICAS_ACTIVAS = os.environ.get('METRICAS', '1') != '0'
+
+# Límites de las cubetas en segundos, de 1 ms a 10 s
+LIMITES_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _etiquetas(nombres, valores, extra=''):
+    pares = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+def _escapar(valor):
+    return str(valor).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+class Histograma:
+    """Histograma con una serie por combinación de etiquetas."""
+
+    def __init__(self, nombre, ayuda, etiquetas=(), limites=LIMITES_SEGUNDOS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.limites = tuple(limites)
+        self._series = {}  # valores de etiquetas -> [conteo por cubeta..., +Inf], suma
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *valores_etiquetas):
+        # bisect_left: cada valor cuenta en la primera cubeta con límite >= valor
+        cubeta = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(valores_etiquetas)
+            if serie is None:
+                serie = self._series[valores_etiquetas] = [[0] * (len(self.limites) + 1), 0.0]
+            serie[0][cubeta] += 1
+            serie[1] += valor
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            series = sorted((clave, list(conteos), suma) for clave, (conteos, suma) in self._series.items())
+        for valores, conteos, suma in series:
+            acumulado = 0
+            for limite, conteo in zip(self.limites + ('+Inf',), conteos):
+                acumulado += conteo
+                le = f'le="{limite}"'
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, valores, le)} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, valores)} {_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, valores)} {acumulado}")
+        return lineas
+
+class Contador:
+    """Contador con una serie por combinación de etiquetas."""
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, *valores_etiquetas, cantidad=1):
+        with self._lock:
+            self._series[valores_etiquetas] = self._series.get(valores_etiquetas, 0) + cantidad
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for valores, total in series:
+            lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {total}")
+        return lineas
+
+DURACION_PETICIONES = Histograma(
+    'cotizaciones_peticion_segundos', 'Duración de las peticiones por ruta.', ('ruta',))
+ERRORES_PETICIONES = Contador(
+    'cotizaciones_errores_total', 'Peticiones que terminaron con error, por ruta y código.', ('ruta', 'codigo'))
+DURACION_ETAPAS = Histograma(
+    'cotizaciones_etapa_segundos', 'Duración de cada etapa de una operación.', ('operacion', 'etapa'))
+
+METRICAS = (DURACION_PETICIONES, ERRORES_PETICIONES, DURACION_ETAPAS)
+
+class Etapas:
+    """Duración de cada etapa de una operación, en el orden en que ocurren."""
+
+    def __init__(self, inicio=None):
+        self.duraciones = {}
+        self._ultima = time.perf_counter() if inicio is None else inicio
+
+    def marcar(self, etapa):
+        """Asigna a `etapa` el tiempo transcurrido desde la marca anterior."""
+        ahora = time.perf_counter()
+        self.duraciones[etapa] = self.duraciones.get(etapa, 0.0) + ahora - self._ultima
+        self._ultima = ahora
+
+    @contextmanager
+    def medir(self, etapa):
+        """Mide un bloque aparte; su tiempo no se suma a la etapa que lo contiene."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.duraciones[etapa] = self.duraciones.get(etapa, 0.0) + duracion
+            self._ultima += duracion
+
+    def agregar(self, duraciones):
+        """Suma duraciones medidas en otro lugar (p. ej. en un proceso de trabajo)."""
+        for etapa, segundos in duraciones.items():
+            self.duraciones[etapa] = self.duraciones.get(etapa, 0.0) + segundos
+
+class _EtapasInactivas:
+    """Sustituto de Etapas cuando las métricas están desactivadas."""
+    duraciones = {}
+
+    def marcar(self, etapa):
+        pass
+
+    def medir(self, etapa):
+        return nullcontext()
+
+    def agregar(self, duraciones):
+        pass
+
+SIN_ETAPAS = _EtapasInactivas()
+
+def nuevas_etapas(inicio=None):
+    return Etapas(inicio) if METRICAS_ACTIVAS else SIN_ETAPAS
+
+def registrar_etapas(operacion, duraciones):
+    for etapa, segundos in duraciones.items():
+        DURACION_ETAPAS.observar(segundos, operacion, etapa)
+
+def registrar_peticion(ruta, segundos, codigo):
+    DURACION_PETICIONES.observar(segundos, ruta)
+    if codigo >= 400:
+        ERRORES_PETICIONES.incrementar(ruta, str(codigo))
+
+def exponer_metricas():
+    """Todas las métricas en formato de texto de Prometheus (versión 0.0.4)."""
+    lineas = []
+    for metrica in METRICAS:
+        lineas += metrica.exponer()
+    return '\n'.join(lineas) + '\n'
+
+def server_timing(duraciones):
+    """Valor de la cabecera Server-Timing: `etapa;dur=ms` por cada etapa."""
+    return ', '.join(f"{etapa};dur={segundos * 1000:.1f}" for etapa, segundos in duraciones.items())
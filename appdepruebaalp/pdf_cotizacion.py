@@ -0,0 +1,764 @@
+"""Generación del PDF de cotización con ReportLab.
+
+No depende de Flask: recibe los datos de la cotización y devuelve los bytes del PDF,
+así puede ejecutarse tanto en el servidor como en los procesos de trabajo de la cola.
+"""
+import copy
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple, OrderedDict
+from io import BytesIO
+from types import MappingProxyType
+from reportlab.lib.pagesizes import letter
+from reportlab.lib import colors
+from reportlab.platypus import (BaseDocTemplate, PageTemplate, Frame, NextPageTemplate,
+                                Paragraph, Spacer, Table, TableStyle, PageBreak)
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
+# Imports para fuentes personalizadas
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.pdfmetrics import standardFonts
+
+from archivos import escritura_atomica
+from fondos_pdf import FONDOS_PDF, OPACIDAD_CAPA, PERFIL_FONDOS, preparar_fondo, ruta_fondo
+from fuentes_pdf import FUENTES_PDF, registrar_fuentes, ruta_fuente
+from metricas import SIN_ETAPAS, nuevas_etapas
+from registro import configurar_registro
+
+logger = logging.getLogger(__name__)
+
+# Incrustar cada fondo una sola vez por PDF y referenciarlo desde todas sus páginas
+FONDOS_COMPARTIDOS = os.environ.get('PDF_FONDOS_COMPARTIDOS', '1') != '0'
+
+# Registrar fuentes Montserrat de la carpeta fonts/ de la aplicación
+if registrar_fuentes():
+    FONT_REGULAR = 'Montserrat'
+    FONT_BOLD = 'Montserrat-Bold'
+else:
+    # Usar fuentes predeterminadas como fallback
+    FONT_REGULAR = 'Helvetica'
+    FONT_BOLD = 'Helvetica-Bold'
+
+# --- Tema del PDF: colores, fuentes y estilos ---
+# Los estilos se construyen una sola vez al importar y se comparten entre documentos;
+# ReportLab solo los lee al maquetar.
+COLORES_TEMA = {
+    'texto': '#FFFFFF',  # Texto en blanco sobre los fondos oscuros
+    'servicio': '#FFD700',  # Color dorado para títulos de servicio
+}
+
+# Tema ya construido: `cambios` son los valores que lo distinguen del tema base
+Tema = namedtuple('Tema', ['cambios', 'colores', 'fuente', 'fuente_negrita', 'estilos', 'estilo_tabla_servicios'])
+
+def _crear_tema(cambios, texto, servicio, fuente, fuente_negrita):
+    base = getSampleStyleSheet()
+    color_texto = colors.HexColor(texto)
+    color_servicio = colors.HexColor(servicio)
+
+    def estilo(nombre, padre, **atributos):
+        return ParagraphStyle(nombre, parent=base[padre], **atributos)
+
+    estilos = [
+        # Portada
+        estilo('PortadaTituloStyle', 'Heading1', alignment=1, fontName=fuente_negrita, fontSize=32,
+               textColor=color_texto, leading=36, spaceAfter=20),
+        estilo('PortadaNombres', 'Normal', alignment=1, fontSize=18, textColor=color_texto, leading=22),
+        estilo('PortadaLugar', 'Normal', alignment=1, fontSize=16, textColor=color_texto, leading=20),
+        estilo('PortadaFecha', 'Normal', alignment=1, fontSize=16, textColor=color_texto, leading=20),
+        estilo('PortadaNumPersonas', 'Normal', alignment=1, fontSize=16, textColor=color_texto, leading=20),
+        estilo('PortadaTipoEvento', 'Normal', alignment=1, fontSize=16, textColor=color_texto, leading=20),
+        estilo('PortadaPie', 'Normal', alignment=1, fontSize=12, textColor=color_texto, leading=16),
+        # Cotización
+        estilo('TituloStyle', 'Heading1', alignment=1, spaceAfter=20, fontName=fuente_negrita, fontSize=24,
+               textColor=color_texto, leading=30),
+        estilo('TextoAdicionalStyle', 'Normal', alignment=1, fontName=fuente, fontSize=12,
+               textColor=color_texto, leading=14, spaceBefore=5, spaceAfter=15),
+        estilo('ServicioStyle', 'Normal', alignment=0, fontName=fuente_negrita, fontSize=14,
+               textColor=color_servicio, leading=16, spaceBefore=10, spaceAfter=2),
+        estilo('DescripcionStyle', 'Normal', alignment=0, fontName=fuente, fontSize=10,
+               textColor=color_texto, leading=12, leftIndent=30),  # Sangría para viñetas
+        estilo('PrecioStyle', 'Normal', alignment=2, fontName=fuente_negrita, fontSize=14,
+               textColor=color_texto, leading=16),
+        estilo('ItemPrecioStyleForExtras', 'Normal', alignment=2, fontName=fuente, fontSize=10,
+               textColor=color_texto, leading=12),
+        estilo('TotalStyle', 'Heading1', alignment=1, fontName=fuente_negrita, fontSize=24,
+               textColor=color_texto, leading=28, spaceBefore=10, spaceAfter=10),
+        # Términos y condiciones
+        estilo('TerminosTituloStyle', 'Heading1', alignment=1, spaceAfter=15, fontName=fuente_negrita,
+               fontSize=18, textColor=color_texto, leading=22),
+        estilo('TerminosStyle', 'Normal', alignment=0, fontName=fuente, fontSize=10, textColor=color_texto,
+               leading=14, spaceBefore=6, spaceAfter=6),
+        estilo('NotaStyle', 'Normal', alignment=1, fontName=fuente, fontSize=9, textColor=color_texto,
+               leading=12, spaceBefore=20),
+    ]
+    estilo_tabla_servicios = TableStyle([
+        ('ALIGN', (0,0), (0,-1), 'LEFT'),
+        ('ALIGN', (1,0), (1,-1), 'RIGHT'),
+        ('VALIGN', (0,0), (-1,-1), 'TOP'),
+        ('TEXTCOLOR', (0,0), (-1,-1), color_texto),
+        ('FONTNAME', (0,0), (-1,-1), fuente),
+        ('FONTSIZE', (0,0), (-1,-1), 12),
+        ('BOTTOMPADDING', (0,0), (-1,-1), 8),
+        ('TOPPADDING', (0,0), (-1,-1), 8),
+        ('LEFTPADDING', (0,0), (-1,-1), 2),
+        ('RIGHTPADDING', (0,0), (-1,-1), 2),
+    ])
+    return Tema(
+        cambios=cambios,
+        colores=MappingProxyType({'texto': color_texto, 'servicio': color_servicio}),
+        fuente=fuente,
+        fuente_negrita=fuente_negrita,
+        estilos=MappingProxyType({estilo.name: estilo for estilo in estilos}),
+        estilo_tabla_servicios=estilo_tabla_servicios,
+    )
+
+_VALORES_TEMA = dict(COLORES_TEMA, fuente=FONT_REGULAR, fuente_negrita=FONT_BOLD)
+
+TEMA = _crear_tema((), **_VALORES_TEMA)
+
+@functools.lru_cache(maxsize=32)
+def _variante_tema(cambios):
+    return _crear_tema(cambios, **dict(_VALORES_TEMA, **dict(cambios)))
+
+def _cambio_valido(campo, valor):
+    if not isinstance(valor, str):
+        return False
+    if campo in COLORES_TEMA:
+        try:
+            colors.HexColor(valor)
+        except ValueError:
+            return False
+        return True
+    # Solo fuentes ya registradas o estándar de PDF
+    return valor in standardFonts or valor in pdfmetrics.getRegisteredFontNames()
+
+def tema_para(personalizacion):
+    """Tema del documento: el base, o una variante en caché si personalizacion['tema'] lo cambia.
+
+    personalizacion['tema'] puede cambiar los colores 'texto' y 'servicio' y las
+    fuentes 'fuente' y 'fuente_negrita'; los valores no válidos se ignoran.
+    """
+    pedidos = personalizacion.get('tema') or {}
+    if not isinstance(pedidos, dict):
+        return TEMA
+    cambios = tuple(sorted(
+        (campo, valor) for campo, valor in pedidos.items()
+        if campo in _VALORES_TEMA and _cambio_valido(campo, valor) and valor != _VALORES_TEMA[campo]
+    ))
+    return _variante_tema(cambios) if cambios else TEMA
+
+# Imagen decodificada junto con la posición y tamaño ya calculados para la página;
+# `capa` indica si todavía hay que dibujar encima la capa negra semitransparente
+FondoPDF = namedtuple('FondoPDF', ['imagen', 'x', 'y', 'ancho', 'alto', 'mtime', 'capa'])
+
+# Caché de fondos por proceso: se decodifican una vez y se reutilizan en cada página
+_fondos_cache = {}
+_fondos_lock = threading.Lock()
+
+def _archivo_fondo(clave):
+    """Ruta de la imagen a dibujar y si necesita la capa: el derivado preparado o la fuente."""
+    if PERFIL_FONDOS != 'original':
+        try:
+            return preparar_fondo(clave), False
+        except Exception as e:
+            logger.warning("Error al preparar fondo '%s' (%s), se usa la imagen original: %s", clave, PERFIL_FONDOS, e)
+    return ruta_fondo(clave), True
+
+def _decodificar_fondo(clave, mtime):
+    ruta, capa = _archivo_fondo(clave)
+    with open(ruta, 'rb') as f:
+        datos = f.read()
+    imagen = ImageReader(BytesIO(datos))
+    # Forzar la decodificación ahora; ReportLab usa los pixeles para identificar la imagen
+    imagen.getRGBData()
+    if imagen.jpeg_fh() is not None:
+        # Cada documento lee su propia copia del JPEG, así el lector se comparte entre hilos
+        imagen.jpeg_fh = lambda: BytesIO(datos)
+
+    page_width, page_height = letter
+    if capa and FONDOS_PDF[clave]['ajuste'] == 'cubrir':
+        img_width, img_height = imagen.getSize()
+        # Calcular escala para cubrir toda la página (cover) y centrar la imagen
+        scale = max(page_width / img_width, page_height / img_height)
+        ancho = img_width * scale
+        alto = img_height * scale
+        x = (page_width - ancho) / 2
+        y = (page_height - alto) / 2
+    else:
+        # 'estirar' y los derivados, que ya tienen el tamaño y recorte de la hoja
+        x, y, ancho, alto = 0, 0, page_width, page_height
+    return FondoPDF(imagen, x, y, ancho, alto, mtime, capa)
+
+def cargar_fondo(clave):
+    """Devuelve el fondo de la sección indicada, decodificado y pre-escalado.
+
+    La imagen se carga una sola vez por proceso y solo se vuelve a leer
+    si cambia la fecha de modificación del archivo.
+    """
+    mtime = os.stat(ruta_fondo(clave)).st_mtime_ns
+    fondo = _fondos_cache.get(clave)
+    if fondo is not None and fondo.mtime == mtime:
+        return fondo
+    with _fondos_lock:
+        fondo = _fondos_cache.get(clave)
+        if fondo is None or fondo.mtime != mtime:
+            fondo = _decodificar_fondo(clave, mtime)
+            _fondos_cache[clave] = fondo
+    return fondo
+
+def precargar_fondos():
+    """Decodifica todos los fondos antes de atender peticiones."""
+    for clave in FONDOS_PDF:
+        try:
+            cargar_fondo(clave)
+        except Exception as e:
+            logger.error("Error al precargar fondo '%s': %s", clave, e)
+
+def _pintar_fondo(canvas, fondo):
+    page_width, page_height = letter
+    canvas.saveState()
+    # Dibujar imagen de fondo
+    canvas.drawImage(fondo.imagen, fondo.x, fondo.y, width=fondo.ancho, height=fondo.alto, mask='auto')
+    if fondo.capa:
+        # Dibujar capa semitransparente negra encima; los derivados ya la traen aplicada
+        canvas.setFillColor(colors.Color(0, 0, 0, alpha=OPACIDAD_CAPA))
+        canvas.rect(0, 0, page_width, page_height, fill=1, stroke=0)
+    canvas.restoreState()
+
+def dibujar_fondo(canvas, clave):
+    """Dibuja el fondo de la sección con la capa semitransparente negra encima.
+
+    Con FONDOS_COMPARTIDOS activo, el fondo (imagen y capa) se guarda una sola
+    vez por documento como un XObject de formulario y cada página solo lo referencia.
+    """
+    fondo = cargar_fondo(clave)
+    if not FONDOS_COMPARTIDOS:
+        _pintar_fondo(canvas, fondo)
+        return
+    # El mtime en el nombre evita mezclar versiones distintas del mismo fondo
+    nombre_form = f"Fondo_{clave}_{fondo.mtime}"
+    if not canvas.hasForm(nombre_form):
+        canvas.beginForm(nombre_form)
+        _pintar_fondo(canvas, fondo)
+        canvas.endForm()
+    canvas.doForm(nombre_form)
+
+# Aumentar cuando cambie el diseño del PDF para no servir documentos viejos desde la caché
+VERSION_PLANTILLA_PDF = 2
+
+# Campos de la petición que determinan el contenido del PDF
+CAMPOS_CLAVE_PDF = (
+    'cotizacion', 'servicios_automaticos', 'descuentos', 'viaticos', 'extras', 'personalizacion',
+    'tipo_evento', 'nombre', 'lugar', 'fecha', 'num_personas', 'num_invitados',
+)
+
+def version_assets():
+    """Versión de los archivos que afectan al PDF (fondos y fuentes) según su mtime."""
+    rutas = [ruta_fondo(clave) for clave in sorted(FONDOS_PDF)]
+    rutas += [ruta_fuente(nombre) for nombre in sorted(FUENTES_PDF)]
+    return [os.stat(ruta).st_mtime_ns if os.path.exists(ruta) else 0 for ruta in rutas]
+
+def clave_pdf(data):
+    """Hash canónico del contenido de la cotización, usado como clave de caché y ETag."""
+    contenido = {campo: data.get(campo) for campo in CAMPOS_CLAVE_PDF}
+    contenido['_plantilla'] = VERSION_PLANTILLA_PDF
+    contenido['_fuente'] = FONT_REGULAR
+    contenido['_assets'] = version_assets()
+    contenido['_fondos'] = PERFIL_FONDOS
+    canonico = json.dumps(contenido, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonico.encode('utf-8')).hexdigest()
+
+# --- Términos y condiciones ---
+# El texto es fijo; solo el título y la nota final pueden personalizarse
+TERMINOS_TITULO = "TÉRMINOS Y CONDICIONES"
+TERMINOS_NOTA_FINAL = "Al aceptar esta cotización, el cliente acepta todos los términos y condiciones aquí establecidos."
+TERMINOS_TEXTO = [
+    "1. <b>Validez de la cotización:</b> Esta cotización tiene una validez de 15 días a partir de la fecha de emisión.",
+    "2. <b>Reserva del servicio:</b> Para confirmar la reserva del servicio se requiere un anticipo del 50% del valor total.",
+    "3. <b>Cancelaciones:</b> En caso de cancelación, el anticipo no será reembolsable si se realiza con menos de 30 días de anticipación al evento.",
+    "4. <b>Cambios de fecha:</b> Los cambios de fecha están sujetos a disponibilidad y deberán solicitarse con al menos 15 días de anticipación.",
+    "5. <b>Horas adicionales:</b> Las horas adicionales no contempladas en esta cotización tendrán un costo extra según las tarifas vigentes.",
+    "6. <b>Condiciones del lugar:</b> El cliente debe garantizar las condiciones adecuadas para la instalación y operación de los equipos (acceso, espacio, energía eléctrica, etc.).",
+    "7. <b>Daños al equipo:</b> Cualquier daño causado a los equipos por mal uso, negligencia o causas ajenas al proveedor será responsabilidad del cliente.",
+    "8. <b>Fuerza mayor:</b> En caso de situaciones de fuerza mayor que impidan la realización del servicio, se acordará una nueva fecha sin costo adicional.",
+    "9. <b>Pago final:</b> El pago del saldo restante deberá realizarse 7 días antes del evento.",
+    "10. <b>Servicios adicionales:</b> Cualquier servicio adicional no incluido en esta cotización deberá ser acordado previamente y tendrá un costo extra."
+]
+
+# Ancho útil del marco de contenido: hoja carta menos márgenes de 36 pt y 6 pt de relleno por lado
+ANCHO_MARCO_CONTENIDO = letter[0] - 2 * 36 - 2 * 6
+
+class ParrafoPreajustado(Paragraph):
+    """Párrafo que conserva el resultado de wrap para el último ancho calculado.
+
+    Se usa para textos fijos: se ajustan una vez y cada documento recibe una copia
+    superficial que comparte las líneas ya calculadas.
+    """
+
+    def wrap(self, availWidth, availHeight):
+        ajuste = self.__dict__.get('_ajuste')
+        if ajuste is not None and ajuste[0] == availWidth:
+            return ajuste[1]
+        resultado = Paragraph.wrap(self, availWidth, availHeight)
+        self._ajuste = (availWidth, resultado)
+        return resultado
+
+def preajustar(flowable, ancho=ANCHO_MARCO_CONTENIDO):
+    flowable.wrap(ancho, letter[1])
+    return flowable
+
+# Ancho útil del marco de la portada (toda la hoja) y de las celdas de la tabla de
+# servicios (columnas de 340 y 100 pt menos 2 pt de relleno por lado)
+ANCHO_MARCO_PORTADA = letter[0] - 2 * 6
+ANCHO_CELDA_SERVICIO = 340 - 2 * 2
+ANCHO_CELDA_PRECIO = 100 - 2 * 2
+
+# Párrafos fijos ya ajustados (servicios con su descripción, encabezados, pie de la
+# portada), por tema, estilo, texto y ancho
+MAX_PARRAFOS_FIJOS = 256
+_parrafos_fijos = OrderedDict()
+_parrafos_fijos_lock = threading.Lock()
+
+def parrafo_fijo(texto, estilo, tema, ancho=ANCHO_MARCO_CONTENIDO):
+    """Copia de un párrafo de texto fijo, maquetado solo la primera vez que se pide."""
+    clave = (tema.cambios, estilo, texto, ancho)
+    with _parrafos_fijos_lock:
+        parrafo = _parrafos_fijos.get(clave)
+        if parrafo is not None:
+            _parrafos_fijos.move_to_end(clave)
+    if parrafo is None:
+        parrafo = preajustar(ParrafoPreajustado(texto, tema.estilos[estilo]), ancho)
+        with _parrafos_fijos_lock:
+            _parrafos_fijos[clave] = parrafo
+            while len(_parrafos_fijos) > MAX_PARRAFOS_FIJOS:
+                _parrafos_fijos.popitem(last=False)
+    return copy.copy(parrafo)
+
+# Términos predeterminados ya ajustados, por versión de fuentes y fondos y por tema
+_terminos_cache = {}
+_terminos_lock = threading.Lock()
+
+def _prerenderizar_terminos(tema):
+    estilo_titulo = tema.estilos['TerminosTituloStyle']
+    estilo_texto = tema.estilos['TerminosStyle']
+    estilo_nota = tema.estilos['NotaStyle']
+    return {
+        'estilo_titulo': estilo_titulo,
+        'estilo_nota': estilo_nota,
+        'titulo': preajustar(ParrafoPreajustado(TERMINOS_TITULO, estilo_titulo)),
+        'parrafos': [preajustar(ParrafoPreajustado(parrafo, estilo_texto)) for parrafo in TERMINOS_TEXTO],
+        'nota': preajustar(ParrafoPreajustado(TERMINOS_NOTA_FINAL, estilo_nota)),
+    }
+
+def terminos_prerenderizados(tema=TEMA):
+    """Devuelve los términos predeterminados ya ajustados, generándolos una vez por versión de assets y tema."""
+    version = (tuple(version_assets()), tema.cambios)
+    terminos = _terminos_cache.get(version)
+    if terminos is None:
+        with _terminos_lock:
+            terminos = _terminos_cache.get(version)
+            if terminos is None:
+                terminos = _prerenderizar_terminos(tema)
+                if len(_terminos_cache) >= 8:
+                    _terminos_cache.clear()
+                _terminos_cache[version] = terminos
+    return terminos
+
+def elementos_terminos(titulo=TERMINOS_TITULO, nota_final=TERMINOS_NOTA_FINAL, tema=TEMA):
+    """Flowables de la sección de términos.
+
+    Los párrafos predeterminados se copian ya ajustados; solo el título o la nota
+    final personalizados se maquetan de nuevo.
+    """
+    terminos = terminos_prerenderizados(tema)
+    if titulo == TERMINOS_TITULO:
+        elemento_titulo = copy.copy(terminos['titulo'])
+    else:
+        elemento_titulo = ParrafoPreajustado(titulo, terminos['estilo_titulo'])
+    if nota_final == TERMINOS_NOTA_FINAL:
+        elemento_nota = copy.copy(terminos['nota'])
+    else:
+        elemento_nota = ParrafoPreajustado(nota_final, terminos['estilo_nota'])
+    elementos = [elemento_titulo]
+    elementos += [copy.copy(parrafo) for parrafo in terminos['parrafos']]
+    elementos.append(Spacer(1, 0.3*inch))
+    elementos.append(elemento_nota)
+    return elementos
+
+def historia_cotizacion(data, etapas=SIN_ETAPAS):
+    """Flowables de la cotización: portada, cotización y total, y términos si se incluyen.
+
+    Empieza en una página con la plantilla 'portada'; cada sección siguiente cambia a
+    su plantilla de página (ver documento_pdf).
+    """
+    num_invitados = int(data.get('num_invitados', 0))  # Extraer num_invitados de los datos recibidos
+    personalizacion = data.get('personalizacion', {})
+    
+    # Estilos ya construidos del tema (el base o una variante en caché)
+    tema = tema_para(personalizacion)
+    estilos = tema.estilos
+    elements = []
+    terminos_elements = []
+    
+    # --- PORTADA DE INTRODUCCIÓN ---
+    portada_personalizacion = personalizacion.get('portada', {})
+    # Obtener datos de la cotización principal
+    portada_lugar = data.get('lugar', '')
+    portada_nombres = data.get('nombre', '') # Usar 'nombre' de cotizacionData
+    portada_fecha = data.get('fecha', '')
+    portada_num_personas = data.get('num_personas', '')
+    # Obtener datos de personalización de la portada
+    portada_tipo_evento = portada_personalizacion.get('tipo_evento', '')
+    portada_titulo_tipo_evento = portada_personalizacion.get('titulo_tipo_evento', '')
+    
+    # Página de portada: usa la plantilla 'portada', con la imagen tono y carla.jpg como fondo
+    portada_elements = []
+    # Espaciado superior
+    portada_elements.append(Spacer(1, 1.5*inch))
+    # Título principal (tipo de evento personalizado)
+    titulo_portada = portada_titulo_tipo_evento if portada_titulo_tipo_evento else (portada_tipo_evento or 'Evento')
+    portada_elements.append(ParrafoPreajustado(titulo_portada, estilos['PortadaTituloStyle']))
+    portada_elements.append(Spacer(1, 0.2*inch))
+    # Nombres de festejados
+    if portada_nombres:
+        portada_elements.append(ParrafoPreajustado(f"<b>Festejado(s):</b> {portada_nombres}", estilos['PortadaNombres']))
+        portada_elements.append(Spacer(1, 0.1*inch))
+    # Lugar
+    if portada_lugar:
+        portada_elements.append(ParrafoPreajustado(f"<b>Lugar:</b> {portada_lugar}", estilos['PortadaLugar']))
+        portada_elements.append(Spacer(1, 0.1*inch))
+    # Fecha
+    if portada_fecha:
+        portada_elements.append(ParrafoPreajustado(f"<b>Fecha:</b> {portada_fecha}", estilos['PortadaFecha']))
+        portada_elements.append(Spacer(1, 0.1*inch))
+    # Número de personas
+    if portada_num_personas:
+        # Asegurarse de que num_personas sea una cadena para la concatenación
+        num_personas_str = str(portada_num_personas) if portada_num_personas is not None else ''
+        portada_elements.append(ParrafoPreajustado(f"<b>Número de personas:</b> {num_personas_str}", estilos['PortadaNumPersonas']))
+        portada_elements.append(Spacer(1, 0.1*inch))
+    # Tipo de evento (de la personalización)
+    if portada_tipo_evento:
+        portada_elements.append(ParrafoPreajustado(f"<b>Tipo de evento:</b> {portada_tipo_evento}", estilos['PortadaTipoEvento']))
+        portada_elements.append(Spacer(1, 0.1*inch))
+    # Espaciado inferior
+    portada_elements.append(Spacer(1, 2*inch))
+    # Pie de página
+    portada_elements.append(parrafo_fijo("Cotización personalizada", 'PortadaPie', tema, ANCHO_MARCO_PORTADA))
+    etapas.marcar('portada')
+
+    # Título principal con estilo predeterminado
+    # Obtener título personalizado o usar el predeterminado
+    titulo_personalizado = personalizacion.get('titulo', 'COTIZACIÓN')
+    if titulo_personalizado == 'COTIZACIÓN':
+        elements.append(parrafo_fijo(titulo_personalizado, 'TituloStyle', tema))
+    else:
+        elements.append(ParrafoPreajustado(titulo_personalizado, estilos['TituloStyle']))
+    elements.append(Spacer(1, 0.25*inch))
+    
+    # Agregar texto adicional si existe
+    texto_adicional = personalizacion.get('texto_adicional')
+    if texto_adicional:
+        elements.append(ParrafoPreajustado(texto_adicional, estilos['TextoAdicionalStyle']))
+        elements.append(Spacer(1, 0.2*inch))
+    
+    # Estilos para los elementos del PDF
+    descripcion_style = estilos['DescripcionStyle']
+    precio_style = estilos['PrecioStyle']
+    item_precio_style_for_extras = estilos['ItemPrecioStyleForExtras']
+    
+    # Crear filas para cada servicio (sin iconos). El nombre y la descripción de cada
+    # servicio son fijos y se maquetan una sola vez; los precios y demás celdas variables
+    # son ParrafoPreajustado, así que la tabla los ajusta una vez por PDF y no en cada pasada
+    tabla_servicios = []
+    for servicio in data['cotizacion']:
+        nombre_servicio = servicio['servicio']
+        precio = servicio['precio']
+        descripcion = ""
+        if nombre_servicio == 'Sonido':
+            # num_invitados ya está definido y es un entero desde el inicio de la función generar_cotizacion
+            if num_invitados <= 70:
+                descripcion = "2 bocinas HK 115 FA"
+            elif num_invitados <= 150: # Asumido 150 para la segunda condición del usuario
+                descripcion = "• Bocinas HK 115 FA<br/>• 2 Bajos Audio Center 18"
+            elif num_invitados <= 250:
+                descripcion = "• 2 Bocinas HK 115 FA<br/>• 2 Bajos dobles Warfade 218"
+            else:
+                # Fallback para más de 250 personas
+                descripcion = "AUDIO PROFESIONAL<br/>• TÉCNICO DE AUDIO" # Descripción original como fallback
+        elif nombre_servicio == 'DJ':
+            descripcion = f"DJ PROFESIONAL<br/>• REPERTORIO PERSONALIZADO<br/>• CITA DE LOGÍSTICA MUSICAL PREVIA AL EVENTO"
+        elif nombre_servicio == 'Iluminación':
+            # Obtener el número de invitados de la solicitud principal
+            num_invitados_val = 0
+            try:
+                # 'data' es el JSON de nivel superior recibido por /descargar_plantilla
+                # Asegurarse de que 'num_invitados' esté presente y no sea una cadena vacía antes de convertir
+                num_invitados_str = str(data.get('num_invitados', '0')).strip() # Default to '0' string if not found
+                if num_invitados_str: # Si no está vacío después de strip
+                    num_invitados_val = int(num_invitados_str)
+            except (ValueError, TypeError):
+                # Si la conversión falla o el tipo es incorrecto, num_invitados_val permanece 0.
+                pass # num_invitados_val sigue siendo 0
+
+            if num_invitados_val > 0 and num_invitados_val <= 70:
+                descripcion = "A elegir:<br/>• 2 cabezas robóticas 7r o 6 ParLed"
+            elif num_invitados_val <= 150: # Implica > 70
+                descripcion = "• 2 cabezas robóticas 7r<br/>• 6 ParLed"
+            elif num_invitados_val <= 250: # Implica > 150
+                descripcion = "• 6 cabezas robóticas 7r<br/>• 12 ParLed"
+            elif num_invitados_val <= 350: # Implica > 250
+                descripcion = "• 10 cabezas robóticas 7r<br/>• 20 ParLed"
+            elif num_invitados_val > 350:
+                descripcion = "Equipamiento de iluminación para más de 350 personas (contactar para cotización)"
+            else: # num_invitados_val es 0 o negativo (inválido porque no entró en >0)
+                descripcion = "ILUMINACIÓN PARA LA PISTA<br/>• ILUMINACIÓN ROBÓTICA BEAM/SPOT (Cantidad de invitados no especificada o inválida)"
+        elif nombre_servicio == 'Pista de baile':
+            # Determinar el tamaño de la pista según el número de invitados
+            num_invitados_val = int(data.get('num_invitados', 0))
+            descripcion_base = ""
+            if num_invitados_val <= 70:
+                descripcion_base = "•Pista de baile proporcional a 70 personas"
+            elif num_invitados_val <= 150:
+                descripcion_base = "•Pista de baile proporcional a 150 personas"
+            elif num_invitados_val <= 250:
+                descripcion_base = "•Pista de baile proporcional a 250 personas"
+            elif num_invitados_val <= 350:
+                descripcion_base = "•Pista de baile proporcional a 350 personas"
+            else:
+                descripcion_base = "Pista de baile (tamaño a cotizar)"
+            descripcion = f"{descripcion_base}<br/>• Pintada a mano con diseño (dos colores)"
+        if isinstance(precio, (int, float)):
+            precio_str = f"$ {precio:,.2f}"
+        elif isinstance(precio, str):
+            precio_str = precio
+        else:
+            precio_str = "Consultar"
+        # Fila: servicio (con descripción si existe) y precio
+        texto_servicio = nombre_servicio
+        if descripcion:
+            texto_servicio += f"<br/><span fontSize=10>{descripcion}</span>"
+        tabla_servicios.append([
+            parrafo_fijo(texto_servicio, 'ServicioStyle', tema, ANCHO_CELDA_SERVICIO),
+            ParrafoPreajustado(precio_str, precio_style)
+        ])
+    # Agregar servicios automáticos si existen
+    if 'servicios_automaticos' in data and data['servicios_automaticos']:
+        for servicio in data['servicios_automaticos']:
+            nombre_servicio = servicio['servicio']
+            precio = servicio['precio']
+            incluido = servicio.get('incluido', False)
+            descripcion = ""
+            if nombre_servicio == 'Barra de bebidas':
+                descripcion = "•Pintada a mano con diseño (dos colores)"
+            elif nombre_servicio == 'Cabina de DJ':
+                descripcion = "•Pintada a mano con diseño (dos colores)"
+            elif nombre_servicio == 'Back pintado a mano':
+                descripcion = "•Pintada a mano con diseño (dos colores)"
+            if isinstance(precio, (int, float)):
+                precio_str = f"$ {precio:,.2f}"
+            elif isinstance(precio, str):
+                precio_str = precio
+            else:
+                precio_str = "Incluido"
+            nombre_con_etiqueta = f"{nombre_servicio} {'(Incluido)' if incluido else ''}"
+            texto_servicio = nombre_con_etiqueta
+            if descripcion:
+                texto_servicio += f"<br/><span fontSize=10>{descripcion}</span>"
+            tabla_servicios.append([
+                parrafo_fijo(texto_servicio, 'ServicioStyle', tema, ANCHO_CELDA_SERVICIO),
+                ParrafoPreajustado(precio_str, precio_style)
+            ])
+    # Agregar descuentos si existen
+    descuentos_data = data.get('descuentos', [])
+    if descuentos_data:
+        tabla_servicios.append([
+            parrafo_fijo("Descuentos", 'ServicioStyle', tema, ANCHO_CELDA_SERVICIO),
+            parrafo_fijo("", 'ServicioStyle', tema, ANCHO_CELDA_PRECIO)  # Celda vacía para la segunda columna del título
+        ])
+        for descuento in descuentos_data:
+            desc = descuento.get('descripcion', '')
+            try:
+                monto = float(descuento['monto'])
+                precio_str = f"- $ {monto:,.2f}"
+            except (ValueError, TypeError):
+                precio_str = f"- $ {descuento['monto']}"
+            tabla_servicios.append([
+                ParrafoPreajustado(desc, descripcion_style),  # Usar descripcion_style para el ítem
+                ParrafoPreajustado(precio_str, item_precio_style_for_extras) # Usar nuevo estilo para el precio del ítem
+            ])
+    # Agregar viáticos desglosados si existen
+    viaticos_data = data.get('viaticos', [])
+    if viaticos_data:
+        tabla_servicios.append([
+            parrafo_fijo("Viáticos", 'ServicioStyle', tema, ANCHO_CELDA_SERVICIO),
+            parrafo_fijo("", 'ServicioStyle', tema, ANCHO_CELDA_PRECIO)
+        ])
+        for viatico in viaticos_data:
+            desc = viatico.get('descripcion', '')
+            try:
+                monto = float(viatico['monto'])
+                precio_str = f"$ {monto:,.2f}"
+            except (ValueError, TypeError):
+                precio_str = f"$ {viatico['monto']}"
+            tabla_servicios.append([
+                ParrafoPreajustado(desc, descripcion_style),
+                ParrafoPreajustado(precio_str, item_precio_style_for_extras)
+            ])
+    # Agregar extras si existen
+    extras_data = data.get('extras', [])
+    if extras_data:
+        tabla_servicios.append([
+            parrafo_fijo("Extras", 'ServicioStyle', tema, ANCHO_CELDA_SERVICIO),
+            parrafo_fijo("", 'ServicioStyle', tema, ANCHO_CELDA_PRECIO)
+        ])
+        for extra in extras_data:
+            desc = extra.get('descripcion', 'Adicional')
+            try:
+                monto = float(extra['monto'])
+                precio_str = f"$ {monto:,.2f}"
+            except (ValueError, TypeError):
+                precio_str = f"$ {extra['monto']}"
+            tabla_servicios.append([
+                ParrafoPreajustado(desc, descripcion_style),
+                ParrafoPreajustado(precio_str, item_precio_style_for_extras)
+            ])
+    # Insertar tabla de servicios y precios
+    tabla = Table(tabla_servicios, colWidths=[340, 100])
+    tabla.setStyle(tema.estilo_tabla_servicios)
+    elements.append(tabla)
+    elements.append(Spacer(1, 0.2*inch))
+
+    # Eliminar duplicación: NO volver a agregar servicios automáticos, descuentos, viáticos ni extras aquí
+    # Ya están incluidos en la tabla_servicios
+
+    # El total ya viene calculado por el servidor (al cotizar o al aplicar los ajustes)
+    total = data.get('total', 0)
+
+    # Agregar línea separadora antes del total
+    elements.append(Spacer(1, 0.5*inch))
+
+    # Agregar el total con un estilo destacado
+    total_formateado = f"<u>TOTAL:   $ {total:,.2f}</u>" # Añadido subrayado
+    elements.append(ParrafoPreajustado(total_formateado, estilos['TotalStyle']))
+    etapas.marcar('cotizacion')
+    
+    # Verificar si se deben incluir términos y condiciones
+    incluir_terminos = personalizacion.get('incluir_terminos', True)
+    
+    if incluir_terminos:
+        # Título y nota final personalizados o predeterminados
+        terminos_titulo = personalizacion.get('terminos_titulo', TERMINOS_TITULO)
+        nota_final = personalizacion.get('nota_final', TERMINOS_NOTA_FINAL)
+        terminos_elements = elementos_terminos(terminos_titulo, nota_final, tema)
+    etapas.marcar('terminos')
+    
+    # 1. Portada
+    story = list(portada_elements)
+    # 2. Cotización y total
+    story += [NextPageTemplate('cotizacion'), PageBreak()]
+    story += elements
+    # 3. Términos y condiciones (si existen)
+    if terminos_elements:
+        story += [NextPageTemplate('terminos'), PageBreak()]
+        story += terminos_elements
+    return story
+
+def documento_pdf(buffer, etapas=SIN_ETAPAS):
+    """Documento carta con una plantilla de página por sección, cada una con su fondo."""
+    # --- NUEVA LÓGICA DE FONDOS POR SECCIÓN ---
+    def fondo_seccion(clave):
+        def pintar(canvas, doc):
+            try:
+                with etapas.medir('fondos'):
+                    dibujar_fondo(canvas, clave)
+            except Exception as e:
+                logger.error("Error al dibujar fondo de %s: %s", clave, e)
+        return pintar
+    # --- FIN NUEVA LÓGICA ---
+    # Construcción del PDF en una sola pasada: cada sección usa su propia
+    # plantilla de página con su fondo, sin generar y unir PDFs por separado
+    page_width, page_height = letter
+    doc = BaseDocTemplate(buffer, pagesize=letter, leftMargin=36, rightMargin=36, topMargin=36, bottomMargin=36)
+    marco_portada = Frame(0, 0, page_width, page_height, id='portada')
+    marco_contenido = Frame(doc.leftMargin, doc.bottomMargin, doc.width, doc.height, id='contenido')
+    doc.addPageTemplates([
+        PageTemplate(id='portada', frames=[marco_portada], onPage=fondo_seccion('portada')),
+        PageTemplate(id='cotizacion', frames=[marco_contenido], onPage=fondo_seccion('cotizacion')),
+        PageTemplate(id='terminos', frames=[marco_contenido], onPage=fondo_seccion('terminos')),
+    ])
+    return doc
+
+def generar_pdf_cotizacion(data, destino=None, etapas=SIN_ETAPAS):
+    """Genera el PDF de la cotización (portada, cotización y términos) y devuelve sus bytes.
+
+    Con `destino` (un archivo abierto en modo binario) el PDF se escribe ahí y no se devuelve.
+    En `etapas` se anota la duración de cada sección, del dibujo de fondos y del maquetado.
+    """
+    # Crear un buffer para el PDF, salvo que se escriba directo al archivo de destino
+    buffer = BytesIO() if destino is None else destino
+    story = historia_cotizacion(data, etapas)
+    documento_pdf(buffer, etapas).build(story)
+    etapas.marcar('maquetado')
+    if destino is None:
+        return buffer.getvalue()
+
+def generar_pdf_lote(lote, destino=None, etapas=SIN_ETAPAS):
+    """Un solo PDF con las cotizaciones de `lote`, una tras otra.
+
+    Se maqueta como un documento: cada fondo y cada subconjunto de fuente se incrusta
+    una vez para todo el lote, no una vez por cotización.
+    """
+    buffer = BytesIO() if destino is None else destino
+    story = []
+    for data in lote:
+        if story:
+            story += [NextPageTemplate('portada'), PageBreak()]
+        story += historia_cotizacion(data, etapas)
+    documento_pdf(buffer, etapas).build(story)
+    etapas.marcar('maquetado')
+    if destino is None:
+        return buffer.getvalue()
+
+# --- Procesos de trabajo ---
+def inicializar_trabajador():
+    """Prepara un proceso de trabajo antes de su primer PDF.
+
+    Importar este módulo ya registra las fuentes; aquí se decodifican los fondos y se
+    ajustan los términos predeterminados para que ningún PDF pague ese costo. El
+    registro se vuelve a configurar porque el hilo que lo escribe no pasa al proceso hijo.
+    """
+    configurar_registro()
+    precargar_fondos()
+    terminos_prerenderizados()
+
+def _renderizar(generar, data, destino):
+    inicio = time.perf_counter()
+    etapas = nuevas_etapas()
+    if destino is None:
+        pdf = generar(data, etapas=etapas)
+    else:
+        with escritura_atomica(destino) as archivo:
+            generar(data, archivo, etapas)
+        pdf = destino
+    return pdf, time.perf_counter() - inicio, etapas.duraciones
+
+def renderizar_trabajo(data, destino=None):
+    """Genera el PDF en un proceso de trabajo y devuelve (pdf, segundos que tardó, etapas).
+
+    Sin destino, `pdf` son los bytes. Con una ruta de destino el PDF se escribe en ese
+    archivo (en un temporal que luego se renombra) y `pdf` es la ruta, así el documento
+    no se copia al proceso principal. `etapas` tiene los segundos de cada etapa
+    (vacío si las métricas están desactivadas).
+    """
+    return _renderizar(generar_pdf_cotizacion, data, destino)
+
+def renderizar_lote(lote, destino=None):
+    """Como renderizar_trabajo, pero con un solo PDF para la lista de cotizaciones `lote`."""
+    return _renderizar(generar_pdf_lote, lote, destino)
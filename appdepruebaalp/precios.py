@@ -0,0 +1,577 @@
+"""Precios, reglas de cotización y motor de precios compilado.
+
+Las tablas PRECIOS y HORAS_BASE se compilan al importar el módulo en escalones
+ordenados que se resuelven con bisect, y cada servicio tiene una regla que sabe
+calcular su precio. Agregar escalones o servicios solo requiere cambiar los datos.
+"""
+import bisect
+import hashlib
+import itertools
+import json
+from array import array
+from collections import namedtuple
+
+# Configuración de precios y reglas
+PRECIOS = {
+    'DJ': {
+        'Boda': 12000,
+        'Bautizo': 12000,
+        'Quince años': 12000,
+        'Cumpleaños': 1000  # por hora
+    },
+    'Sonido': {
+        'Boda': {
+            '150': 8000,
+            '151+': 16000
+        },
+        'Otros': {
+            '70': 4000,
+            '150': 8000,
+            '250': 12000,
+            '350': 16000
+        }
+    },
+    'Iluminación': {
+        'Boda': {
+           # '150': 4500,
+            #'151+': 18000,
+            '70': 4500, #6 par + 2 cabezas
+            '150': 6500, #6 par + 4 cabezas
+            '250': 12500, #12 par + 6 cabezas, si se pueden colgar se cuelgan
+            '350': 19500 #22 par + 10 cabezas, si se pueden colgar se cuelgan
+        },
+        'Otros': {
+            '70': 2500, #6 par o 2 cabezas
+            '150': 4500, #6 par + 2 cabezas
+            '250': 12500, #12 par + 6 cabezas, si se pueden colgar se cuelgan
+            '350': 19500  #22 par + 10 cabezas, si se pueden colgar se cuelgan
+        }
+    },
+    'Pista de baile': {
+        '70': 6600,
+        '150': 8800,
+        '250': 11000,
+        '350': 13200
+    },
+    'Planta de luz': 9000,
+    'Chisperos': 350,  # precio por unidad
+    'Lluvia de papeles': 3000,
+    'Barra de bebidas': 8000,
+    'Back pintado a mano': 4500
+}
+
+# Horas base por tipo de evento
+HORAS_BASE = {
+    'Cumpleaños': {
+        '70': 6,
+        '71+': 7
+    },
+    'Bautizo': {
+        '70': 7,
+        '71+': 8
+    },
+    'Quince años': {
+        '70': 7,
+        '71+': 8
+    },
+    'Boda': {
+        '150': 8,
+        '151+': 'ilimitado'
+    }
+}
+
+# Tipo de evento cuyas horas base se usan cuando el tipo no está en HORAS_BASE
+EVENTO_HORAS_BASE_PREDETERMINADO = 'Boda'
+
+# Cómo se cotiza cada servicio seleccionable. El precio sale de PRECIOS[servicio]:
+# - 'escalonado': tabla por número de invitados (opcionalmente por tipo de evento,
+#   con 'Otros' para el resto); cobra horas extra proporcionales a las horas base.
+# - 'fijo': precio único.
+# - 'por_unidad': precio por la cantidad indicada en 'campo_cantidad'.
+# - 'dj': precio fijo por evento, salvo el evento por hora (mínimo de horas o precio fijo más horas extra).
+# - 'planta_luz': precio fijo o por hora si las horas cubiertas superan 'horas_minimas'.
+# Los servicios sin regla se agregan a la cotización con precio 0.
+REGLAS_SERVICIOS = {
+    'DJ': {'tipo': 'dj', 'evento_por_hora': 'Cumpleaños', 'horas_minimas': 6, 'precio_fijo': 12000},
+    'Sonido': {'tipo': 'escalonado', 'horas_extra': True},
+    'Iluminación': {'tipo': 'escalonado', 'horas_extra': True},
+    'Pista de baile': {'tipo': 'escalonado', 'horas_extra': True},
+    'Planta de luz': {'tipo': 'planta_luz', 'precio_hora': 1000, 'horas_minimas': 9},
+    'Chisperos': {'tipo': 'por_unidad', 'campo_cantidad': 'cantidad_chisperos'},
+    'Lluvia de papeles': {'tipo': 'fijo'},
+}
+
+# Servicios incluidos automáticamente según el tipo de evento, en el orden en que se agregan
+SERVICIOS_AUTOMATICOS = [
+    # Para Bodas, incluir Barra de bebidas
+    {'servicio': 'Barra de bebidas', 'eventos': ['Boda']},
+    # Si se seleccionó Sonido y DJ, incluir Cabina de DJ sin costo
+    {'servicio': 'Cabina de DJ', 'eventos': ['Boda'], 'requiere': ['Sonido', 'DJ'], 'precio': 0},
+    # Para Bodas, y Bautizos con 100 invitados o más, incluir Back pintado a mano
+    {'servicio': 'Back pintado a mano', 'eventos': ['Boda']},
+    {'servicio': 'Back pintado a mano', 'eventos': ['Bautizo'], 'min_invitados': 100},
+]
+
+# Horas y modos de precio del DJ incluidos en la matriz de precios precalculada
+HORAS_MAX_MATRIZ = 24
+MODOS_DJ = ('por_hora', 'fijo')
+
+# Datos de una cotización que necesitan las reglas
+Contexto = namedtuple('Contexto', ['tipo_evento', 'num_invitados', 'horas', 'horas_base', 'data'])
+
+
+class Escalones:
+    """Tabla de precios por tope de invitados, p. ej. {'70': 4000, '150': 8000, '151+': 16000}.
+
+    El valor de un tope aplica hasta ese número de invitados inclusive; la clave
+    con '+' aplica sin límite superior. Sin ella, pasar el último tope devuelve None.
+    """
+
+    def __init__(self, tabla):
+        topes = []
+        self.excedente = None
+        for clave, valor in tabla.items():
+            if clave.endswith('+'):
+                self.excedente = valor
+            else:
+                topes.append((int(clave), valor))
+        topes.sort()
+        self.topes = [tope for tope, _ in topes]
+        self.valores = [valor for _, valor in topes]
+
+    def resolver(self, num_invitados):
+        i = bisect.bisect_left(self.topes, num_invitados)
+        if i < len(self.topes):
+            return self.valores[i]
+        return self.excedente
+
+    def indice(self, num_invitados):
+        """Posición del escalón que aplica (len(topes) para el excedente)."""
+        return bisect.bisect_left(self.topes, num_invitados)
+
+
+def _es_tabla_por_evento(tabla):
+    return all(isinstance(valor, dict) for valor in tabla.values())
+
+
+class ReglaEscalonada:
+    def __init__(self, tabla, horas_extra=False):
+        if _es_tabla_por_evento(tabla):
+            self.por_evento = {evento: Escalones(sub) for evento, sub in tabla.items()}
+        else:
+            self.por_evento = {'Otros': Escalones(tabla)}
+        self.horas_extra = horas_extra
+
+    def escalones(self, tipo_evento):
+        return self.por_evento.get(tipo_evento, self.por_evento['Otros'])
+
+    def topes_invitados(self, tipo_evento):
+        return self.escalones(tipo_evento).topes
+
+    def precio(self, ctx):
+        escalones = self.por_evento.get(ctx.tipo_evento) or self.por_evento['Otros']
+        precio = escalones.resolver(ctx.num_invitados)
+        if precio is None:
+            return None  # Contactar para calcular precio
+        return precio + self.cargo_horas_extra(precio, ctx)
+
+    def cargo_horas_extra(self, precio, ctx):
+        horas_base = ctx.horas_base
+        if not self.horas_extra or horas_base is None or ctx.horas <= horas_base:
+            return 0
+        horas_extras = ctx.horas - horas_base
+        # Calculamos el costo por hora extra basado en el precio base del servicio y las horas base
+        costo_por_hora_extra_servicio = precio / horas_base
+        adicional_por_horas_extras = costo_por_hora_extra_servicio * horas_extras
+        return round(adicional_por_horas_extras) # Redondear el costo adicional de las horas extras
+
+
+class ReglaFija:
+    def __init__(self, precio):
+        self.valor = precio
+
+    def topes_invitados(self, tipo_evento):
+        return []
+
+    def precio(self, ctx):
+        return self.valor
+
+
+class ReglaPorUnidad:
+    def __init__(self, precio, campo_cantidad):
+        self.valor = precio
+        self.campo_cantidad = campo_cantidad
+
+    def topes_invitados(self, tipo_evento):
+        return []
+
+    def precio(self, ctx):
+        cantidad = int(ctx.data.get(self.campo_cantidad, 1))
+        return self.valor * cantidad
+
+
+class ReglaDJ:
+    def __init__(self, tabla, evento_por_hora, horas_minimas, precio_fijo, horas_base_por_hora):
+        self.precio_evento = {evento: precio for evento, precio in tabla.items() if evento != evento_por_hora}
+        self.tarifa_hora = tabla[evento_por_hora]
+        self.horas_minimas = horas_minimas
+        self.precio_fijo = precio_fijo
+        self.horas_base_por_hora = horas_base_por_hora
+
+    def topes_invitados(self, tipo_evento):
+        return self.horas_base_por_hora.topes
+
+    def precio(self, ctx):
+        if ctx.tipo_evento in self.precio_evento:
+            return self.precio_evento[ctx.tipo_evento]
+        # Verificar el tipo de precio seleccionado por el usuario (por defecto, por hora)
+        if ctx.data.get('tipo_precio_dj', 'por_hora') == 'por_hora':
+            # Precio por hora con un mínimo de horas
+            return self.tarifa_hora * max(ctx.horas, self.horas_minimas)
+        # Precio fijo más horas extra sobre las horas base según número de invitados
+        dj_horas_base = self.horas_base_por_hora.resolver(ctx.num_invitados)
+        return self.precio_fijo + self.tarifa_hora * max(ctx.horas - dj_horas_base, 0)
+
+
+class ReglaPlantaLuz:
+    def __init__(self, precio, precio_hora, horas_minimas):
+        self.valor = precio
+        self.precio_hora = precio_hora
+        self.horas_minimas = horas_minimas
+
+    def topes_invitados(self, tipo_evento):
+        return []
+
+    def precio(self, ctx):
+        if ctx.horas_base is not None and (ctx.horas_base + 1) > self.horas_minimas:
+            return (ctx.horas_base + 1) * self.precio_hora
+        return self.valor
+
+
+class MotorPrecios:
+    """Motor de precios compilado a partir de PRECIOS, HORAS_BASE y las reglas de servicios."""
+
+    def __init__(self, precios, horas_base, reglas, automaticos):
+        self.precios = precios
+        self.horas_base = {
+            evento: Escalones({clave: (None if valor == 'ilimitado' else valor) for clave, valor in tabla.items()})
+            for evento, tabla in horas_base.items()
+        }
+        self.reglas = {servicio: self._compilar_regla(servicio, regla) for servicio, regla in reglas.items()}
+        self.automaticos = automaticos
+        self._automaticos_por_evento = {}
+        for regla in automaticos:
+            compilada = (regla['servicio'], regla.get('precio', self.precios.get(regla['servicio'], 0)),
+                         regla.get('min_invitados'), tuple(regla.get('requiere', ())))
+            for evento in regla['eventos']:
+                self._automaticos_por_evento.setdefault(evento, []).append(compilada)
+        # Campos de la petición que, además del evento, invitados y horas, cambian algún precio
+        self.campos_variables = ['tipo_precio_dj'] + sorted(
+            regla['campo_cantidad'] for regla in reglas.values() if 'campo_cantidad' in regla
+        )
+        self._topes_por_evento = {}
+        self.matriz = MatrizPrecios(self)
+
+    def _compilar_regla(self, servicio, regla):
+        tipo = regla['tipo']
+        precio = self.precios[servicio]
+        if tipo == 'escalonado':
+            return ReglaEscalonada(precio, regla.get('horas_extra', False))
+        if tipo == 'fijo':
+            return ReglaFija(precio)
+        if tipo == 'por_unidad':
+            return ReglaPorUnidad(precio, regla['campo_cantidad'])
+        if tipo == 'dj':
+            return ReglaDJ(precio, regla['evento_por_hora'], regla['horas_minimas'], regla['precio_fijo'],
+                           self.horas_base[regla['evento_por_hora']])
+        if tipo == 'planta_luz':
+            return ReglaPlantaLuz(precio, regla['precio_hora'], regla['horas_minimas'])
+        raise ValueError(f"Tipo de regla desconocido para '{servicio}': {tipo}")
+
+    def escalones_horas_base(self, tipo_evento):
+        return self.horas_base.get(tipo_evento, self.horas_base[EVENTO_HORAS_BASE_PREDETERMINADO])
+
+    def resolver_horas_base(self, tipo_evento, num_invitados):
+        """Horas base incluidas; None si son ilimitadas."""
+        return self.escalones_horas_base(tipo_evento).resolver(num_invitados)
+
+    def precio_servicio(self, servicio, ctx):
+        """Precio del servicio para la cotización; None si hay que contactar para cotizarlo."""
+        regla = self.reglas.get(servicio)
+        if regla is None:
+            return 0
+        return regla.precio(ctx)
+
+    def servicios_automaticos(self, tipo_evento, num_invitados, servicios):
+        """Servicios incluidos sin seleccionarlos, como pares (servicio, precio)."""
+        incluidos = []
+        for servicio, precio, min_invitados, requiere in self._automaticos_por_evento.get(tipo_evento, ()):
+            # Sin mínimo la regla aplica siempre, también con cantidades fuera de rango
+            if min_invitados is not None and num_invitados < min_invitados:
+                continue
+            if not all(requerido in servicios for requerido in requiere):
+                continue
+            incluidos.append((servicio, precio))
+        return incluidos
+
+    def topes_invitados(self, tipo_evento):
+        """Números de invitados donde cambia algún precio u hora base del tipo de evento."""
+        topes = self._topes_por_evento.get(tipo_evento)
+        if topes is None:
+            conjunto = set(self.escalones_horas_base(tipo_evento).topes)
+            for regla in self.reglas.values():
+                conjunto.update(regla.topes_invitados(tipo_evento))
+            for regla in self.automaticos:
+                if tipo_evento in regla['eventos'] and 'min_invitados' in regla:
+                    conjunto.add(regla['min_invitados'] - 1)
+            topes = self._topes_por_evento[tipo_evento] = sorted(conjunto)
+        return topes
+
+    def firma(self, tipo_evento, num_invitados, horas, data):
+        """Identifica todas las cotizaciones que comparten precios por servicio.
+
+        Dos cantidades de invitados en el mismo tramo producen los mismos precios,
+        así que se usa el tramo y no el número exacto.
+        """
+        tramo = bisect.bisect_left(self.topes_invitados(tipo_evento), num_invitados)
+        return (tipo_evento, tramo, horas, *[data.get(campo) for campo in self.campos_variables])
+
+    def cotizar(self, data):
+        """Calcula la cotización a partir de los datos del formulario."""
+        return self._cotizar(data)
+
+    def cotizar_lote(self, entradas):
+        """Cotiza muchas entradas compartiendo los precios ya resueltos entre ellas.
+
+        Los precios de un conjunto de servicios se calculan una vez por firma
+        (evento, tramo de invitados, horas y campos variables) y se reutilizan en
+        el resto del lote. Devuelve un resultado por entrada, o {'error': ...} si
+        la entrada no es válida. Los resultados con la misma firma comparten las
+        listas 'cotizacion' y 'servicios_automaticos', que no deben modificarse.
+        """
+        resueltos = {}
+        resultados = []
+        for data in entradas:
+            try:
+                resultados.append(self._cotizar(data, resueltos))
+            except (KeyError, TypeError, ValueError) as e:
+                resultados.append({'error': f"Entrada inválida: {e!r}"})
+        return resultados
+
+    def _resolver_servicios(self, tipo_evento, num_invitados, horas, servicios, data):
+        base = self.matriz.indice_base(tipo_evento, num_invitados, horas, data.get('tipo_precio_dj', 'por_hora'))
+        if base is None:
+            # Fuera de la matriz precalculada (evento desconocido o demasiadas horas): aplicar las reglas
+            ctx = Contexto(tipo_evento, num_invitados, horas, self.resolver_horas_base(tipo_evento, num_invitados), data)
+            precios = [self.precio_servicio(servicio, ctx) for servicio in servicios]
+        else:
+            precios = [self.matriz.precio_en(base, servicio, data) for servicio in servicios]
+        cotizacion = []
+        subtotal = 0
+        for servicio, precio in zip(servicios, precios):
+            if precio is None:
+                continue  # Contactar para calcular precio: no se agrega al total
+            cotizacion.append({
+                'servicio': servicio,
+                'precio': precio
+            })
+            subtotal += precio
+        servicios_automaticos = []
+        for servicio, precio in self.servicios_automaticos(tipo_evento, num_invitados, servicios):
+            servicios_automaticos.append({
+                'servicio': servicio,
+                'precio': precio,
+                'incluido': True
+            })
+            subtotal += precio
+        return cotizacion, servicios_automaticos, subtotal
+
+    def _cotizar(self, data, resueltos=None):
+        tipo_evento = data['tipo_evento']
+        num_invitados = int(data['num_invitados'])
+        horas = int(data['duracion'])
+        servicios = data['servicios']
+
+        # Calcular precios de servicios seleccionados e incluidos automáticamente
+        if resueltos is None:
+            resuelto = self._resolver_servicios(tipo_evento, num_invitados, horas, servicios, data)
+        else:
+            clave = self.firma(tipo_evento, num_invitados, horas, data) + tuple(servicios)
+            resuelto = resueltos.get(clave)
+            if resuelto is None:
+                resuelto = resueltos[clave] = self._resolver_servicios(tipo_evento, num_invitados, horas, servicios, data)
+        cotizacion, servicios_automaticos, total = resuelto
+
+        # Agregar descuentos y viáticos si se proporcionaron
+        descuentos = data.get('descuentos', [])
+        viaticos = data.get('viaticos', [])
+        extras = data.get('extras', [])
+
+        for descuento in descuentos:
+            total -= descuento['monto']
+
+        for viatico in viaticos:
+            total += viatico['monto']
+
+        for extra in extras:
+            total += extra['monto']
+
+        return {
+            'cotizacion': cotizacion,
+            'servicios_automaticos': servicios_automaticos,
+            'descuentos': descuentos,
+            'viaticos': viaticos,
+            'extras': extras,
+            'total': total
+        }
+
+
+class MatrizPrecios:
+    """Precios de todos los servicios precalculados en un arreglo plano de enteros.
+
+    Hay un valor por combinación de tipo de evento, tramo de invitados, horas
+    (0 a horas_max), modo de precio del DJ y servicio, en ese orden. Los servicios
+    por unidad guardan el precio unitario y SIN_PRECIO marca los que requieren
+    contactar para calcular el precio.
+    """
+    SIN_PRECIO = -1
+
+    def __init__(self, motor, horas_max=HORAS_MAX_MATRIZ):
+        self.tipos = list(motor.horas_base)
+        # Unión de los topes de todos los eventos: dentro de un tramo ningún precio cambia
+        self.topes = sorted(set().union(*(motor.topes_invitados(tipo) for tipo in self.tipos)))
+        self.horas_max = horas_max
+        self.modos_dj = list(MODOS_DJ)
+        self.servicios = list(motor.reglas)
+        self.por_unidad = {
+            servicio: regla.campo_cantidad for servicio, regla in motor.reglas.items()
+            if isinstance(regla, ReglaPorUnidad)
+        }
+        self.automaticos = [
+            {'servicio': servicio, 'precio': precio, 'evento': evento,
+             'min_invitados': min_invitados, 'requiere': list(requiere)}
+            for evento, reglas in motor._automaticos_por_evento.items()
+            for servicio, precio, min_invitados, requiere in reglas
+        ]
+        self._tipo = {tipo: i for i, tipo in enumerate(self.tipos)}
+        self._columna = {servicio: i for i, servicio in enumerate(self.servicios)}
+
+        self._paso_modo = len(self.servicios)
+        self._paso_horas = len(self.modos_dj) * self._paso_modo
+        self._paso_tramo = (horas_max + 1) * self._paso_horas
+        self._paso_tipo = (len(self.topes) + 1) * self._paso_tramo
+
+        self.valores = array('q')
+        for tipo in self.tipos:
+            for tramo in range(len(self.topes) + 1):
+                num_invitados = self._invitados_de_tramo(tramo)
+                horas_base = motor.resolver_horas_base(tipo, num_invitados)
+                for horas in range(horas_max + 1):
+                    for modo in self.modos_dj:
+                        data = {'tipo_precio_dj': modo}
+                        data.update({campo: 1 for campo in self.por_unidad.values()})
+                        ctx = Contexto(tipo, num_invitados, horas, horas_base, data)
+                        for servicio in self.servicios:
+                            self.valores.append(self._codificar(servicio, motor.reglas[servicio].precio(ctx)))
+
+        self.version = hashlib.sha256(
+            json.dumps(self.como_dict(incluir_version=False), sort_keys=True, ensure_ascii=False).encode('utf-8')
+        ).hexdigest()[:16]
+
+    def _invitados_de_tramo(self, tramo):
+        """Un número de invitados representativo del tramo."""
+        if tramo < len(self.topes):
+            return self.topes[tramo]
+        return self.topes[-1] + 1 if self.topes else 1
+
+    def _codificar(self, servicio, precio):
+        if precio is None:
+            return self.SIN_PRECIO
+        if precio != int(precio) or precio < 0:
+            raise ValueError(f"Precio no entero o negativo para '{servicio}': {precio}")
+        return int(precio)
+
+    def indice_base(self, tipo_evento, num_invitados, horas, tipo_precio_dj='por_hora'):
+        """Posición del primer servicio de la combinación, o None si está fuera de la matriz."""
+        tipo = self._tipo.get(tipo_evento)
+        if tipo is None or not 0 <= horas <= self.horas_max:
+            return None
+        tramo = bisect.bisect_left(self.topes, num_invitados)
+        modo = 0 if tipo_precio_dj == 'por_hora' else 1
+        return tipo * self._paso_tipo + tramo * self._paso_tramo + horas * self._paso_horas + modo * self._paso_modo
+
+    def precio_en(self, base, servicio, data):
+        """Precio del servicio en la combinación de indice_base (None: contactar; 0: sin regla)."""
+        columna = self._columna.get(servicio)
+        if columna is None:
+            return 0
+        precio = self.valores[base + columna]
+        if precio == self.SIN_PRECIO:
+            return None
+        campo_cantidad = self.por_unidad.get(servicio)
+        if campo_cantidad is not None:
+            precio *= int(data.get(campo_cantidad, 1))
+        return precio
+
+    def precio(self, servicio, tipo_evento, num_invitados, horas, tipo_precio_dj='por_hora', cantidad=1):
+        """Consulta directa de un precio; KeyError si la combinación no está en la matriz."""
+        base = self.indice_base(tipo_evento, num_invitados, horas, tipo_precio_dj)
+        if base is None or servicio not in self._columna:
+            raise KeyError((servicio, tipo_evento, horas))
+        campo_cantidad = self.por_unidad.get(servicio)
+        return self.precio_en(base, servicio, {campo_cantidad: cantidad} if campo_cantidad else {})
+
+    def como_dict(self, incluir_version=True):
+        """Representación JSON compacta para calcular precios en el navegador."""
+        datos = {
+            'tipos': self.tipos,
+            'topes': self.topes,
+            'horas_max': self.horas_max,
+            'modos_dj': self.modos_dj,
+            'servicios': self.servicios,
+            'por_unidad': self.por_unidad,
+            'automaticos': self.automaticos,
+            'sin_precio': self.SIN_PRECIO,
+            'valores': self.valores.tolist(),
+        }
+        if incluir_version:
+            datos['version'] = self.version
+        return datos
+
+
+MOTOR_PRECIOS = MotorPrecios(PRECIOS, HORAS_BASE, REGLAS_SERVICIOS, SERVICIOS_AUTOMATICOS)
+
+
+MATRIZ_PRECIOS = MOTOR_PRECIOS.matriz
+
+
+def calcular_cotizacion(data):
+    """Cotización para los datos del formulario usando el motor de precios compilado."""
+    return MOTOR_PRECIOS.cotizar(data)
+
+
+def expandir_grid(grid, base=None, maximo=None):
+    """Producto cartesiano de un grid de escenarios.
+
+    grid asigna a cada campo una lista de valores, p. ej.
+    {'num_invitados': [70, 150, 250], 'duracion': [6, 8, 10]}; base tiene los
+    campos comunes a todos los escenarios (como 'tipo_evento' o 'servicios').
+    Con maximo, rechaza grids que generen más escenarios que ese límite.
+    """
+    base = base or {}
+    if not isinstance(grid, dict) or not isinstance(base, dict):
+        raise ValueError("El grid y la base deben ser objetos")
+    campos = list(grid)
+    total = 1
+    for campo in campos:
+        if not isinstance(grid[campo], list):
+            raise ValueError(f"El campo '{campo}' del grid debe ser una lista")
+        total *= len(grid[campo])
+    if maximo is not None and total > maximo:
+        raise ValueError(f"El grid genera {total} escenarios; el máximo es {maximo}")
+    return [dict(base, **dict(zip(campos, valores))) for valores in itertools.product(*(grid[c] for c in campos))]
+
+
+def calcular_cotizaciones(entradas):
+    """Cotizaciones de un lote de entradas con el motor de precios compilado."""
+    return MOTOR_PRECIOS.cotizar_lote(entradas)
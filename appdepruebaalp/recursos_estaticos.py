@@ -0,0 +1,135 @@
+"""Recursos estáticos con huella de contenido y precomprimidos.
+
+`construir()` copia cada archivo de static/ a static_construido/ con el hash de su
+contenido en el nombre (css/styles.3f9a1c2b4d5e.css) y, para los de texto, guarda a su
+lado las versiones .br y .gz. manifest.json relaciona cada ruta de static/ con la
+construida. Como el nombre cambia con el contenido, el navegador los guarda sin volver
+a preguntar (Cache-Control immutable) y el servidor no comprime nada al atenderlos.
+
+Brotli es opcional: sin el paquete `brotli` solo se generan los .gz.
+"""
+import gzip
+import hashlib
+import json
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from archivos import BASE_DIR, escritura_atomica
+
+DIRECTORIO_STATIC = os.path.join(BASE_DIR, 'static')
+DIRECTORIO_CONSTRUIDO = os.path.join(BASE_DIR, 'static_construido')
+MANIFIESTO = 'manifest.json'
+
+# Caracteres del hash en el nombre del archivo
+LARGO_HUELLA = 12
+
+# Solo se precomprimen los formatos de texto; JPG y PNG ya van comprimidos
+EXTENSIONES_COMPRIMIBLES = ('.css', '.js', '.svg', '.html', '.json', '.txt')
+
+# Codificaciones en orden de preferencia: extensión del archivo precomprimido
+CODIFICACIONES = (('br', '.br'), ('gzip', '.gz'))
+
+def nombre_con_huella(ruta, contenido):
+    base, extension = os.path.splitext(ruta)
+    return f"{base}.{hashlib.sha256(contenido).hexdigest()[:LARGO_HUELLA]}{extension}"
+
+def _escribir(ruta, contenido):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with escritura_atomica(ruta) as archivo:
+        archivo.write(contenido)
+
+def _comprimidos(contenido):
+    """{codificación: bytes} de las versiones comprimidas que ocupan menos que el original."""
+    versiones = {'gzip': gzip.compress(contenido, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        versiones['br'] = brotli.compress(contenido, quality=11)
+    return {codificacion: datos for codificacion, datos in versiones.items() if len(datos) < len(contenido)}
+
+def construir(origen=DIRECTORIO_STATIC, destino=DIRECTORIO_CONSTRUIDO):
+    """Construye los recursos de `origen` en `destino` y devuelve el manifiesto.
+
+    Cada entrada del manifiesto (por ruta relativa a static/) tiene el archivo con huella,
+    el mtime del original, los bytes de cada versión y las codificaciones disponibles.
+    Se eliminan los archivos de construcciones anteriores.
+    """
+    manifiesto = {}
+    vigentes = {MANIFIESTO}
+    for carpeta, _, archivos in os.walk(origen):
+        for nombre in sorted(archivos):
+            ruta_origen = os.path.join(carpeta, nombre)
+            ruta = os.path.relpath(ruta_origen, origen).replace(os.sep, '/')
+            with open(ruta_origen, 'rb') as f:
+                contenido = f.read()
+            construido = nombre_con_huella(ruta, contenido)
+            ruta_destino = os.path.join(destino, construido)
+            if not os.path.exists(ruta_destino):
+                _escribir(ruta_destino, contenido)
+            vigentes.add(construido)
+            entrada = {'archivo': construido, 'mtime': os.stat(ruta_origen).st_mtime_ns,
+                       'bytes': {'identity': len(contenido)}, 'codificaciones': []}
+            if ruta.lower().endswith(EXTENSIONES_COMPRIMIBLES):
+                comprimidos = _comprimidos(contenido)
+                for codificacion, extension in CODIFICACIONES:
+                    if codificacion in comprimidos:
+                        _escribir(ruta_destino + extension, comprimidos[codificacion])
+                        vigentes.add(construido + extension)
+                        entrada['bytes'][codificacion] = len(comprimidos[codificacion])
+                        entrada['codificaciones'].append(codificacion)
+            manifiesto[ruta] = entrada
+    _escribir(os.path.join(destino, MANIFIESTO),
+              json.dumps(manifiesto, indent=2, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+
+    # Quitar lo que dejaron construcciones anteriores
+    for carpeta, _, archivos in os.walk(destino):
+        for nombre in archivos:
+            ruta = os.path.relpath(os.path.join(carpeta, nombre), destino).replace(os.sep, '/')
+            if ruta not in vigentes:
+                os.remove(os.path.join(carpeta, nombre))
+    return manifiesto
+
+class Recursos:
+    """Manifiesto de los recursos construidos: rutas con huella y archivo a enviar."""
+
+    def __init__(self, directorio=DIRECTORIO_CONSTRUIDO, origen=DIRECTORIO_STATIC):
+        self.directorio = directorio
+        self.origen = origen
+        self.cargar()
+
+    def cargar(self):
+        """Lee el manifiesto; sin construir, no hay recursos con huella."""
+        try:
+            with open(os.path.join(self.directorio, MANIFIESTO), encoding='utf-8') as f:
+                self._manifiesto = json.load(f)
+        except (OSError, ValueError):
+            self._manifiesto = {}
+        self._por_archivo = {entrada['archivo']: entrada for entrada in self._manifiesto.values()}
+
+    def construido(self, ruta):
+        """Ruta con huella de `ruta` (relativa a static/), o None si no está construida o
+        el original cambió después de construirla."""
+        entrada = self._manifiesto.get(ruta)
+        if entrada is None:
+            return None
+        try:
+            if os.stat(os.path.join(self.origen, ruta)).st_mtime_ns != entrada['mtime']:
+                return None
+        except OSError:
+            return None
+        return entrada['archivo']
+
+    def archivo(self, nombre, codificaciones_aceptadas=()):
+        """(ruta en disco, codificación) del recurso construido `nombre`: la versión
+        precomprimida preferida entre las aceptadas, o la original con codificación None.
+        Devuelve (None, None) si `nombre` no es un recurso construido."""
+        entrada = self._por_archivo.get(nombre)
+        if entrada is None:
+            return None, None
+        ruta = os.path.join(self.directorio, entrada['archivo'])
+        for codificacion, extension in CODIFICACIONES:
+            if codificacion in entrada['codificaciones'] and codificacion in codificaciones_aceptadas:
+                return ruta + extension, codificacion
+        return ruta, None
@@ -0,0 +1,129 @@
+"""Registro (logging) estructurado y sin bloqueos.
+
+Cada línea es un objeto JSON. Los mensajes se encolan con un QueueHandler y un hilo
+aparte los formatea y escribe, así quien registra no espera a la salida estándar.
+Las cotizaciones se registran como un resumen de tamaño fijo y sin datos personales,
+solo en una muestra de las peticiones; el volcado completo es un interruptor de depuración.
+
+Variables de entorno:
+    LOG_NIVEL             nivel mínimo (INFO)
+    LOG_MUESTRA           fracción de peticiones cuyo resumen se registra (0.01)
+    LOG_PAYLOAD_COMPLETO  1 para volcar cada cotización completa (redactada) en nivel DEBUG
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+
+NIVEL_REGISTRO = os.environ.get('LOG_NIVEL', 'INFO').upper()
+MUESTRA_PAYLOAD = float(os.environ.get('LOG_MUESTRA', 0.01))
+PAYLOAD_COMPLETO = os.environ.get('LOG_PAYLOAD_COMPLETO', '0') == '1'
+
+# Datos de los clientes que nunca se escriben en el registro
+CAMPOS_PRIVADOS = ('nombre', 'lugar', 'fecha', 'num_personas')
+TEXTOS_LIBRES = ('texto_adicional', 'titulo', 'titulo_tipo_evento', 'terminos_titulo', 'nota_final', 'descripcion')
+
+_listener = None
+_pid_configurado = None
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por mensaje; los campos de `extra={'campos': {...}}` se agregan al objeto."""
+
+    def format(self, record):
+        datos = {
+            'fecha': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'nivel': record.levelname,
+            'origen': record.name,
+            'mensaje': record.getMessage(),
+        }
+        campos = getattr(record, 'campos', None)
+        if campos:
+            datos.update(campos)
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+def configurar_registro():
+    """Dirige el registro raíz a una cola que escribe un hilo aparte.
+
+    Se llama una vez por proceso: en el servidor al importar la app y en cada proceso
+    de trabajo del PDF, que no hereda el hilo escritor de su proceso padre.
+    """
+    global _listener, _pid_configurado
+    if _pid_configurado == os.getpid():
+        return
+    raiz = logging.getLogger()
+    for handler in list(raiz.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            raiz.removeHandler(handler)
+
+    cola = queue.SimpleQueue()
+    salida = logging.StreamHandler(sys.stderr)
+    salida.setFormatter(FormatoJSON())
+    _listener = logging.handlers.QueueListener(cola, salida, respect_handler_level=True)
+    _listener.start()
+    raiz.addHandler(logging.handlers.QueueHandler(cola))
+    raiz.setLevel(NIVEL_REGISTRO)
+    if _pid_configurado is None:
+        # Escribir lo pendiente al salir
+        atexit.register(_detener)
+    _pid_configurado = os.getpid()
+
+def _detener():
+    if _listener is not None and _pid_configurado == os.getpid():
+        _listener.stop()
+
+def _cantidad(valor):
+    """Elementos de una lista o caracteres de un texto; None si el cliente mandó otro tipo."""
+    if valor is None:
+        return 0
+    return len(valor) if isinstance(valor, (list, str)) else None
+
+def resumen_cotizacion(data):
+    """Resumen de tamaño fijo de la cotización, sin datos personales.
+
+    Los campos vienen tal como los mandó el cliente: uno de tipo inesperado no debe
+    hacer fallar la petición desde el registro.
+    """
+    if not isinstance(data, dict):
+        return {'tipo': type(data).__name__}
+    personalizacion = data.get('personalizacion')
+    if not isinstance(personalizacion, dict):
+        personalizacion = {}
+    return {
+        'tipo_evento': data.get('tipo_evento'),
+        'num_invitados': data.get('num_invitados'),
+        'duracion': data.get('duracion'),
+        'total': data.get('total'),
+        'servicios': _cantidad(data.get('cotizacion')),
+        'servicios_automaticos': _cantidad(data.get('servicios_automaticos')),
+        'descuentos': _cantidad(data.get('descuentos')),
+        'viaticos': _cantidad(data.get('viaticos')),
+        'extras': _cantidad(data.get('extras')),
+        'largo_texto_adicional': _cantidad(personalizacion.get('texto_adicional')),
+        'incluir_terminos': personalizacion.get('incluir_terminos', True),
+    }
+
+def redactar(valor):
+    """Copia de la cotización con los datos personales y los textos libres ocultos."""
+    if isinstance(valor, dict):
+        redactado = {}
+        for campo, contenido in valor.items():
+            if campo in CAMPOS_PRIVADOS or campo in TEXTOS_LIBRES:
+                redactado[campo] = f"<{len(str(contenido))} caracteres>" if contenido else contenido
+            else:
+                redactado[campo] = redactar(contenido)
+        return redactado
+    if isinstance(valor, list):
+        return [redactar(elemento) for elemento in valor]
+    return valor
+
+def registrar_cotizacion(logger, ruta, data):
+    """Registra la cotización recibida: completa y redactada con LOG_PAYLOAD_COMPLETO,
+    o su resumen en una muestra de LOG_MUESTRA de las peticiones."""
+    if PAYLOAD_COMPLETO and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Cotización recibida", extra={'campos': {'ruta': ruta, 'cotizacion': redactar(data)}})
+    elif random.random() < MUESTRA_PAYLOAD and logger.isEnabledFor(logging.INFO):
+        logger.info("Cotización recibida", extra={'campos': {'ruta': ruta, 'resumen': resumen_cotizacion(data)}})
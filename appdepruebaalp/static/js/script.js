@@ -3,6 +3,8 @@ document.addEventListener('DOMContentLoaded', function() {
     let tipoEvento = '';
     let currentStep = 1;
     let cotizacionData = {};
+    // Último PDF descargado, para revalidarlo con el servidor mediante su ETag
+    let ultimoPDF = null;
     
     // Inicializar el selector de fecha
     flatpickr(".datepicker", {
@@ -115,6 +117,30 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 
+    // Matriz de precios precalculada: permite estimar el total al instante mientras se llena el formulario.
+    // Su versión cambia con las reglas de precios; el servidor informa la vigente en cada cotización
+    let matrizPrecios = null;
+    function cargarMatrizPrecios() {
+        return fetch('/matriz_precios')
+            .then(response => response.ok ? response.json() : null)
+            .then(matriz => {
+                matrizPrecios = matriz;
+                actualizarTotalEstimado();
+            })
+            .catch(() => { matrizPrecios = null; });
+    }
+    cargarMatrizPrecios();
+    
+    // Recalcular el estimado cuando cambia cualquier dato que afecta el precio
+    ['num_invitados', 'duracion', 'cantidad_chisperos', 'tipo_precio_dj'].forEach(id => {
+        document.getElementById(id).addEventListener('input', alCambiarPrecio);
+        document.getElementById(id).addEventListener('change', alCambiarPrecio);
+    });
+    document.querySelectorAll('input[name="servicios"]').forEach(checkbox => {
+        checkbox.addEventListener('change', alCambiarPrecio);
+    });
+    eventTypes.forEach(type => type.addEventListener('click', alCambiarPrecio));
+    
     // Generar cotización
     document.getElementById('generar-cotizacion').addEventListener('click', generarCotizacion);
     
@@ -202,53 +228,178 @@ document.addEventListener('DOMContentLoaded', function() {
         goToStep(3);
     }
     
-    // Función para generar la cotización
-    function generarCotizacion() {
-        // Recopilar datos del formulario
-        const serviciosSeleccionados = [];
-        document.querySelectorAll('input[name="servicios"]:checked').forEach(checkbox => {
-            serviciosSeleccionados.push(checkbox.value);
-        });
-        
-        if (serviciosSeleccionados.length === 0) {
-            alert('Por favor, seleccione al menos un servicio.');
-            return;
+    // Número de topes menores que el número de invitados (equivalente a bisect_left)
+    function indiceTramo(topes, numInvitados) {
+        let bajo = 0;
+        let alto = topes.length;
+        while (bajo < alto) {
+            const medio = (bajo + alto) >> 1;
+            if (topes[medio] < numInvitados) {
+                bajo = medio + 1;
+            } else {
+                alto = medio;
+            }
         }
+        return bajo;
+    }
+    
+    // Total estimado con la matriz de precios, o null si faltan datos o la combinación no está en la matriz
+    function estimarTotal() {
+        const matriz = matrizPrecios;
+        if (!matriz) return null;
         
-        // Preparar datos para enviar al servidor
-        const data = {
+        const tipo = matriz.tipos.indexOf(tipoEvento);
+        const numInvitados = parseInt(document.getElementById('num_invitados').value, 10);
+        const horas = parseInt(document.getElementById('duracion').value, 10);
+        if (tipo < 0 || isNaN(numInvitados) || isNaN(horas) || horas < 0 || horas > matriz.horas_max) return null;
+        
+        const servicios = Array.from(document.querySelectorAll('input[name="servicios"]:checked'), checkbox => checkbox.value);
+        // Igual que generarCotizacion: el tipo de precio del DJ solo se envía para cumpleaños
+        const modoDj = (servicios.includes('DJ') && tipoEvento === 'Cumpleaños') ? tipoPrecioDjSelect.value : 'por_hora';
+        const modo = modoDj === 'por_hora' ? 0 : 1;
+        const tramo = indiceTramo(matriz.topes, numInvitados);
+        const base = (((tipo * (matriz.topes.length + 1) + tramo) * (matriz.horas_max + 1) + horas)
+            * matriz.modos_dj.length + modo) * matriz.servicios.length;
+        
+        let total = 0;
+        servicios.forEach(servicio => {
+            const columna = matriz.servicios.indexOf(servicio);
+            if (columna < 0) return;
+            const precio = matriz.valores[base + columna];
+            if (precio === matriz.sin_precio) return;  // Contactar para calcular precio
+            const campoCantidad = matriz.por_unidad[servicio];
+            let cantidad = 1;
+            if (campoCantidad) {
+                const valor = parseInt(document.getElementById(campoCantidad).value, 10);
+                cantidad = isNaN(valor) ? 1 : valor;
+            }
+            total += precio * cantidad;
+        });
+        
+        // Servicios incluidos automáticamente
+        matriz.automaticos.forEach(regla => {
+            // min_invitados null: la regla no tiene mínimo
+            if (regla.evento === tipoEvento &&
+                (regla.min_invitados === null || numInvitados >= regla.min_invitados) &&
+                regla.requiere.every(requerido => servicios.includes(requerido))) {
+                total += regla.precio;
+            }
+        });
+        return total;
+    }
+    
+    function actualizarTotalEstimado() {
+        const total = estimarTotal();
+        document.getElementById('total-estimado').textContent =
+            total === null ? '' : `Total estimado: $${total.toLocaleString('es-MX')}`;
+    }
+    
+    // Confirmación con el servidor: el estimado local se actualiza con cada cambio y al
+    // servidor solo se le pide la cotización final, al generarla
+    let confirmacion = null;  // {clave, precio, promesa, control} de la última cotización pedida
+    
+    // Datos que determinan el precio; lugar, nombre y fecha no cambian la cotización
+    function datosPrecio() {
+        const servicios = Array.from(document.querySelectorAll('input[name="servicios"]:checked'), checkbox => checkbox.value);
+        const datos = {
             tipo_evento: tipoEvento,
-            lugar: document.getElementById('lugar').value,
-            nombre: document.getElementById('nombre').value,
             num_invitados: document.getElementById('num_invitados').value,
-            fecha: document.getElementById('fecha').value,
             duracion: document.getElementById('duracion').value,
-            servicios: serviciosSeleccionados
+            servicios
         };
         
         // Si se seleccionaron chisperos, agregar la cantidad
-        if (serviciosSeleccionados.includes('Chisperos')) {
-            data.cantidad_chisperos = document.getElementById('cantidad_chisperos').value;
+        if (servicios.includes('Chisperos')) {
+            datos.cantidad_chisperos = document.getElementById('cantidad_chisperos').value;
         }
         
         // Si se seleccionó DJ y es un evento de cumpleaños, agregar el tipo de precio
-        if (serviciosSeleccionados.includes('DJ') && tipoEvento === 'Cumpleaños') {
-            data.tipo_precio_dj = document.getElementById('tipo_precio_dj').value;
+        if (servicios.includes('DJ') && tipoEvento === 'Cumpleaños') {
+            datos.tipo_precio_dj = document.getElementById('tipo_precio_dj').value;
+        }
+        return datos;
+    }
+    
+    // Cotización del servidor para `data`, que queda guardada en el historial con su id.
+    // Si el formulario no cambió desde el último clic se reutiliza la misma respuesta:
+    // repetir el clic no vuelve a pedirla ni la guarda dos veces
+    function confirmarCotizacion(data) {
+        const clave = JSON.stringify(data);
+        if (confirmacion && confirmacion.clave === clave) {
+            return confirmacion.promesa;
         }
+        cancelarConfirmacion();
         
-        // Enviar datos al servidor
-        fetch('/generar_cotizacion', {
+        const control = new AbortController();
+        const promesa = fetch('/generar_cotizacion', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
             },
-            body: JSON.stringify(data)
+            body: JSON.stringify(data),
+            signal: control.signal
         })
-        .then(response => response.json())
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`El servidor respondió ${response.status}`);
+            }
+            // Si las reglas de precios cambiaron, actualizar la matriz del estimado local
+            const version = response.headers.get('X-Version-Precios');
+            if (version && matrizPrecios && version !== matrizPrecios.version) {
+                cargarMatrizPrecios();
+            }
+            return response.json();
+        });
+        
+        const actual = { clave, precio: JSON.stringify(datosPrecio()), promesa, control };
+        confirmacion = actual;
+        // Un error no se guarda: la próxima vez se vuelve a pedir
+        promesa.catch(() => {
+            if (confirmacion === actual) confirmacion = null;
+        });
+        return promesa;
+    }
+    
+    function cancelarConfirmacion() {
+        if (confirmacion) {
+            confirmacion.control.abort();
+            confirmacion = null;
+        }
+    }
+    
+    function alCambiarPrecio() {
+        actualizarTotalEstimado();
+        // Una cotización pedida con otros precios ya no corresponde al formulario
+        if (confirmacion && confirmacion.precio !== JSON.stringify(datosPrecio())) {
+            cancelarConfirmacion();
+        }
+    }
+    
+    // Función para generar la cotización
+    function generarCotizacion() {
+        // Recopilar datos del formulario
+        const datos = datosPrecio();
+        
+        if (datos.servicios.length === 0) {
+            alert('Por favor, seleccione al menos un servicio.');
+            return;
+        }
+        
+        // Datos completos de la cotización
+        const data = {
+            ...datos,
+            lugar: document.getElementById('lugar').value,
+            nombre: document.getElementById('nombre').value,
+            fecha: document.getElementById('fecha').value
+        };
+        
+        // Pedir la cotización y guardarla
+        confirmarCotizacion(data)
         .then(result => {
             // Guardar datos de la cotización
             cotizacionData = {
                 ...data,
+                id: result.id,
                 cotizacion: result.cotizacion || [],
                 servicios_automaticos: result.servicios_automaticos || [],
                 descuentos: [],
@@ -277,6 +428,8 @@ document.addEventListener('DOMContentLoaded', function() {
             document.getElementById('resultado-cotizacion').scrollIntoView({ behavior: 'smooth' });
         })
         .catch(error => {
+            // Cancelada porque el formulario cambió: no es un error
+            if (error.name === 'AbortError') return;
             console.error('Error:', error);
             alert('Ocurrió un error al generar la cotización. Por favor, intente nuevamente.');
         });
@@ -387,11 +540,17 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Recopilar datos de personalización (solo los necesarios para la portada y estilos)
         recopilarDatosPersonalizacion().then(personalizacion => {
-            // Preparar datos para el PDF
-            // Incluir datos principales de cotizacionData y la personalización
-            const pdfData = {
+            // Preparar datos para el PDF. La cotización ya está guardada en el servidor:
+            // basta su id con los ajustes y la personalización (colores, textos, portada)
+            const pdfData = cotizacionData.id ? {
+                id: cotizacionData.id,
+                descuentos: cotizacionData.descuentos,
+                viaticos: cotizacionData.viaticos,
+                extras: cotizacionData.extras,
+                personalizacion: personalizacion
+            } : {
                 ...cotizacionData, // Incluye nombre, fecha, lugar, num_personas, etc.
-                personalizacion: personalizacion // Incluye colores, textos, portada(tipo_evento, titulo_tipo_evento)
+                personalizacion: personalizacion
             };
             
             // Enviar datos directamente
@@ -450,25 +609,81 @@ async function recopilarDatosPersonalizacion() {
 }
 
 // Función para enviar los datos al servidor para generar el PDF
-function enviarDatosParaPDF(pdfData, generarBtn, textoOriginal) {
-    fetch('/descargar_plantilla', { // <-- Corregir URL
-        method: 'POST',
-        headers: {
+// Espera la cantidad de milisegundos indicada
+function esperar(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+// Lanza un Error con el mensaje que devolvió el servidor
+async function lanzarErrorDeRespuesta(response) {
+    if (response.headers.get('content-type')?.includes('application/json')) {
+        const data = await response.json();
+        throw new Error(data.error || 'Error al generar el PDF');
+    }
+    throw new Error(`Error ${response.status}: ${response.statusText}`);
+}
+
+// Encola el PDF en el servidor; si la cola está llena, reintenta cuando indique Retry-After
+async function encolarPDF(pdfData, generarBtn) {
+    for (let intento = 0; intento < 5; intento++) {
+        const headers = {
             'Content-Type': 'application/json'
-        },
-        body: JSON.stringify(pdfData)
-    })
-    .then(response => {
-        if (!response.ok) {
-            if (response.headers.get('content-type')?.includes('application/json')) {
-                return response.json().then(data => {
-                    throw new Error(data.error || 'Error al generar el PDF');
-                });
-            }
-            throw new Error(`Error ${response.status}: ${response.statusText}`);
+        };
+        // Si ya se descargó un PDF, el servidor responde 304 cuando el contenido no cambió
+        if (ultimoPDF) {
+            headers['If-None-Match'] = ultimoPDF.etag;
         }
-        return response.blob();
-    })
+        const response = await fetch('/trabajos_pdf', {
+            method: 'POST',
+            headers: headers,
+            body: JSON.stringify(pdfData)
+        });
+        if (response.status !== 503) {
+            return response;
+        }
+        const segundos = parseInt(response.headers.get('Retry-After'), 10) || 5;
+        generarBtn.textContent = `En espera (${segundos} s)...`;
+        await esperar(segundos * 1000);
+    }
+    throw new Error('El servidor está ocupado, intente de nuevo en unos minutos');
+}
+
+// Genera el PDF como trabajo en segundo plano y devuelve el archivo cuando está listo
+async function obtenerPDF(pdfData, generarBtn) {
+    const response = await encolarPDF(pdfData, generarBtn);
+    if (response.status === 304 && ultimoPDF) {
+        return ultimoPDF.blob;
+    }
+    if (!response.ok) {
+        await lanzarErrorDeRespuesta(response);
+    }
+    let trabajo = await response.json();
+    generarBtn.textContent = 'Generando PDF...';
+    
+    // El servidor mantiene abierta la consulta hasta que el trabajo termina (máximo 25 s)
+    while (trabajo.estado !== 'listo') {
+        if (trabajo.estado === 'error') {
+            throw new Error(trabajo.error || 'Error al generar el PDF');
+        }
+        const estado = await fetch(`${trabajo.estado_url}?espera=25`);
+        if (!estado.ok) {
+            await lanzarErrorDeRespuesta(estado);
+        }
+        trabajo = await estado.json();
+    }
+    
+    const pdf = await fetch(trabajo.pdf_url);
+    if (!pdf.ok) {
+        await lanzarErrorDeRespuesta(pdf);
+    }
+    const etag = pdf.headers.get('ETag');
+    const blob = await pdf.blob();
+    ultimoPDF = etag ? { etag, blob } : null;
+    return blob;
+}
+
+function enviarDatosParaPDF(pdfData, generarBtn, textoOriginal) {
+    obtenerPDF(pdfData, generarBtn)
     .then(blob => {
         // Crear un enlace para descargar el archivo
         const url = window.URL.createObjectURL(blob);
@@ -477,7 +692,7 @@ function enviarDatosParaPDF(pdfData, generarBtn, textoOriginal) {
         a.href = url;
         
         // Generar nombre de archivo usando datos de cotizacionData
-        const nombreArchivo = `Cotizacion_${pdfData.nombre || 'Evento'}_${pdfData.fecha ? pdfData.fecha.replace(/\//g, '-') : 'SinFecha'}.pdf`;
+        const nombreArchivo = `Cotizacion_${cotizacionData.nombre || 'Evento'}_${cotizacionData.fecha ? cotizacionData.fecha.replace(/\//g, '-') : 'SinFecha'}.pdf`;
         a.download = nombreArchivo;
         
         document.body.appendChild(a);
@@ -502,6 +717,7 @@ function reiniciarCotizacion() {
     if (form) form.reset();
     
     // Restablecer variables globales
+    cancelarConfirmacion();
     tipoEvento = '';
     currentStep = 1;
     cotizacionData = {};
@@ -510,6 +726,7 @@ function reiniciarCotizacion() {
     document.querySelectorAll('.event-type').forEach(t => t.classList.remove('selected'));
     document.getElementById('resultado-cotizacion').style.display = 'none';
     document.getElementById('total-cotizacion').textContent = '$0';
+    document.getElementById('total-estimado').textContent = '';
     document.getElementById('descuentos-list').innerHTML = '';
     document.getElementById('viaticos-list').innerHTML = '';
     document.getElementById('extras-list').innerHTML = '';
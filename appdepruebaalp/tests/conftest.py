@@ -0,0 +1,6 @@
+"""Configuración de pytest: los módulos de la aplicación se importan como en el servidor."""
+import os
+import sys
+
+# La aplicación no es un paquete: app.py importa sus módulos desde su propia carpeta
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,292 @@
+"""Cálculo de precios original (la vista generar_cotizacion antes del motor compilado).
+
+Se conserva sin cambios como referencia: test_precios.py compara el motor de precios
+con esta función en todo el grid de escenarios. No se usa en la aplicación.
+"""
+# Configuración de precios y reglas
+PRECIOS = {
+    'DJ': {
+        'Boda': 12000,
+        'Bautizo': 12000,
+        'Quince años': 12000,
+        'Cumpleaños': 1000  # por hora
+    },
+    'Sonido': {
+        'Boda': {
+            '150': 8000,
+            '151+': 16000
+        },
+        'Otros': {
+            '70': 4000,
+            '150': 8000,
+            '250': 12000,
+            '350': 16000
+        }
+    },
+    'Iluminación': {
+        'Boda': {
+           # '150': 4500,
+            #'151+': 18000,
+            '70': 4500, #6 par + 2 cabezas
+            '150': 6500, #6 par + 4 cabezas
+            '250': 12500, #12 par + 6 cabezas, si se pueden colgar se cuelgan
+            '350': 19500 #22 par + 10 cabezas, si se pueden colgar se cuelgan
+        },
+        'Otros': {
+            '70': 2500, #6 par o 2 cabezas
+            '150': 4500, #6 par + 2 cabezas
+            '250': 12500, #12 par + 6 cabezas, si se pueden colgar se cuelgan
+            '350': 19500  #22 par + 10 cabezas, si se pueden colgar se cuelgan
+        }
+    },
+    'Pista de baile': {
+        '70': 6600,
+        '150': 8800,
+        '250': 11000,
+        '350': 13200
+    },
+    'Planta de luz': 9000,
+    'Chisperos': 350,  # precio por unidad
+    'Lluvia de papeles': 3000,
+    'Barra de bebidas': 8000,
+    'Back pintado a mano': 4500
+}
+
+# Horas base por tipo de evento
+HORAS_BASE = {
+    'Cumpleaños': {
+        '70': 6,
+        '71+': 7
+    },
+    'Bautizo': {
+        '70': 7,
+        '71+': 8
+    },
+    'Quince años': {
+        '70': 7,
+        '71+': 8
+    },
+    'Boda': {
+        '150': 8,
+        '151+': 'ilimitado'
+    }
+}
+
+def generar_cotizacion(data):
+    
+    tipo_evento = data['tipo_evento']
+    num_invitados = int(data['num_invitados'])
+    horas = int(data['duracion'])
+    servicios = data['servicios']
+    
+    # Calcular horas base según el tipo de evento y número de invitados
+    if tipo_evento == 'Cumpleaños':
+        horas_base = HORAS_BASE['Cumpleaños']['70'] if num_invitados <= 70 else HORAS_BASE['Cumpleaños']['71+']
+    elif tipo_evento == 'Bautizo' or tipo_evento == 'Quince años':
+        horas_base = HORAS_BASE[tipo_evento]['70'] if num_invitados <= 70 else HORAS_BASE[tipo_evento]['71+']
+    else:  # Boda
+        horas_base = HORAS_BASE['Boda']['150'] if num_invitados <= 150 else HORAS_BASE['Boda']['151+']
+    
+    # Inicializar cotización
+    cotizacion = []
+    total = 0
+    
+    # Calcular precios de servicios seleccionados
+    for servicio in servicios:
+        precio = 0
+        if servicio == 'DJ':
+            if tipo_evento in ['Boda', 'Bautizo', 'Quince años']:
+                precio = PRECIOS['DJ'][tipo_evento]
+            else:  # Cumpleaños
+                # Verificar el tipo de precio seleccionado por el usuario
+                tipo_precio_dj = data.get('tipo_precio_dj', 'por_hora')  # Por defecto, usar precio por hora
+                
+                if tipo_precio_dj == 'por_hora':
+                    # Si seleccionó precio por hora: $1000 por hora con mínimo 6 horas
+                    if horas < 6:
+                        precio = 6000  # Mínimo 6 horas (6 * 1000)
+                    else:
+                        precio = PRECIOS['DJ']['Cumpleaños'] * horas
+                else:  # precio fijo
+                    # Si seleccionó precio fijo: $12000
+                    precio = 12000
+                    
+                    # Establecer horas base según número de invitados
+                    dj_horas_base = 6 if num_invitados <= 70 else 7
+                    
+                    # Calcular horas extras si aplica
+                    if horas > dj_horas_base:
+                        horas_extras = horas - dj_horas_base
+                        # Usar la tarifa por hora de cumpleaños para las horas extras del DJ fijo
+                        precio_hora_extra_dj = PRECIOS['DJ']['Cumpleaños'] 
+                        precio += precio_hora_extra_dj * horas_extras
+        
+        elif servicio == 'Sonido':
+            if tipo_evento == 'Boda':
+                if num_invitados <= 150:
+                    precio = PRECIOS['Sonido']['Boda']['150']
+                else:
+                    precio = PRECIOS['Sonido']['Boda']['151+']
+            else:  # Otros eventos
+                if num_invitados <= 70:
+                    precio = PRECIOS['Sonido']['Otros']['70']
+                elif num_invitados <= 150:
+                    precio = PRECIOS['Sonido']['Otros']['150']
+                elif num_invitados <= 250:
+                    precio = PRECIOS['Sonido']['Otros']['250']
+                elif num_invitados <= 350:
+                    precio = PRECIOS['Sonido']['Otros']['350']
+                else:
+                    precio = "Contactar para calcular precio"
+                    continue  # Skip adding to total
+            
+            # Calcular horas extras si aplica
+            if horas_base != 'ilimitado' and horas > horas_base:
+                horas_extras = horas - horas_base
+                # El precio base del servicio ya está en 'precio'
+                # Calculamos el costo por hora extra basado en el precio base del servicio y las horas base
+                costo_por_hora_extra_servicio = precio / horas_base
+                adicional_por_horas_extras = costo_por_hora_extra_servicio * horas_extras
+                precio += round(adicional_por_horas_extras) # Redondear el costo adicional de las horas extras
+        
+        elif servicio == 'Iluminación':
+            if tipo_evento == 'Boda':
+                if num_invitados <= 70:
+                    precio = PRECIOS['Iluminación']['Boda']['70']
+                elif num_invitados <= 150:
+                    precio = PRECIOS['Iluminación']['Boda']['150']
+                elif num_invitados <= 250:
+                    precio = PRECIOS['Iluminación']['Boda']['250']
+                elif num_invitados <= 350:
+                    precio = PRECIOS['Iluminación']['Boda']['350']
+                else:
+                    precio = "Contactar para calcular precio"
+                    continue  # Skip adding to total
+            else:  # Otros eventos
+                if num_invitados <= 70:
+                    precio = PRECIOS['Iluminación']['Otros']['70']
+                elif num_invitados <= 150:
+                    precio = PRECIOS['Iluminación']['Otros']['150']
+                elif num_invitados <= 250:
+                    precio = PRECIOS['Iluminación']['Otros']['250']
+                elif num_invitados <= 350:
+                    precio = PRECIOS['Iluminación']['Otros']['350']
+                else:
+                    precio = "Contactar para calcular precio"
+                    continue  # Skip adding to total
+            
+            # Calcular horas extras si aplica
+            if horas_base != 'ilimitado' and horas > horas_base:
+                horas_extras = horas - horas_base
+                # El precio base del servicio ya está en 'precio'
+                # Calculamos el costo por hora extra basado en el precio base del servicio y las horas base
+                costo_por_hora_extra_servicio = precio / horas_base
+                adicional_por_horas_extras = costo_por_hora_extra_servicio * horas_extras
+                precio += round(adicional_por_horas_extras) # Redondear el costo adicional de las horas extras
+        
+        elif servicio == 'Pista de baile':
+            if num_invitados <= 70:
+                precio = PRECIOS['Pista de baile']['70']
+            elif num_invitados <= 150:
+                precio = PRECIOS['Pista de baile']['150']
+            elif num_invitados <= 250:
+                precio = PRECIOS['Pista de baile']['250']
+            elif num_invitados <= 350:
+                precio = PRECIOS['Pista de baile']['350']
+            else:
+                precio = "Contactar para calcular precio"
+                continue  # Skip adding to total
+            
+            # Calcular horas extras si aplica
+            if horas_base != 'ilimitado' and horas > horas_base:
+                horas_extras = horas - horas_base
+                # El precio base del servicio ya está en 'precio'
+                # Calculamos el costo por hora extra basado en el precio base del servicio y las horas base
+                costo_por_hora_extra_servicio = precio / horas_base
+                adicional_por_horas_extras = costo_por_hora_extra_servicio * horas_extras
+                precio += round(adicional_por_horas_extras) # Redondear el costo adicional de las horas extras
+        
+        # Calcular precio planta de luz
+        elif servicio == 'Planta de luz':
+            if horas_base != 'ilimitado' and (horas_base + 1) > 9:
+                precio = (horas_base + 1) * 1000
+            else:
+                precio = PRECIOS['Planta de luz']
+        
+        elif servicio == 'Chisperos':
+            cantidad = int(data.get('cantidad_chisperos', 1))
+            precio = PRECIOS['Chisperos'] * cantidad
+        
+        elif servicio == 'Lluvia de papeles':
+            precio = PRECIOS['Lluvia de papeles']
+        
+        cotizacion.append({
+            'servicio': servicio,
+            'precio': precio
+        })
+        
+        if isinstance(precio, (int, float)):
+            total += precio
+    
+    # Servicios incluidos automáticamente
+    servicios_automaticos = []
+    
+    # Para Bodas, incluir Barra de bebidas
+    if tipo_evento == 'Boda':
+        servicios_automaticos.append({
+            'servicio': 'Barra de bebidas',
+            'precio': PRECIOS['Barra de bebidas'],
+            'incluido': True
+        })
+        total += PRECIOS['Barra de bebidas']
+        
+        # Si se seleccionó Sonido y DJ, incluir Cabina de DJ sin costo
+        if 'Sonido' in servicios and 'DJ' in servicios:
+            servicios_automaticos.append({
+                'servicio': 'Cabina de DJ',
+                'precio': 0,
+                'incluido': True
+            })
+    
+    # Para Bodas y Bautizos con más de 150 invitados, incluir Back pintado a mano
+    if (tipo_evento == 'Boda'):
+        servicios_automaticos.append({
+            'servicio': 'Back pintado a mano',
+            'precio': PRECIOS['Back pintado a mano'],
+            'incluido': True
+        })
+        total += PRECIOS['Back pintado a mano']
+        
+    if (tipo_evento == 'Bautizo') and num_invitados >= 100:
+        servicios_automaticos.append({
+            'servicio': 'Back pintado a mano',
+            'precio': PRECIOS['Back pintado a mano'],
+            'incluido': True
+        })
+        total += PRECIOS['Back pintado a mano']
+    
+    # Agregar descuentos y viáticos si se proporcionaron
+    descuentos = data.get('descuentos', [])
+    viaticos = data.get('viaticos', [])
+    extras = data.get('extras', [])
+    
+    for descuento in descuentos:
+        total -= descuento['monto']
+    
+    for viatico in viaticos:
+        total += viatico['monto']
+    
+    for extra in extras:
+        total += extra['monto']
+    
+    resultado = {
+        'cotizacion': cotizacion,
+        'servicios_automaticos': servicios_automaticos,
+        'descuentos': descuentos,
+        'viaticos': viaticos,
+        'extras': extras,
+        'total': total
+    }
+    
+    return resultado
+
@@ -0,0 +1,73 @@
+"""Rutas de PDFs de app.py con una cola de PDFs que no termina a tiempo."""
+import io
+import os
+import tempfile
+import zipfile
+
+# La base y la caché de PDFs de las pruebas no van en la carpeta de la aplicación; el
+# directorio se elimina al terminar
+_directorio = tempfile.TemporaryDirectory(prefix='test_app_')
+os.environ.setdefault('COTIZACIONES_DB', os.path.join(_directorio.name, 'cotizaciones.db'))
+os.environ.setdefault('PDF_CACHE_DIR', os.path.join(_directorio.name, 'cache_pdf'))
+
+import pytest
+
+import app as aplicacion
+
+COTIZACION = {'tipo_evento': 'Boda', 'nombre': 'Ana', 'fecha': '01/02/2026',
+              'cotizacion': [{'servicio': 'DJ', 'precio': 1000}], 'servicios_automaticos': []}
+
+@pytest.fixture
+def cliente(monkeypatch):
+    # Trabajos que nunca terminan: la petición debe dejar de esperarlos
+    monkeypatch.setattr(aplicacion.cola_pdf, 'encolar',
+                        lambda data, clave, nombre, **opciones: aplicacion.TrabajoPDF(clave, nombre))
+    monkeypatch.setitem(aplicacion.app.config, 'PDF_ESPERA_RESPUESTA', 0.05)
+    aplicacion.cache_pdf.limpiar()
+    return aplicacion.app.test_client()
+
+def test_descarga_no_espera_sin_limite(cliente):
+    respuesta = cliente.post('/descargar_plantilla', json=COTIZACION)
+    assert respuesta.status_code == 503
+    assert int(respuesta.headers['Retry-After']) >= 1
+
+def test_pdf_unico_del_lote_no_espera_sin_limite(cliente):
+    respuesta = cliente.post('/exportar_pdfs', json={'cotizaciones': [COTIZACION] * 2, 'formato': 'pdf'})
+    assert respuesta.status_code == 503
+    assert int(respuesta.headers['Retry-After']) >= 1
+
+def test_zip_lista_los_pdfs_demorados(cliente):
+    respuesta = cliente.post('/exportar_pdfs', json={'cotizaciones': [COTIZACION] * 2})
+    assert respuesta.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(respuesta.data)) as archivo_zip:
+        assert archivo_zip.namelist() == ['errores.txt']
+        assert archivo_zip.read('errores.txt').decode('utf-8').count('todavía se está generando') == 2
+
+def test_archivo_abierto_sobrevive_al_descarte(tmp_path):
+    cache = aplicacion.CachePDF(1, 3600, str(tmp_path))
+    cache.guardar('a', b'%PDF-a')
+    archivo = cache.abrir('a')
+    # Con una sola entrada, guardar 'b' descarta 'a' y borra su archivo
+    cache.guardar('b', b'%PDF-b')
+    assert not (tmp_path / 'a.pdf').exists()
+    with archivo:
+        assert archivo.read() == b'%PDF-a'
+
+def test_pdf_descartado_antes_de_abrirlo_se_vuelve_a_generar(monkeypatch, tmp_path):
+    def encolar(data, clave, nombre, **opciones):
+        trabajo = aplicacion.TrabajoPDF(clave, nombre)
+        trabajo.pdf = b'%PDF-nuevo'
+        trabajo.listo.set()
+        return trabajo
+    # La caché todavía tiene la ruta, pero el archivo ya se eliminó
+    monkeypatch.setattr(aplicacion.cache_pdf, 'obtener', lambda clave: str(tmp_path / 'descartado.pdf'))
+    monkeypatch.setattr(aplicacion.cola_pdf, 'encolar', encolar)
+    respuesta = aplicacion.app.test_client().post('/descargar_plantilla', json=COTIZACION)
+    assert respuesta.status_code == 200
+    assert respuesta.data == b'%PDF-nuevo'
+
+def test_historial_rechazado_cuenta_como_error(monkeypatch):
+    monkeypatch.setitem(aplicacion.app.config, 'HISTORIAL_TOKEN', 'secreto')
+    respuesta = aplicacion.app.test_client().get('/cotizaciones', headers={'Authorization': 'Bearer otro'})
+    assert respuesta.status_code == 401
+    assert 'cotizaciones_errores_total{ruta="cotizaciones",codigo="401"}' in aplicacion.exponer_metricas()
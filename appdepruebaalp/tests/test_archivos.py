@@ -0,0 +1,23 @@
+"""Escritura atómica de archivos."""
+import pytest
+
+from archivos import escritura_atomica
+
+def test_reemplaza_al_terminar(tmp_path):
+    destino = tmp_path / 'a.bin'
+    destino.write_bytes(b'viejo')
+    with escritura_atomica(str(destino)) as archivo:
+        archivo.write(b'nuevo')
+        assert destino.read_bytes() == b'viejo'
+    assert destino.read_bytes() == b'nuevo'
+    assert [p.name for p in tmp_path.iterdir()] == ['a.bin']
+
+def test_error_deja_el_destino_y_borra_el_temporal(tmp_path):
+    destino = tmp_path / 'a.bin'
+    destino.write_bytes(b'viejo')
+    with pytest.raises(RuntimeError):
+        with escritura_atomica(str(destino)) as archivo:
+            archivo.write(b'a medias')
+            raise RuntimeError
+    assert destino.read_bytes() == b'viejo'
+    assert [p.name for p in tmp_path.iterdir()] == ['a.bin']
@@ -0,0 +1,61 @@
+"""Lectura de entradas y comandos de cli.py con archivos que tienen entradas inválidas."""
+import io
+import json
+
+import pytest
+
+import cli
+from cotizaciones import EntradaInvalida, leer_entradas, nombre_archivo_pdf
+
+ENTRADA = {'tipo_evento': 'Boda', 'num_invitados': 120, 'duracion': 5, 'servicios': ['DJ'],
+           'nombre': 'Ana', 'fecha': '01/02/2026'}
+
+def leer(texto, tamano=8):
+    # Bloques chicos para que las entradas queden partidas entre lecturas
+    return list(leer_entradas(io.StringIO(texto), tamano))
+
+@pytest.mark.parametrize('texto', [
+    '{"a": 1}\n[1, 2]\n3\n',
+    '[{"a": 1}, [1, 2], 3]',
+    '  {"a": 1} [1, 2]\n\n 3',
+])
+def test_formatos(texto):
+    assert leer(texto) == [{'a': 1}, [1, 2], 3]
+
+def test_entrada_invalida_no_corta_la_lectura():
+    valores = leer('{"a": 1}\n{"b": 2\n{"c": 3}\n{"d": x}\n{"e": 5}\n')
+    assert [v for v in valores if not isinstance(v, EntradaInvalida)] == [{'a': 1}, {'c': 3}, {'e': 5}]
+    assert [v.linea for v in valores if isinstance(v, EntradaInvalida)] == [2, 4]
+    assert isinstance(valores[1], EntradaInvalida) and isinstance(valores[3], EntradaInvalida)
+
+def test_elemento_invalido_en_lista_de_varias_lineas():
+    texto = json.dumps([ENTRADA, ENTRADA, {**ENTRADA, 'nombre': 'Luis'}], indent=2)
+    # Romper solo el segundo elemento, que además tiene ',' y ']' anidados y entre comillas
+    inicio = texto.index('"num_invitados"', texto.index('}'))
+    texto = texto[:inicio] + '"extra": {"a": [1, "],"]},\n  "num_invitados": ' + texto[texto.index(',', inicio):]
+    valores = leer(texto)
+    assert len(valores) == 3
+    assert valores[0] == ENTRADA and valores[2] == {**ENTRADA, 'nombre': 'Luis'}
+    assert isinstance(valores[1], EntradaInvalida) and valores[1].linea == 12
+
+def test_lista_sin_cerrar():
+    *valores, error = leer('[{"a": 1},\n{"b": 2}\n')
+    assert valores == [{'a': 1}, {'b': 2}]
+    assert isinstance(error, EntradaInvalida) and error.linea == 3
+
+def test_cotizar_sigue_despues_de_una_entrada_invalida(tmp_path, monkeypatch):
+    monkeypatch.setattr(cli, 'TAMANO_LOTE', 2)
+    ruta = tmp_path / 'entradas.jsonl'
+    ruta.write_text('\n'.join([json.dumps(ENTRADA), '{"tipo_evento": ', json.dumps(ENTRADA)]) + '\n',
+                    encoding='utf-8')
+    salida = io.StringIO()
+    assert cli.cotizar([str(ruta)], salida, totales=True) == 1
+    lineas = [json.loads(linea) for linea in salida.getvalue().splitlines()]
+    assert [linea['numero'] for linea in lineas] == [1, 2, 3]
+    assert 'total' in lineas[0] and 'total' in lineas[2]
+    assert lineas[1]['error'].startswith('línea 2:')
+
+@pytest.mark.parametrize('fecha', [None, '', 20260201])
+def test_nombre_archivo_sin_fecha_valida(fecha):
+    nombre = nombre_archivo_pdf({**ENTRADA, 'fecha': fecha})
+    assert nombre.startswith('Cotizacion_Boda_Ana_') and nombre.endswith('.pdf')
@@ -0,0 +1,78 @@
+"""Tamaño del PDF de cotización y lo que se incrusta en él."""
+import re
+
+import pytest
+
+import pdf_cotizacion
+from cotizaciones import cotizar
+from fuentes_pdf import bytes_fuentes
+
+SERVICIOS = ['DJ', 'Sonido', 'Iluminación', 'Pista de baile', 'Planta de luz']
+
+# Bytes máximos de fuentes incrustadas en el PDF típico. Solo deben ir los glifos usados:
+# cada subconjunto de Montserrat ocupa ~9 KB y el archivo completo ~330 KB por estilo
+LIMITE_FUENTES_TIPICA = 40 * 1024
+
+def cotizacion_tres_secciones(paginas_servicios=1):
+    """Cotización con portada, cotización y términos; la sección de cotización ocupa
+    más páginas cuanto mayor sea `paginas_servicios`."""
+    data = cotizar({'tipo_evento': 'Boda', 'num_invitados': 200, 'duracion': 8, 'servicios': SERVICIOS,
+                    'lugar': 'Salón Jardín', 'nombre': 'Ana y Luis', 'fecha': '12/12/2026'})
+    data['cotizacion'] = data['cotizacion'] * (1 + 3 * (paginas_servicios - 1))
+    data['personalizacion'] = {'incluir_terminos': True}
+    return data
+
+def objetos(pdf, tipo):
+    """Diccionarios de los objetos del PDF con ese /Subtype (ReportLab no usa flujos de objetos)."""
+    return [dicc for dicc in re.findall(rb'\d+ 0 obj\s*<<(.*?)>>\s*stream', pdf, re.S)
+            if re.search(rb'/Subtype /' + tipo + rb'\b', dicc)]
+
+def largo(dicc):
+    return int(re.search(rb'/Length (\d+)', dicc).group(1))
+
+def paginas(pdf):
+    return len(re.findall(rb'/Type /Page\b', pdf))
+
+@pytest.fixture(scope='module')
+def pdfs():
+    return (pdf_cotizacion.generar_pdf_cotizacion(cotizacion_tres_secciones()),
+            pdf_cotizacion.generar_pdf_cotizacion(cotizacion_tres_secciones(paginas_servicios=3)))
+
+def test_cada_fondo_se_incrusta_una_vez(pdfs):
+    corta, larga = pdfs
+    assert paginas(larga) > paginas(corta) >= 3
+    # Un fondo por sección, sin importar cuántas páginas tenga cada una
+    for pdf in pdfs:
+        assert len(objetos(pdf, b'Image')) == len(pdf_cotizacion.FONDOS_PDF)
+        if pdf_cotizacion.FONDOS_COMPARTIDOS:
+            assert len(objetos(pdf, b'Form')) == len(pdf_cotizacion.FONDOS_PDF)
+
+def test_tamano_sin_fondos_repetidos(pdfs):
+    corta, larga = pdfs
+    imagenes = [largo(dicc) for dicc in objetos(corta, b'Image')]
+    # El documento es los fondos (una vez cada uno) más poco contenido
+    assert len(corta) < sum(imagenes) + 64 * 1024
+    # Las páginas de más solo agregan texto: ni un fondo más
+    assert len(larga) - len(corta) < min(imagenes)
+
+def test_fuentes_del_pdf_tipico():
+    # La carga 'tipica' de bench.py: ajustes, texto adicional y portada personalizada
+    data = cotizacion_tres_secciones()
+    data.update({
+        'descuentos': [{'descripcion': 'Descuento 1', 'monto': 1000}],
+        'viaticos': [{'descripcion': 'Viáticos 1', 'monto': 800}],
+        'extras': [{'descripcion': 'Extra 1', 'monto': 1500}, {'descripcion': 'Extra 2', 'monto': 1550}],
+        'personalizacion': {
+            'titulo': 'COTIZACIÓN', 'incluir_terminos': True,
+            'texto_adicional': ("Gracias por considerarnos para su evento. Incluimos montaje, pruebas de "
+                                "sonido y coordinación con el resto de proveedores durante toda la noche. ") * 2,
+            'portada': {'tipo_evento': 'Boda', 'titulo_tipo_evento': 'Nuestra boda'},
+        },
+    })
+    pdf = pdf_cotizacion.generar_pdf_cotizacion(data)
+    if pdf_cotizacion.FONT_REGULAR == 'Montserrat':
+        # Un subconjunto por estilo, no el archivo completo
+        assert 0 < bytes_fuentes(pdf) <= LIMITE_FUENTES_TIPICA
+    else:
+        # Sin Montserrat se usan las fuentes estándar, que no se incrustan
+        assert bytes_fuentes(pdf) == 0
@@ -0,0 +1,54 @@
+"""Paridad del motor de precios con el cálculo original (precios_referencia.py)."""
+import pytest
+
+import precios_referencia
+from precios import MATRIZ_PRECIOS, calcular_cotizacion, calcular_cotizaciones, expandir_grid
+
+# Incluye cantidades fuera de rango (negativas y cero) y los valores a cada lado de cada tope
+GRID_PARIDAD = {
+    'tipo_evento': ['Boda', 'Cumpleaños', 'Bautizo', 'Quince años'],
+    'num_invitados': [-5, 0, 1, 50, 70, 71, 99, 100, 101, 150, 151, 200, 250, 251, 350, 351, 400],
+    'duracion': list(range(0, 15)),
+    'tipo_precio_dj': ['por_hora', 'fijo', None],
+    'servicios': [
+        list(precios_referencia.PRECIOS),
+        ['DJ', 'Sonido'],
+        ['Iluminación', 'Pista de baile', 'Planta de luz'],
+        ['Chisperos', 'Lluvia de papeles'],
+    ],
+}
+BASE_PARIDAD = {
+    'cantidad_chisperos': 3,
+    'descuentos': [{'descripcion': 'Descuento', 'monto': 500}],
+    'viaticos': [{'descripcion': 'Viáticos', 'monto': 250.5}],
+}
+
+def escenarios():
+    for escenario in expandir_grid(GRID_PARIDAD, BASE_PARIDAD):
+        if escenario['tipo_precio_dj'] is None:
+            # Sin el campo: el original usa 'por_hora'
+            del escenario['tipo_precio_dj']
+        yield escenario
+
+ESCENARIOS = list(escenarios())
+
+def test_paridad_con_el_calculo_original():
+    diferentes = [escenario for escenario in ESCENARIOS
+                  if calcular_cotizacion(escenario) != precios_referencia.generar_cotizacion(escenario)]
+    assert not diferentes, f"{len(diferentes)} de {len(ESCENARIOS)} escenarios difieren, p. ej. {diferentes[0]}"
+
+def test_lote_igual_a_cotizaciones_individuales():
+    assert calcular_cotizaciones(ESCENARIOS) == [calcular_cotizacion(escenario) for escenario in ESCENARIOS]
+
+@pytest.mark.parametrize('num_invitados', [-5, 0, 99, 100])
+def test_servicios_automaticos_con_pocos_invitados(num_invitados):
+    # Boda siempre incluye Barra de bebidas y Back; Bautizo incluye el Back desde 100 invitados
+    for tipo_evento in ('Boda', 'Bautizo'):
+        entrada = {'tipo_evento': tipo_evento, 'num_invitados': num_invitados, 'duracion': 6, 'servicios': ['DJ']}
+        assert (calcular_cotizacion(entrada)['servicios_automaticos']
+                == precios_referencia.generar_cotizacion(entrada)['servicios_automaticos'])
+
+def test_matriz_sin_minimo_de_invitados_por_omision():
+    # El cliente estima con la matriz: una regla sin mínimo debe aplicar con cualquier cantidad
+    sin_minimo = [regla for regla in MATRIZ_PRECIOS.automaticos if regla['evento'] == 'Boda']
+    assert sin_minimo and all(regla['min_invitados'] is None for regla in sin_minimo)
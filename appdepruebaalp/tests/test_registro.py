@@ -0,0 +1,19 @@
+"""Resumen de la cotización que se registra en el log."""
+import pytest
+
+from registro import resumen_cotizacion
+
+@pytest.mark.parametrize('personalizacion', [None, 'texto', 5, ['a'], {'texto_adicional': 7}])
+def test_resumen_con_personalizacion_de_otro_tipo(personalizacion):
+    resumen = resumen_cotizacion({'tipo_evento': 'Boda', 'personalizacion': personalizacion, 'cotizacion': 3})
+    assert resumen['tipo_evento'] == 'Boda'
+    assert resumen['incluir_terminos'] is True
+    assert resumen['servicios'] is None
+
+def test_resumen_cuenta_conceptos_y_texto():
+    resumen = resumen_cotizacion({'descuentos': [{'monto': 1}, {'monto': 2}],
+                                  'personalizacion': {'texto_adicional': 'hola', 'incluir_terminos': False}})
+    assert resumen['descuentos'] == 2
+    assert resumen['viaticos'] == 0
+    assert resumen['largo_texto_adicional'] == 4
+    assert resumen['incluir_terminos'] is False